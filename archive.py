@@ -0,0 +1,254 @@
+"""
+Архив папки в одном зашифрованном контейнере
+
+Архив - файл сегментированного формата (версия 3) с флагом FLAG_ARCHIVE.
+Открытый текст внутри контейнера:
+    данные файлов подряд + индекс (JSON, UTF-8) + длина индекса(8) + INDEX_MAGIC(8)
+Индекс хранит для каждого элемента имя, тип, смещение и размер данных,
+mtime и права доступа. Индекс зашифрован и аутентифицирован вместе с данными.
+При извлечении файлы пишутся атомарно (atomic_io.py), а права
+восстанавливаются без setuid/setgid/sticky (как у tar и zip).
+
+PBKDF2 выполняется один раз на архив, файл открывается и создается один раз.
+Чтение идет через random_access.EncryptedFileReader: чтобы получить список
+или извлечь один элемент, дешифруются только сегменты индекса и этого элемента.
+"""
+
+import json
+import ntpath
+import os
+import posixpath
+import struct
+
+import atomic_io
+import file_format
+import random_access
+import segmented_format
+
+ARCHIVE_EXTENSION = '.sfparchive'
+INDEX_MAGIC = b'SFPINDEX'
+INDEX_VERSION = 1
+TRAILER_SIZE = 8 + len(INDEX_MAGIC)
+
+TYPE_FILE = 'file'
+TYPE_DIR = 'dir'
+
+
+class ArchiveMember:
+    """Элемент архива"""
+
+    def __init__(self, name: str, type: str, offset: int = 0, size: int = 0,
+                 mtime_ns: int = None, mode: int = None):
+        self.name = name  # Относительный путь через '/'
+        self.type = type
+        self.offset = offset  # Смещение данных в открытом тексте архива
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.mode = mode
+
+    def is_dir(self) -> bool:
+        return self.type == TYPE_DIR
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name, 'type': self.type, 'offset': self.offset, 'size': self.size,
+            'mtime_ns': self.mtime_ns, 'mode': self.mode,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'ArchiveMember':
+        return cls(data['name'], data['type'], data.get('offset', 0), data.get('size', 0),
+                   data.get('mtime_ns'), data.get('mode'))
+
+
+def safe_member_path(destination: str, name: str) -> str:
+    """Путь извлечения элемента; имена, выходящие за destination, отклоняются"""
+    normalized = posixpath.normpath(name)
+    if not name or posixpath.isabs(name) or normalized == '..' or normalized.startswith('../') \
+            or '\\' in name or ntpath.splitdrive(name)[0]:
+        raise ValueError(f"Недопустимое имя элемента архива: {name}")
+    return os.path.join(destination, *normalized.split('/'))
+
+
+class ArchiveWriter:
+    """Потоковая запись элементов в открытый текст архива поверх SegmentWriter"""
+
+    def __init__(self, segment_writer, buffer_size: int = 64 * 1024):
+        self.segment_writer = segment_writer
+        self.buffer_size = buffer_size
+        self.members = []
+        self.offset = 0
+
+    def add_directory(self, name: str, stat: os.stat_result = None):
+        self.members.append(ArchiveMember(
+            name, TYPE_DIR, mtime_ns=stat.st_mtime_ns if stat else None,
+            mode=stat.st_mode & 0o7777 if stat else None
+        ))
+
+    def add_file(self, path: str, name: str):
+        """Добавление файла path под именем name"""
+        with open(path, 'rb') as file:
+            stat = os.fstat(file.fileno())
+            size = 0
+            for chunk in iter(lambda: file.read(self.buffer_size), b''):
+                self.segment_writer.write(chunk)
+                size += len(chunk)
+        self.members.append(ArchiveMember(
+            name, TYPE_FILE, self.offset, size, stat.st_mtime_ns, stat.st_mode & 0o7777
+        ))
+        self.offset += size
+
+    def close(self):
+        """Запись индекса и завершающего сегмента"""
+        index = json.dumps(
+            {'version': INDEX_VERSION, 'members': [member.to_dict() for member in self.members]},
+            ensure_ascii=False, separators=(',', ':')
+        ).encode('utf-8')
+        self.segment_writer.write(index)
+        self.segment_writer.write(struct.pack('>Q', len(index)) + INDEX_MAGIC)
+        self.segment_writer.close()
+
+
+def write_archive(file, folder_path: str, aead, salt: bytes, flags: int = 0,
+                  segment_size: int = segmented_format.DEFAULT_SEGMENT_SIZE,
+                  buffer_size: int = 64 * 1024, exclude: tuple = (), key_check: bytes = b'') -> int:
+    """
+    Запись архива папки folder_path в file: заголовок v3 и сегменты.
+    aead - шифр сегментов (ключ из derive_segment_key с солью salt).
+    exclude - абсолютные пути, которые не попадают в архив (сам архив).
+    key_check - проверочное значение ключа для заголовка (file_format.key_check_value).
+    Возвращает число файлов в архиве.
+    """
+    nonce_prefix = os.urandom(file_format.NONCE_PREFIX_SIZE)
+    header = file_format.build_segmented_header(
+        salt, nonce_prefix, segment_size, flags | file_format.FLAG_ARCHIVE, key_check=key_check
+    )
+    file.write(header)
+    writer = ArchiveWriter(
+        segmented_format.SegmentWriter(file, aead, header, nonce_prefix, segment_size), buffer_size
+    )
+    excluded = {os.path.abspath(path) for path in exclude}
+    root_path = os.path.abspath(folder_path)
+    file_count = 0
+    for root, dirs, files in os.walk(root_path):
+        dirs.sort()
+        relative_root = os.path.relpath(root, root_path)
+        prefix = '' if relative_root == '.' else relative_root.replace(os.sep, '/') + '/'
+        if prefix:
+            writer.add_directory(prefix.rstrip('/'), os.stat(root))
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            if path in excluded:
+                continue
+            writer.add_file(path, prefix + name)
+            file_count += 1
+    writer.close()
+    return file_count
+
+
+class ArchiveReader:
+    """Список и извлечение элементов архива через EncryptedFileReader"""
+
+    def __init__(self, reader: random_access.EncryptedFileReader, buffer_size: int = 1024 * 1024,
+                 durability: str = atomic_io.DURABILITY_NONE):
+        self.reader = reader
+        self.buffer_size = buffer_size
+        self.durability = atomic_io.check_durability(durability)
+        self.members = self._read_index()
+        self._by_name = {member.name: member for member in self.members}
+
+    def _read_index(self) -> list:
+        if self.reader.size < TRAILER_SIZE:
+            raise ValueError("Неверный формат архива")
+        self.reader.seek(self.reader.size - TRAILER_SIZE)
+        trailer = self.reader.read(TRAILER_SIZE)
+        if trailer[8:] != INDEX_MAGIC:
+            raise ValueError("Неверный формат архива: не найден индекс")
+        index_size = struct.unpack('>Q', trailer[:8])[0]
+        index_start = self.reader.size - TRAILER_SIZE - index_size
+        if index_start < 0:
+            raise ValueError("Неверный формат архива: поврежден индекс")
+        self.reader.seek(index_start)
+        index = json.loads(self.reader.read(index_size).decode('utf-8'))
+        if index.get('version') != INDEX_VERSION:
+            raise ValueError(f"Неподдерживаемая версия индекса архива: {index.get('version')}")
+        members = [ArchiveMember.from_dict(item) for item in index['members']]
+        for member in members:
+            if member.offset < 0 or member.size < 0 or member.offset + member.size > index_start:
+                raise ValueError(f"Неверный формат архива: элемент {member.name} вне данных")
+        return members
+
+    def names(self) -> list:
+        return [member.name for member in self.members]
+
+    def getmember(self, name: str) -> ArchiveMember:
+        member = self._by_name.get(name)
+        if member is None:
+            raise KeyError(f"В архиве нет элемента: {name}")
+        return member
+
+    def iter_member_chunks(self, member: ArchiveMember):
+        """Данные элемента кусками по buffer_size"""
+        self.reader.seek(member.offset)
+        remaining = member.size
+        while remaining > 0:
+            chunk = self.reader.read(min(self.buffer_size, remaining))
+            if not chunk:
+                raise ValueError(f"Архив обрезан: элемент {member.name}")
+            remaining -= len(chunk)
+            yield chunk
+
+    def read(self, name: str) -> bytes:
+        """Данные одного элемента целиком"""
+        member = self.getmember(name)
+        if member.is_dir():
+            raise ValueError(f"Элемент является папкой: {name}")
+        return b''.join(self.iter_member_chunks(member))
+
+    def _extract(self, member: ArchiveMember, destination: str) -> str:
+        path = safe_member_path(destination, member.name)
+        if member.is_dir():
+            os.makedirs(path, exist_ok=True)
+            return path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with atomic_io.AtomicOutput(path, self.durability) as file:
+            for chunk in self.iter_member_chunks(member):
+                file.write(chunk)
+        self._restore_metadata(member, path)
+        return path
+
+    @staticmethod
+    def _restore_metadata(member: ArchiveMember, path: str):
+        if member.mode is not None:
+            # Только биты доступа: setuid/setgid из архива не восстанавливаются
+            os.chmod(path, member.mode & 0o777)
+        if member.mtime_ns is not None:
+            os.utime(path, ns=(member.mtime_ns, member.mtime_ns))
+
+    def extract(self, name, destination: str) -> str:
+        """Извлечение одного элемента (имя или ArchiveMember) в папку destination"""
+        member = name if isinstance(name, ArchiveMember) else self.getmember(name)
+        path = self._extract(member, destination)
+        if member.is_dir():
+            self._restore_metadata(member, path)
+        return path
+
+    def extractall(self, destination: str, names: list = None) -> list:
+        """Извлечение всех (или перечисленных) элементов; возвращает пути"""
+        members = self.members if names is None else [self.getmember(name) for name in names]
+        # Элементы идут в порядке данных, поэтому сегменты читаются последовательно
+        paths = [self._extract(member, destination) for member in members]
+        # Права и время папок - после их содержимого
+        for member, path in zip(members, paths):
+            if member.is_dir():
+                self._restore_metadata(member, path)
+        return paths
+
+    def close(self):
+        self.reader.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
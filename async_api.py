@@ -0,0 +1,227 @@
+"""
+Асинхронный API для встраивания в asyncio-сервисы
+
+AsyncFileCrypto выполняет PBKDF2 и шифрование в ограниченном пуле потоков,
+не блокируя цикл событий. Оба бэкенда (crypto_backends) отпускают GIL в
+PBKDF2 и AES, поэтому потоков достаточно: процессы не нужны, а данные не
+копируются между ними.
+
+Ограничения:
+    max_workers - число потоков для криптографии (по умолчанию по числу ядер);
+    max_jobs    - число одновременных операций (по умолчанию 4 * max_workers),
+                  остальные ждут на семафоре, не занимая память под буферы;
+                  потоки байтов занимают место только на время обработки
+                  очередного куска, а не между кусками.
+
+Отмена задачи asyncio работает:
+    - для файлов - через cancel_token: поток останавливается на следующем
+      куске данных, недописанный результат удаляется;
+    - для потоков байтов - между сегментами.
+
+Потоки байтов шифруются в сегментированный формат (версия 3), поэтому
+поток дешифруется и проверяется по сегментам, не дожидаясь конца.
+"""
+
+import asyncio
+import functools
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import compression
+import file_format
+import folder_engine
+import job_journal
+import segmented_format
+from decryptor import SecureFileDecryptor
+from encryptor import SecureFileEncryptor
+
+# Сколько байт заголовка v3 нужно, чтобы его разобрать (с байтом сжатия
+# и проверочным значением ключа)
+MAX_STREAM_HEADER_SIZE = file_format.HEADER_V3_SIZE + 1 + file_format.KEY_CHECK_SIZE
+
+
+class _BufferSink:
+    """Файлоподобный приемник для SegmentWriter: накопленные байты забираются take()"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def write(self, data):
+        self.buffer += data
+
+    def take(self) -> bytes:
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+async def _aiter(chunks):
+    """Асинхронный итератор по асинхронному или обычному итерируемому"""
+    if hasattr(chunks, '__aiter__'):
+        async for chunk in chunks:
+            yield chunk
+    else:
+        for chunk in chunks:
+            yield chunk
+
+
+class AsyncFileCrypto:
+    """Асинхронное шифрование и дешифрование файлов и потоков байтов"""
+
+    def __init__(self, encryptor: SecureFileEncryptor = None, decryptor: SecureFileDecryptor = None,
+                 max_workers: int = None, max_jobs: int = None):
+        self.encryptor = encryptor or SecureFileEncryptor()
+        self.decryptor = decryptor or SecureFileDecryptor()
+        self.max_workers = max_workers or folder_engine.default_workers()
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='sfp-crypto')
+        self._jobs = asyncio.Semaphore(max_jobs or 4 * self.max_workers)
+
+    async def _run(self, func, *args, **kwargs):
+        """
+        Вызов func в пуле потоков. Место в max_jobs занимается только на время
+        вызова: генераторы потоков не держат его между yield, и брошенный
+        потребителем генератор не блокирует остальные операции.
+        """
+        async with self._jobs:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def _run_cancellable(self, func, *args, **kwargs):
+        """
+        Вызов func(..., cancel_token=...) в пуле потоков. При отмене задачи
+        поток останавливается через cancel_token, и отмена завершается, когда
+        он действительно остановился (и удалил недописанный результат).
+        """
+        token = job_journal.CancelToken()
+        future = self.executor.submit(functools.partial(func, *args, cancel_token=token, **kwargs))
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            token.cancel()
+            try:
+                await asyncio.wrap_future(future)
+            except Exception:
+                pass
+            raise
+
+    async def encrypt_file(self, file_path: str, password: str, on_progress=None, **kwargs) -> str:
+        """Асинхронный SecureFileEncryptor.encrypt_file"""
+        async with self._jobs:
+            return await self._run_cancellable(
+                self.encryptor.encrypt_file, file_path, password, on_progress=on_progress, **kwargs
+            )
+
+    async def decrypt_file(self, file_path: str, password: str, on_progress=None, **kwargs) -> str:
+        """Асинхронный SecureFileDecryptor.decrypt_file"""
+        async with self._jobs:
+            return await self._run_cancellable(
+                self.decryptor.decrypt_file, file_path, password, on_progress=on_progress, **kwargs
+            )
+
+    async def encrypt_stream(self, chunks, password: str,
+                             segment_size: int = segmented_format.DEFAULT_SEGMENT_SIZE):
+        """
+        Шифрование потока байтов (асинхронный или обычный итерируемый
+        объект с кусками bytes) в формат версии 3.
+        Асинхронный генератор кусков зашифрованного потока.
+        """
+        salt = os.urandom(file_format.SALT_SIZE)
+        nonce_prefix = os.urandom(file_format.NONCE_PREFIX_SIZE)
+        master_key = await self._run(self.encryptor.derive_master_key, password, salt)
+        segment_key = file_format.derive_segment_key(master_key, self.encryptor.KEY_SIZE)
+        header = file_format.build_segmented_header(
+            salt, nonce_prefix, segment_size, key_check=file_format.key_check_value(master_key)
+        )
+        yield header
+
+        sink = _BufferSink()
+        writer = segmented_format.SegmentWriter(
+            sink, self.encryptor.backend.aead(segment_key), header, nonce_prefix, segment_size
+        )
+        async for chunk in _aiter(chunks):
+            await self._run(writer.write, chunk)
+            if sink.buffer:
+                yield sink.take()
+        await self._run(writer.close)
+        yield sink.take()
+
+    async def decrypt_stream(self, chunks, password: str):
+        """
+        Проверка и дешифрование потока формата версии 3 (см. encrypt_stream
+        и SecureFileEncryptor с FORMAT_SEGMENTED). Асинхронный генератор
+        кусков открытого текста; каждый кусок отдается только после проверки
+        его сегмента. Сжатые потоки распаковываются.
+        """
+        source = _aiter(chunks)
+        buffer = bytearray()
+        async for chunk in source:
+            buffer += chunk
+            if len(buffer) >= MAX_STREAM_HEADER_SIZE:
+                break
+        header = file_format.read_header(io.BytesIO(buffer))
+        if header is None or header.version != file_format.FORMAT_SEGMENTED:
+            raise ValueError("Потоковое дешифрование поддерживается только для сегментированного формата")
+        if header.flags & (file_format.FLAG_FOLDER_KEY | file_format.FLAG_ARCHIVE):
+            raise ValueError("Файлы с ключом папки и архивы дешифруются только из файла")
+        del buffer[:header.size]
+
+        master_key = await self._run(self.decryptor.derive_master_key, password, header.salt)
+        file_format.check_key(header.key_check, master_key)
+        aead = self.decryptor.backend.aead(file_format.derive_segment_key(master_key, self.decryptor.KEY_SIZE))
+        output = _BufferSink()
+        compressor = compression.get_compressor(header.compression) if header.compression else None
+        writer = compression.DecompressingWriter(output, compressor)
+        encrypted_segment_size = header.segment_size + segmented_format.TAG_SIZE
+
+        def decrypt_segments(data, first_index: int, final: bool):
+            """Дешифрование сегментов data подряд; последний - с флагом final"""
+            for offset in range(0, len(data), encrypted_segment_size):
+                index = first_index + offset // encrypted_segment_size
+                segment = data[offset:offset + encrypted_segment_size]
+                last = final and offset + encrypted_segment_size >= len(data)
+                nonce = segmented_format.segment_nonce(header.nonce_prefix, index, last)
+                try:
+                    writer.write(aead.decrypt(nonce, segment, header.raw))
+                except Exception:
+                    raise ValueError(
+                        f"Проверка подлинности сегмента {index} не прошла. "
+                        "Поток поврежден, обрезан или пароль неверный."
+                    )
+            if final:
+                writer.close()
+
+        index = 0
+        while True:
+            # Полные сегменты, после которых есть еще данные, точно не последние
+            ready = (len(buffer) - 1) // encrypted_segment_size * encrypted_segment_size if buffer else 0
+            if ready:
+                data = bytes(buffer[:ready])
+                del buffer[:ready]
+                await self._run(decrypt_segments, data, index, False)
+                index += ready // encrypted_segment_size
+                if output.buffer:
+                    yield output.take()
+            try:
+                # source.__anext__(), а не anext(): встроенная функция есть только с Python 3.10
+                chunk = await source.__anext__()
+            except StopAsyncIteration:
+                break
+            buffer += chunk
+
+        if len(buffer) < segmented_format.TAG_SIZE:
+            raise ValueError("Поток обрезан или поврежден")
+        await self._run(decrypt_segments, bytes(buffer), index, True)
+        data = output.take()
+        if data:
+            yield data
+
+    def close(self):
+        """Остановка пула потоков (дожидается начатых операций)"""
+        self.executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
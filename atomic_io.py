@@ -0,0 +1,159 @@
+"""
+Атомарная запись результатов с настраиваемой надежностью
+
+Результат пишется во временный файл рядом с итоговым (<путь>.sfptmp) и
+переименовывается в итоговый только после успешной записи целиком. Поэтому
+после сбоя на месте результата либо прежний файл, либо новый целиком, но
+не обрезанный; незавершенные временные файлы пропускаются при обходе папок.
+
+Уровни надежности (durability):
+    none  - только атомарное переименование, без fsync (быстро; после сбоя
+            питания недавний результат может не сохраниться);
+    file  - fsync файла перед переименованием и каталога после него;
+    group - пакетная фиксация (GroupCommit): временные файлы копятся, затем
+            файлы пакета подряд сбрасываются на диск (fsync), переименовываются,
+            и каждый каталог пакета синхронизируется один раз. Для папок из
+            множества мелких файлов это вместо fsync файла и каталога на
+            каждый результат; рабочие процессы при этом не ждут диска.
+"""
+
+import os
+
+DURABILITY_NONE = 'none'
+DURABILITY_FILE = 'file'
+DURABILITY_GROUP = 'group'
+DURABILITY_LEVELS = (DURABILITY_NONE, DURABILITY_FILE, DURABILITY_GROUP)
+
+TEMP_SUFFIX = '.sfptmp'
+
+# Размер пакета group-фиксации по умолчанию
+DEFAULT_GROUP_FILES = 1000
+DEFAULT_GROUP_BYTES = 256 * 1024 * 1024
+
+
+def check_durability(durability: str) -> str:
+    if durability not in DURABILITY_LEVELS:
+        raise ValueError(f"Неизвестный уровень надежности: {durability} (доступны: {', '.join(DURABILITY_LEVELS)})")
+    return durability
+
+
+def temp_path(path: str) -> str:
+    """Временный файл для результата path"""
+    return str(path) + TEMP_SUFFIX
+
+
+def is_temp(path: str) -> bool:
+    """Незавершенный результат (временный файл атомарной записи)"""
+    return str(path).endswith(TEMP_SUFFIX)
+
+
+def fsync_directory(directory: str):
+    """Сохранение записей каталога (переименований) на диск; в Windows не требуется"""
+    if os.name == 'nt':
+        return
+    fd = os.open(directory or '.', os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class AtomicOutput:
+    """
+    Контекстный менеджер записи результата path через временный файл.
+    При исключении временный файл удаляется, итоговый не затрагивается.
+    С defer=True (только для group) файл остается временным: его фиксирует
+    GroupCommit вызывающего процесса; без defer group работает как file.
+    """
+
+    def __init__(self, path: str, durability: str = DURABILITY_NONE, defer: bool = False):
+        self.path = str(path)
+        self.temp_path = temp_path(self.path)
+        self.durability = check_durability(durability)
+        self.defer = defer and durability == DURABILITY_GROUP
+        self.file = None
+
+    def __enter__(self):
+        self.file = open(self.temp_path, 'wb')
+        return self.file
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.file.flush()
+                if self.durability != DURABILITY_NONE and not self.defer:
+                    os.fsync(self.file.fileno())
+            self.file.close()
+            if exc_type is None and not self.defer:
+                os.replace(self.temp_path, self.path)
+                if self.durability != DURABILITY_NONE:
+                    fsync_directory(os.path.dirname(os.path.abspath(self.path)))
+        except BaseException:
+            self.discard()
+            raise
+        if exc_type is not None:
+            self.discard()
+
+    def discard(self):
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+
+class GroupCommit:
+    """
+    Пакетная фиксация результатов, записанных AtomicOutput(defer=True).
+    add(path, payload) ставит результат в пакет; при заполнении пакета
+    (files файлов или bytes_limit байт) и при выходе из контекста пакет
+    фиксируется, и для каждого результата вызывается on_commit(payload) -
+    например, запись контрольной точки в журнал задания.
+    """
+
+    def __init__(self, on_commit=None, files: int = DEFAULT_GROUP_FILES, bytes_limit: int = DEFAULT_GROUP_BYTES):
+        self.on_commit = on_commit
+        self.files = files
+        self.bytes_limit = bytes_limit
+        self._pending = []
+        self._pending_bytes = 0
+
+    def add(self, path: str, payload=None):
+        path = str(path)
+        self._pending.append((path, payload))
+        self._pending_bytes += os.path.getsize(temp_path(path))
+        if len(self._pending) >= self.files or self._pending_bytes >= self.bytes_limit:
+            self.commit()
+
+    def commit(self):
+        """
+        Сброс файлов пакета на диск, переименование и синхронизация каталогов.
+        Синхронизируются только файлы пакета, а не все файловые системы
+        (os.sync), чтобы не ждать чужих данных на загруженной машине.
+        """
+        pending, self._pending, self._pending_bytes = self._pending, [], 0
+        if not pending:
+            return
+        try:
+            for path, _ in pending:
+                with open(temp_path(path), 'rb+') as file:
+                    os.fsync(file.fileno())
+            directories = set()
+            for path, _ in pending:
+                os.replace(temp_path(path), path)
+                directories.add(os.path.dirname(os.path.abspath(path)))
+            for directory in directories:
+                fsync_directory(directory)
+        except BaseException:
+            for path, _ in pending:
+                if os.path.exists(temp_path(path)):
+                    os.remove(temp_path(path))
+            raise
+        if self.on_commit is not None:
+            for _, payload in pending:
+                self.on_commit(payload)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Записанные целиком файлы фиксируются и при отмене или ошибке
+        # (контрольные точки для продолжения задания)
+        self.commit()
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Замеры производительности SFP Secure File Program
+
+Генерирует синтетические данные (файлы от 1 КБ до нескольких ГБ и папку
+из множества мелких файлов) и замеряет шифрование, дешифрование и проверку
+для SecureFileEncryptor/SecureFileDecryptor и для функций terminal_version.
+Замеры startup - время запуска интерпретатора с импортами командной строки
+(cli.py) и, для сравнения, с импортами графического интерфейса.
+Результаты (время, МБ/с, файлов/с, стоимость PBKDF2) пишутся в JSON.
+
+Примеры:
+    python benchmark.py                          # быстрый профиль
+    python benchmark.py --profile full           # 1 КБ ... 4 ГБ и 100 000 файлов
+    python benchmark.py --sizes 1M 256M --tiny-files 0 --output new.json
+    python benchmark.py --compare old.json       # код возврата 1 при регрессии
+    python benchmark.py --implementations startup
+
+Время каждой операции - лучшее из --repeat запусков.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'terminal_version'))
+
+import crypto_backends
+import file_format
+import folder_engine
+
+PROFILES = {
+    'quick': {'sizes': ['1K', '1M', '16M'], 'tiny_files': 1000},
+    'full': {'sizes': ['1K', '1M', '64M', '1G', '4G'], 'tiny_files': 100000},
+}
+UNITS = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+PASSWORD = 'BenchmarkPassword123!'
+# Формат v1 скриптов terminal_version читает файл в память целиком
+TERMINAL_V1_MAX_SIZE = 512 * 1024 * 1024
+# Мелкие файлы раскладываются по подпапкам, чтобы не упираться в размер каталога
+FILES_PER_DIRECTORY = 1000
+DATA_BLOCK_SIZE = 1024 * 1024
+# Код запуска для замеров startup (в отдельном процессе python -c)
+STARTUP_CASES = {
+    # Интерпретатор без модулей SFP
+    'python': 'pass',
+    # Разбор аргументов командной строки (python -m ... --help)
+    'cli': 'import cli',
+    # Все, что загружает python -m ... verify до начала работы
+    'verify': 'import cli, decryptor, crypto_backends; crypto_backends.get_backend()',
+    # Графический интерфейс: tkinter, оба модуля и обе библиотеки шифрования
+    'gui': ('import encryptor_gui, decryptor_gui, crypto_backends\n'
+            'for name in crypto_backends.available_backends(): crypto_backends.get_backend(name)'),
+}
+
+
+def parse_size(text: str) -> int:
+    """Размер вида 512, 1K, 64M, 4G"""
+    text = text.strip().upper()
+    if text[-1] in UNITS:
+        return int(float(text[:-1]) * UNITS[text[-1]])
+    return int(text)
+
+
+def write_data_file(path: str, size: int, block: bytes):
+    """Файл заданного размера из повторяющегося случайного блока"""
+    with open(path, 'wb') as file:
+        remaining = size
+        while remaining > 0:
+            part = block[:min(len(block), remaining)]
+            file.write(part)
+            remaining -= len(part)
+
+
+def create_tiny_files(folder: str, count: int, seed: int = 0) -> int:
+    """Папка из count файлов по 1 байт - 4 КБ; возвращает общий объем"""
+    rng = random.Random(seed)
+    total = 0
+    for index in range(count):
+        directory = os.path.join(folder, f'd{index // FILES_PER_DIRECTORY:04d}')
+        if index % FILES_PER_DIRECTORY == 0:
+            os.makedirs(directory, exist_ok=True)
+        size = rng.randint(1, 4096)
+        with open(os.path.join(directory, f'f{index:06d}.bin'), 'wb') as file:
+            file.write(rng.getrandbits(8 * size).to_bytes(size, 'little'))  # randbytes() только с Python 3.9
+        total += size
+    return total
+
+
+def best_time(func, repeat: int) -> float:
+    """Лучшее время из repeat запусков func"""
+    best = None
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def make_result(implementation: str, format_name: str, operation: str, dataset: str,
+                seconds: float, size: int = 0, files: int = 0) -> dict:
+    result = {
+        'implementation': implementation,
+        'format': format_name,
+        'operation': operation,
+        'dataset': dataset,
+        'bytes': size,
+        'files': files,
+        'seconds': seconds,
+    }
+    if size and seconds:
+        result['mb_per_s'] = size / (1024 * 1024) / seconds
+    if files and seconds:
+        result['files_per_s'] = files / seconds
+        result['ms_per_file'] = seconds * 1000 / files
+    return result
+
+
+def result_key(result: dict) -> tuple:
+    return result['implementation'], result['format'], result['operation'], result['dataset']
+
+
+class Benchmark:
+    """Набор замеров для одной реализации"""
+
+    def __init__(self, work_dir: str, repeat: int, workers: int = None):
+        self.work_dir = work_dir
+        self.repeat = repeat
+        self.workers = workers
+        self.results = []
+        self.block = os.urandom(DATA_BLOCK_SIZE)
+
+    def record(self, *args, **kwargs):
+        result = make_result(*args, **kwargs)
+        self.results.append(result)
+        rate = f"{result['mb_per_s']:.1f} МБ/с" if 'mb_per_s' in result else ''
+        if 'files_per_s' in result and result['files'] > 1:
+            rate += f" {result['files_per_s']:.0f} файлов/с"
+        print(f"  {result['implementation']:9} {result['format']:3} {result['operation']:8} "
+              f"{result['dataset']:>10}: {result['seconds']:.4f} с {rate}")
+
+    def case_dir(self, name: str) -> str:
+        path = os.path.join(self.work_dir, name)
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+        return path
+
+    def run_library(self, sizes: list, tiny_files: int, formats: list):
+        from encryptor import SecureFileEncryptor
+        from decryptor import SecureFileDecryptor
+
+        decryptor = SecureFileDecryptor()
+        salt = os.urandom(file_format.SALT_SIZE)
+        self.record('library', '-', 'kdf', '-', best_time(lambda: decryptor.derive_master_key(PASSWORD, salt), self.repeat))
+
+        for format_name in formats:
+            version = file_format.FORMAT_SEGMENTED if format_name == 'v3' else file_format.FORMAT_V2
+            encryptor = SecureFileEncryptor(format_version=version)
+            for label, size in sizes:
+                folder = self.case_dir(f'library-{format_name}-{label}')
+                source = os.path.join(folder, 'data.bin')
+                write_data_file(source, size, self.block)
+                encrypted = source + '.encrypted'
+                self.record('library', format_name, 'encrypt', label,
+                            best_time(lambda: encryptor.encrypt_file(source, PASSWORD), self.repeat), size, 1)
+                self.record('library', format_name, 'decrypt', label,
+                            best_time(lambda: decryptor.decrypt_file(encrypted, PASSWORD), self.repeat), size, 1)
+                self.record('library', format_name, 'verify', label,
+                            best_time(lambda: decryptor.verify_file(encrypted, PASSWORD, {}), self.repeat),
+                            size, 1)
+                shutil.rmtree(folder)
+
+            if tiny_files:
+                folder = self.case_dir(f'library-{format_name}-tiny')
+                size = create_tiny_files(folder, tiny_files)
+                label = f'{tiny_files}x'
+                self.record('library', format_name, 'encrypt', label,
+                            best_time(lambda: encryptor.encrypt_folder(folder, PASSWORD, workers=self.workers),
+                                      self.repeat), size, tiny_files)
+                self.record('library', format_name, 'decrypt', label,
+                            best_time(lambda: decryptor.decrypt_folder(folder, PASSWORD, workers=self.workers),
+                                      self.repeat), size, tiny_files)
+
+                def verify_folder():
+                    results = decryptor.verify_folder(folder, PASSWORD, workers=self.workers)
+                    folder_engine.raise_for_failures(results, "Проверка папки")
+                self.record('library', format_name, 'verify', label, best_time(verify_folder, self.repeat),
+                            size, tiny_files)
+                shutil.rmtree(folder)
+
+    def run_startup(self):
+        directory = os.path.dirname(os.path.abspath(__file__))
+
+        def start(code):
+            return lambda: subprocess.run([sys.executable, '-c', code], cwd=directory, check=True)
+
+        for name, code in STARTUP_CASES.items():
+            self.record('startup', '-', name, 'import', best_time(start(code), self.repeat))
+
+    def run_terminal(self, sizes: list, tiny_files: int, formats: list):
+        import encrypt_file as terminal_encrypt
+        import decrypt_file as terminal_decrypt
+        import encrypt_folder as terminal_encrypt_folder
+        import decrypt_folder as terminal_decrypt_folder
+        import verify_file as terminal_verify
+        import verify_folder as terminal_verify_folder
+
+        def checked(func, *args):
+            # Функции terminal_version сообщают об ошибке через False
+            def run():
+                if not func(*args):
+                    raise RuntimeError(f"{func.__name__} завершилась с ошибкой")
+            return run
+
+        salt = os.urandom(file_format.SALT_SIZE)
+        self.record('terminal', '-', 'kdf', '-', best_time(lambda: terminal_encrypt.derive_key(PASSWORD, salt), self.repeat))
+
+        for format_name in formats:
+            segmented = format_name == 'v3'
+            for label, size in sizes:
+                if not segmented and size > TERMINAL_V1_MAX_SIZE:
+                    print(f"  terminal  v1  пропущен размер {label}: формат v1 читает файл в память целиком")
+                    continue
+                folder = self.case_dir(f'terminal-{format_name}-{label}')
+                source = os.path.join(folder, 'data.bin')
+                write_data_file(source, size, self.block)
+                self.record('terminal', format_name, 'encrypt', label,
+                            best_time(checked(terminal_encrypt.encrypt_file, source, PASSWORD, segmented), self.repeat),
+                            size, 1)
+                self.record('terminal', format_name, 'decrypt', label,
+                            best_time(checked(terminal_decrypt.decrypt_file, source + '.encrypted', PASSWORD),
+                                      self.repeat), size, 1)
+                self.record('terminal', format_name, 'verify', label,
+                            best_time(checked(terminal_verify.verify_file, source + '.encrypted', PASSWORD),
+                                      self.repeat), size, 1)
+                shutil.rmtree(folder)
+
+            if tiny_files:
+                folder = self.case_dir(f'terminal-{format_name}-tiny')
+                size = create_tiny_files(folder, tiny_files)
+                label = f'{tiny_files}x'
+                self.record('terminal', format_name, 'encrypt', label,
+                            best_time(checked(terminal_encrypt_folder.encrypt_folder, folder, PASSWORD,
+                                              self.workers, segmented), self.repeat), size, tiny_files)
+                self.record('terminal', format_name, 'decrypt', label,
+                            best_time(checked(terminal_decrypt_folder.decrypt_folder, folder, PASSWORD, self.workers),
+                                      self.repeat), size, tiny_files)
+                self.record('terminal', format_name, 'verify', label,
+                            best_time(checked(terminal_verify_folder.verify_folder, folder, PASSWORD, self.workers),
+                                      self.repeat), size, tiny_files)
+                shutil.rmtree(folder)
+
+
+def environment_info() -> dict:
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'backend': crypto_backends.get_backend().name,
+    }
+
+
+def compare_results(results: list, baseline_path: str, tolerance: float) -> list:
+    """Операции, ставшие медленнее базовых более чем на tolerance (доля)"""
+    with open(baseline_path, 'r', encoding='utf-8') as file:
+        baseline = {result_key(result): result for result in json.load(file)['results']}
+    regressions = []
+    for result in results:
+        old = baseline.get(result_key(result))
+        if old and old['seconds'] and result['seconds'] > old['seconds'] * (1 + tolerance):
+            regressions.append({
+                'key': '/'.join(result_key(result)),
+                'baseline_seconds': old['seconds'],
+                'seconds': result['seconds'],
+                'slowdown': result['seconds'] / old['seconds'],
+            })
+    return regressions
+
+
+def main():
+    """Главная функция"""
+    parser = argparse.ArgumentParser(description="Замеры производительности шифрования/дешифрования")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default='quick', help="набор данных")
+    parser.add_argument("--sizes", nargs='+', help="размеры файлов (1K, 64M, 4G ...) вместо профиля")
+    parser.add_argument("--tiny-files", type=int, help="число мелких файлов в папке (0 - без папки)")
+    parser.add_argument("--implementations", nargs='+', choices=['library', 'terminal', 'startup'],
+                        default=['library', 'terminal', 'startup'], help="что замерять")
+    parser.add_argument("--repeat", type=int, default=3, help="число запусков каждой операции")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="процессов при обработке папки")
+    parser.add_argument("--backend", choices=[crypto_backends.AUTO, *crypto_backends.BACKENDS],
+                        help="криптографический бэкенд (по умолчанию самый быстрый)")
+    parser.add_argument("--work-dir", help="каталог для синтетических данных (по умолчанию временный)")
+    parser.add_argument("--output", default='benchmark_results.json', help="файл результатов JSON")
+    parser.add_argument("--compare", help="JSON с прошлыми результатами для поиска регрессий")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="допустимое замедление относительно --compare (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    os.environ[crypto_backends.BACKEND_ENV] = crypto_backends.get_backend(args.backend).name
+    profile = PROFILES[args.profile]
+    sizes = [(label.upper(), parse_size(label)) for label in (args.sizes or profile['sizes'])]
+    tiny_files = profile['tiny_files'] if args.tiny_files is None else args.tiny_files
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='sfp-benchmark-')
+    os.makedirs(work_dir, exist_ok=True)
+    # Журналы отдельных файлов искажали бы замеры и засоряли вывод
+    logging.disable(logging.INFO)
+
+    benchmark = Benchmark(work_dir, args.repeat, args.workers)
+    try:
+        if 'library' in args.implementations:
+            print("📊 Библиотека (SecureFileEncryptor/SecureFileDecryptor)")
+            benchmark.run_library(sizes, tiny_files, ['v2', 'v3'])
+        if 'terminal' in args.implementations:
+            print("📊 terminal_version")
+            benchmark.run_terminal(sizes, tiny_files, ['v1', 'v3'])
+        if 'startup' in args.implementations:
+            print("📊 Время запуска")
+            benchmark.run_startup()
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {'environment': environment_info(), 'results': benchmark.results}
+    if args.compare:
+        report['regressions'] = compare_results(benchmark.results, args.compare, args.tolerance)
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2, ensure_ascii=False)
+    print(f"Результаты сохранены: {args.output}")
+
+    if report.get('regressions'):
+        print(f"❌ Регрессии производительности (допуск {args.tolerance:.0%}):")
+        for regression in report['regressions']:
+            print(f"  {regression['key']}: {regression['baseline_seconds']:.4f} с -> "
+                  f"{regression['seconds']:.4f} с (x{regression['slowdown']:.2f})")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+SFA Secure File Program - единая командная строка без графического интерфейса
+
+Подкоманды работают и с файлами, и с папками (по типу пути):
+    python -m <каталог SFP> encrypt PATH [--segmented] [--compress zlib|lzma] [--incremental]
+    python -m <каталог SFP> decrypt PATH
+    python -m <каталог SFP> verify PATH
+(или python cli.py ...). Без аргументов __main__.py запускает графический лаунчер.
+
+Пароль: --password, переменная окружения SFP_PASSWORD или запрос в терминале.
+Код возврата 0 - успех, 1 - ошибка, 2 - неверные аргументы.
+
+Для быстрого запуска из cron и скриптов тяжелые модули импортируются только
+в выбранной подкоманде: tkinter не импортируется никогда, шифровальщик или
+дешифровальщик - только нужный, а из криптографических библиотек
+загружается только выбранный бэкенд (см. crypto_backends.py). Время запуска
+замеряет benchmark.py --implementations startup.
+"""
+
+import argparse
+import getpass
+import logging
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import atomic_io
+import compression
+import crypto_backends
+import log_setup
+
+LOG_NAME = 'sfp.log'
+PASSWORD_ENV = 'SFP_PASSWORD'
+
+logger = logging.getLogger(__name__)
+
+
+def read_password(password: str = None) -> str:
+    """Пароль из аргумента, из SFP_PASSWORD или из запроса в терминале"""
+    password = password or os.environ.get(PASSWORD_ENV)
+    if password:
+        return password
+    return getpass.getpass("Пароль: ")
+
+
+def create_metrics(args, name: str):
+    """JobMetrics, если запрошен отчет метрик, иначе job_metrics.DISABLED"""
+    import job_metrics
+    if args.metrics_json or args.metrics_prom:
+        return job_metrics.JobMetrics(name)
+    return job_metrics.DISABLED
+
+
+def export_metrics(metrics, args):
+    """Сохранение отчетов метрик и итог по фазам в лог"""
+    if not metrics.enabled:
+        return
+    try:
+        metrics.export(args.metrics_json, args.metrics_prom)
+        logger.info(f"Метрики: {metrics.summary()}")
+    except Exception as e:
+        logger.error(f"Ошибка сохранения метрик: {e}")
+
+
+def cancel_token_for_folder():
+    """Ctrl+C отменяет задание над папкой; готовые файлы сохраняются в журнале"""
+    import job_journal
+    cancel_token = job_journal.CancelToken()
+    job_journal.cancel_on_interrupt(cancel_token)
+    return cancel_token
+
+
+def encrypt(args, password: str) -> bool:
+    """Шифрование файла или папки"""
+    import file_format
+    import progress
+    from encryptor import SecureFileEncryptor
+
+    format_version = file_format.FORMAT_SEGMENTED if args.segmented else file_format.FORMAT_V2
+    encryptor = SecureFileEncryptor(format_version=format_version, backend=args.backend,
+                                    compress=args.compress, durability=args.durability)
+    metrics = create_metrics(args, 'encrypt')
+    try:
+        if os.path.isdir(args.path):
+            encrypted_files = encryptor.encrypt_folder(
+                args.path, password, workers=args.workers, incremental_mode=args.incremental,
+                use_hash=args.hash, on_progress=progress.TerminalProgress(),
+                cancel_token=cancel_token_for_folder(), metrics=metrics
+            )
+            print(f"Папка зашифрована: {args.path} (файлов: {len(encrypted_files)})")
+        else:
+            encrypted_file = encryptor.encrypt_file(args.path, password, on_progress=progress.TerminalProgress(),
+                                                    metrics=metrics)
+            print(f"Файл зашифрован: {encrypted_file}")
+        return True
+    except Exception:
+        # Причина уже записана в лог шифровальщиком
+        metrics.file_failed()
+        return False
+    finally:
+        export_metrics(metrics, args)
+
+
+def decrypt(args, password: str) -> bool:
+    """Дешифрование файла или папки"""
+    import progress
+    from decryptor import SecureFileDecryptor
+
+    decryptor = SecureFileDecryptor(backend=args.backend, durability=args.durability)
+    metrics = create_metrics(args, 'decrypt')
+    try:
+        if os.path.isdir(args.path):
+            decrypted_files = decryptor.decrypt_folder(
+                args.path, password, args.workers, progress.TerminalProgress(),
+                cancel_token_for_folder(), metrics
+            )
+            print(f"Папка дешифрована: {args.path} (файлов: {len(decrypted_files)})")
+        else:
+            decrypted_file = decryptor.decrypt_file(args.path, password, on_progress=progress.TerminalProgress(),
+                                                    metrics=metrics)
+            print(f"Файл дешифрован: {decrypted_file}")
+        return True
+    except Exception:
+        # Причина уже записана в лог дешифровальщиком
+        metrics.file_failed()
+        return False
+    finally:
+        export_metrics(metrics, args)
+
+
+def verify(args, password: str) -> bool:
+    """Проверка подлинности файла или всех зашифрованных файлов папки без дешифрования"""
+    import progress
+    from decryptor import SecureFileDecryptor
+
+    decryptor = SecureFileDecryptor(backend=args.backend)
+    try:
+        if not os.path.isdir(args.path):
+            decryptor.verify_file(args.path, password, on_progress=progress.TerminalProgress())
+            print(f"Файл цел: {args.path}")
+            return True
+        results = decryptor.verify_folder(args.path, password, args.workers, progress.TerminalProgress(),
+                                          cancel_token_for_folder())
+    except Exception:
+        # Причина уже записана в лог дешифровальщиком
+        return False
+
+    failed = [result for result in results if not result.ok]
+    for result in failed:
+        print(f"Поврежден: {result.path}: {result.error}")
+    print(f"Проверено файлов: {len(results)}, повреждено: {len(failed)}")
+    return not failed
+
+
+COMMANDS = {
+    'encrypt': encrypt,
+    'decrypt': decrypt,
+    'verify': verify,
+}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("path", help="путь к файлу или папке")
+    common.add_argument("-p", "--password", help=f"пароль (по умолчанию из {PASSWORD_ENV} или запрос)")
+    common.add_argument("-w", "--workers", type=int, default=None,
+                        help="число процессов для папки (по умолчанию по числу ядер)")
+    common.add_argument("--backend", choices=[crypto_backends.AUTO, *crypto_backends.BACKENDS],
+                        help="криптографический бэкенд (по умолчанию самый быстрый)")
+    common.add_argument("--log-dir", help="каталог для файла лога (по умолчанию текущий)")
+    common.add_argument("--log-files", type=log_setup.check_file_events, metavar="all|summary|N",
+                        help="сообщения о каждом файле: all - все, summary - только итоги, N - каждое N-е")
+
+    writing = argparse.ArgumentParser(add_help=False)
+    writing.add_argument("--durability", choices=atomic_io.DURABILITY_LEVELS, default=atomic_io.DURABILITY_NONE,
+                         help="надежность записи: none - без fsync, file - fsync каждого файла, "
+                              "group - fsync файлов и каталога один раз на пакет файлов")
+    writing.add_argument("--metrics-json", metavar="PATH",
+                         help="сохранить метрики (время фаз, скорость, память) в JSON")
+    writing.add_argument("--metrics-prom", metavar="PATH",
+                         help="сохранить метрики для textfile collector Prometheus (*.prom)")
+
+    parser = argparse.ArgumentParser(prog="sfp", description="SFP Secure File Program: командная строка")
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND", required=True)
+    encrypt_parser = commands.add_parser("encrypt", parents=[common, writing], help="зашифровать файл или папку")
+    encrypt_parser.add_argument("--segmented", action="store_true",
+                                help="сегментированный формат v3 (аутентификация каждого сегмента)")
+    encrypt_parser.add_argument("--compress", choices=[compressor.name for compressor in compression.COMPRESSORS.values()],
+                                help="сжатие перед шифрованием (только с --segmented)")
+    encrypt_parser.add_argument("--incremental", action="store_true",
+                                help="папка: шифровать только новые и измененные файлы")
+    encrypt_parser.add_argument("--hash", action="store_true",
+                                help="с --incremental сравнивать содержимое (по HMAC с ключом папки)")
+    commands.add_parser("decrypt", parents=[common, writing], help="дешифровать файл или папку")
+    commands.add_parser("verify", parents=[common], help="проверить подлинность файла или папки без дешифрования")
+    return parser
+
+
+def main(argv: list = None):
+    """Главная функция"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    # Ошибки аргументов - через parser.error (код возврата 2)
+    if not os.path.exists(args.path):
+        parser.error(f"путь не найден: {args.path}")
+    if args.command == 'encrypt' and args.compress and not args.segmented:
+        parser.error("сжатие поддерживается только в сегментированном формате (--segmented)")
+    log_setup.configure(LOG_NAME, sys.stdout, args.log_dir, args.log_files, force=True)
+
+    if args.backend:
+        # Рабочие процессы пула наследуют выбор
+        os.environ[crypto_backends.BACKEND_ENV] = args.backend
+
+    password = read_password(args.password)
+    if not password:
+        print("Ошибка: пароль не может быть пустым", file=sys.stderr)
+        sys.exit(1)
+
+    if not COMMANDS[args.command](args, password):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
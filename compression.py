@@ -0,0 +1,177 @@
+"""
+Сжатие перед шифрованием
+
+Алгоритмы регистрируются в COMPRESSORS по однобайтовому идентификатору,
+который записывается в заголовок файла (флаг FLAG_COMPRESSED, см.
+file_format.py), поэтому дешифровальщик распаковывает данные сам.
+Встроены zlib и lzma из стандартной библиотеки; новые алгоритмы
+добавляются через register().
+
+Перед сжатием проверяется первый блок данных: если его энтропия близка к
+8 бит/байт или быстрое пробное сжатие почти ничего не дает (архивы, видео,
+уже зашифрованные данные), файл пишется без сжатия.
+"""
+
+import itertools
+import lzma
+import math
+import zlib
+from collections import Counter
+
+NONE = 0
+
+# Порог энтропии (бит на байт) и доля размера после пробного сжатия
+MAX_ENTROPY = 7.5
+MAX_SAMPLE_RATIO = 0.9
+SAMPLE_SIZE = 64 * 1024
+
+
+class Compressor:
+    """Интерфейс алгоритма сжатия"""
+
+    id = None
+    name = None
+
+    def compressor(self):
+        """Объект с методами compress(data) -> bytes и flush() -> bytes"""
+        raise NotImplementedError
+
+    def decompressor(self):
+        """Объект с методами decompress(data) -> bytes и flush() -> bytes"""
+        raise NotImplementedError
+
+
+class ZlibCompressor(Compressor):
+    id = 1
+    name = 'zlib'
+
+    def __init__(self, level: int = 6):
+        self.level = level
+
+    def compressor(self):
+        return zlib.compressobj(self.level)
+
+    def decompressor(self):
+        return zlib.decompressobj()
+
+
+class _LzmaDecompressor:
+    def __init__(self):
+        self._decompressor = lzma.LZMADecompressor()
+
+    def decompress(self, data) -> bytes:
+        return self._decompressor.decompress(data)
+
+    def flush(self) -> bytes:
+        if not self._decompressor.eof:
+            raise ValueError("Сжатые данные обрезаны")
+        return b''
+
+
+class LzmaCompressor(Compressor):
+    id = 2
+    name = 'lzma'
+
+    def __init__(self, preset: int = 6):
+        self.preset = preset
+
+    def compressor(self):
+        return lzma.LZMACompressor(preset=self.preset)
+
+    def decompressor(self):
+        return _LzmaDecompressor()
+
+
+COMPRESSORS = {}
+
+
+def register(compressor: Compressor):
+    """Регистрация алгоритма сжатия (id уникален и не равен NONE)"""
+    if not 0 < compressor.id < 256 or COMPRESSORS.get(compressor.id, compressor).name != compressor.name:
+        raise ValueError(f"Недопустимый идентификатор алгоритма сжатия: {compressor.id}")
+    COMPRESSORS[compressor.id] = compressor
+
+
+register(ZlibCompressor())
+register(LzmaCompressor())
+
+
+def get_compressor(name_or_id) -> Compressor:
+    """Алгоритм по имени или идентификатору из заголовка"""
+    for compressor in COMPRESSORS.values():
+        if name_or_id in (compressor.id, compressor.name):
+            return compressor
+    raise ValueError(f"Неизвестный алгоритм сжатия: {name_or_id}")
+
+
+def entropy(data) -> float:
+    """Энтропия Шеннона, бит на байт"""
+    if not data:
+        return 0.0
+    total = len(data)
+    return -sum(count / total * math.log2(count / total) for count in Counter(bytes(data)).values())
+
+
+def is_compressible(sample) -> bool:
+    """Стоит ли сжимать данные, начинающиеся с sample"""
+    sample = bytes(sample[:SAMPLE_SIZE])
+    if len(sample) < 64:
+        return False
+    if entropy(sample) > MAX_ENTROPY:
+        return False
+    return len(zlib.compress(sample, 1)) < len(sample) * MAX_SAMPLE_RATIO
+
+
+def choose(chunks, algorithm):
+    """
+    Выбор сжатия по первому куску данных.
+    Возвращает (compressor или None, итератор кусков с первым куском на месте).
+    """
+    chunks = iter(chunks)
+    first = next(chunks, b'')
+    chunks = itertools.chain([first], chunks)
+    if algorithm is None or not is_compressible(first):
+        return None, chunks
+    return get_compressor(algorithm), chunks
+
+
+def compress_chunks(chunks, compressor: Compressor, chunk_size: int):
+    """Сжатие потока кусков; на выходе куски ровно по chunk_size (кроме последнего)"""
+    stream = compressor.compressor()
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += stream.compress(chunk)
+        while len(buffer) >= chunk_size:
+            yield bytes(buffer[:chunk_size])
+            del buffer[:chunk_size]
+    buffer += stream.flush()
+    while len(buffer) > chunk_size:
+        yield bytes(buffer[:chunk_size])
+        del buffer[:chunk_size]
+    yield bytes(buffer)
+
+
+class DecompressingWriter:
+    """Обертка над writer: распаковка перед записью (compressor=None - без распаковки)"""
+
+    def __init__(self, writer, compressor: Compressor = None):
+        self.writer = writer
+        self.stream = compressor.decompressor() if compressor is not None else None
+
+    def write(self, data):
+        if self.stream is None:
+            self.writer.write(data)
+            return
+        output = self.stream.decompress(data)
+        if output:
+            self.writer.write(output)
+
+    def close(self):
+        """Проверка, что сжатый поток закончился целиком"""
+        if self.stream is None:
+            return
+        output = self.stream.flush()
+        if output:
+            self.writer.write(output)
+        if getattr(self.stream, 'eof', True) is False or getattr(self.stream, 'unused_data', b''):
+            raise ValueError("Сжатые данные повреждены")
@@ -0,0 +1,347 @@
+"""
+Криптографические бэкенды: общий интерфейс KDF, AES и HMAC
+
+Реализации:
+    pycryptodome  - Crypto.* (основной шифровальщик)
+    cryptography  - привязки к OpenSSL (скрипты terminal_version)
+
+Оба бэкенда дают побайтно одинаковый результат, формат файлов от выбора
+не зависит. get_backend() по умолчанию выбирает самый быстрый бэкенд на
+этой машине: при первом запуске выполняется короткий замер, результат
+сохраняется на диск (~/.sfp/backend.json) и используется повторно, пока не
+сменятся версии Python или библиотек.
+
+Принудительный выбор: аргумент backend у SecureFileEncryptor /
+SecureFileDecryptor, опция --backend скриптов terminal_version или
+переменная окружения SFP_CRYPTO_BACKEND (pycryptodome, cryptography, auto).
+Библиотеки импортируются только при создании бэкенда: наличие проверяется
+по importlib.util.find_spec, а при выборе по кешу создается только
+выбранный бэкенд.
+"""
+
+import importlib
+import importlib.util
+import json
+import logging
+import os
+import platform
+import time
+
+BLOCK_SIZE = 16
+TAG_SIZE = 16
+
+BACKEND_ENV = 'SFP_CRYPTO_BACKEND'
+CACHE_ENV = 'SFP_BACKEND_CACHE'
+AUTO = 'auto'
+
+# Объем данных и число итераций PBKDF2 для замера при выборе бэкенда
+BENCHMARK_DATA_SIZE = 4 * 1024 * 1024
+BENCHMARK_KDF_ITERATIONS = 5000
+BENCHMARK_CHUNK_SIZE = 64 * 1024
+
+
+def pkcs7_pad(data: bytes, block_size: int = BLOCK_SIZE) -> bytes:
+    """Дополнение PKCS#7"""
+    padding_length = block_size - len(data) % block_size
+    return bytes(data) + bytes([padding_length]) * padding_length
+
+
+def pkcs7_unpad(data: bytes, block_size: int = BLOCK_SIZE) -> bytes:
+    """Снятие дополнения PKCS#7 с проверкой"""
+    if not data or len(data) % block_size:
+        raise ValueError("Неверная длина данных для снятия padding")
+    padding_length = data[-1]
+    if not 1 <= padding_length <= block_size or data[-padding_length:] != bytes([padding_length]) * padding_length:
+        raise ValueError("Неверный padding")
+    return data[:-padding_length]
+
+
+class CryptoBackend:
+    """
+    Интерфейс бэкенда.
+    cbc_encryptor/cbc_decryptor возвращают объект с методами
+        update(data) -> bytes
+        update_into(data, output) -> int  (в output должно быть len(data) + 15 байт)
+    aead возвращает объект AES-GCM с интерфейсом cryptography AESGCM:
+        encrypt(nonce, data, aad) -> ciphertext + tag, decrypt(nonce, data, aad)
+    hmac_sha256 возвращает объект с методами update(data) и digest().
+    """
+
+    name = None
+    # Пакет библиотеки верхнего уровня (для проверки наличия без импорта)
+    module = None
+
+    def __reduce__(self):
+        # В рабочие процессы пула передается только имя бэкенда
+        return _create, (self.name,)
+
+    def pbkdf2(self, password: bytes, salt: bytes, length: int, iterations: int,
+               hash_name: str = 'sha256') -> bytes:
+        raise NotImplementedError
+
+    def cbc_encryptor(self, key: bytes, iv: bytes):
+        raise NotImplementedError
+
+    def cbc_decryptor(self, key: bytes, iv: bytes):
+        raise NotImplementedError
+
+    def aead(self, key: bytes):
+        raise NotImplementedError
+
+    def hmac_sha256(self, key: bytes, data: bytes = b''):
+        raise NotImplementedError
+
+
+class _PycryptodomeCBC:
+    def __init__(self, cipher, encrypt: bool):
+        self._process = cipher.encrypt if encrypt else cipher.decrypt
+
+    def update(self, data) -> bytes:
+        return self._process(data)
+
+    def update_into(self, data, output) -> int:
+        length = len(data)
+        self._process(data, output=output[:length])
+        return length
+
+
+class _PycryptodomeGCM:
+    def __init__(self, aes, key: bytes):
+        self._aes = aes
+        self._key = key
+
+    def encrypt(self, nonce: bytes, data, associated_data: bytes) -> bytes:
+        cipher = self._aes.new(self._key, self._aes.MODE_GCM, nonce=nonce, mac_len=TAG_SIZE)
+        cipher.update(associated_data)
+        ciphertext, tag = cipher.encrypt_and_digest(data)
+        return ciphertext + tag
+
+    def decrypt(self, nonce: bytes, data, associated_data: bytes) -> bytes:
+        cipher = self._aes.new(self._key, self._aes.MODE_GCM, nonce=nonce, mac_len=TAG_SIZE)
+        cipher.update(associated_data)
+        return cipher.decrypt_and_verify(data[:-TAG_SIZE], data[-TAG_SIZE:])
+
+
+class _PycryptodomeHMAC:
+    def __init__(self, hmac_module, sha256, key: bytes, data: bytes):
+        self._hmac = hmac_module.new(key, data, digestmod=sha256)
+
+    def update(self, data):
+        self._hmac.update(data)
+
+    def digest(self) -> bytes:
+        return self._hmac.digest()
+
+
+class PycryptodomeBackend(CryptoBackend):
+    name = 'pycryptodome'
+    module = 'Crypto'
+
+    def __init__(self):
+        from Crypto.Cipher import AES
+        from Crypto.Hash import HMAC, SHA1, SHA256
+        from Crypto.Protocol.KDF import PBKDF2
+        self._aes = AES
+        self._hmac = HMAC
+        self._hashes = {'sha1': SHA1, 'sha256': SHA256}
+        self._pbkdf2 = PBKDF2
+
+    def pbkdf2(self, password, salt, length, iterations, hash_name='sha256'):
+        return self._pbkdf2(password, salt, dkLen=length, count=iterations,
+                            hmac_hash_module=self._hashes[hash_name])
+
+    def cbc_encryptor(self, key, iv):
+        return _PycryptodomeCBC(self._aes.new(key, self._aes.MODE_CBC, iv), encrypt=True)
+
+    def cbc_decryptor(self, key, iv):
+        return _PycryptodomeCBC(self._aes.new(key, self._aes.MODE_CBC, iv), encrypt=False)
+
+    def aead(self, key):
+        return _PycryptodomeGCM(self._aes, key)
+
+    def hmac_sha256(self, key, data=b''):
+        return _PycryptodomeHMAC(self._hmac, self._hashes['sha256'], key, data)
+
+
+class _CryptographyCBC:
+    def __init__(self, context):
+        self._context = context
+
+    def update(self, data) -> bytes:
+        return self._context.update(data)
+
+    def update_into(self, data, output) -> int:
+        return self._context.update_into(data, output)
+
+
+class _CryptographyHMAC:
+    def __init__(self, hmac_class, sha256, key: bytes, data: bytes):
+        self._hmac = hmac_class(key, sha256())
+        if data:
+            self._hmac.update(data)
+
+    def update(self, data):
+        self._hmac.update(data)
+
+    def digest(self) -> bytes:
+        return self._hmac.finalize()
+
+
+class CryptographyBackend(CryptoBackend):
+    name = 'cryptography'
+    module = 'cryptography'
+
+    def __init__(self):
+        from cryptography.hazmat.primitives import hashes, hmac
+        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+        from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+        self._hashes = {'sha1': hashes.SHA1, 'sha256': hashes.SHA256}
+        self._hmac = hmac.HMAC
+        self._cipher = Cipher
+        self._aes = algorithms.AES
+        self._cbc = modes.CBC
+        self._aesgcm = AESGCM
+        self._pbkdf2 = PBKDF2HMAC
+
+    def pbkdf2(self, password, salt, length, iterations, hash_name='sha256'):
+        kdf = self._pbkdf2(algorithm=self._hashes[hash_name](), length=length, salt=salt, iterations=iterations)
+        return kdf.derive(password)
+
+    def cbc_encryptor(self, key, iv):
+        return _CryptographyCBC(self._cipher(self._aes(key), self._cbc(iv)).encryptor())
+
+    def cbc_decryptor(self, key, iv):
+        return _CryptographyCBC(self._cipher(self._aes(key), self._cbc(iv)).decryptor())
+
+    def aead(self, key):
+        return self._aesgcm(key)
+
+    def hmac_sha256(self, key, data=b''):
+        return _CryptographyHMAC(self._hmac, self._hashes['sha256'], key, data)
+
+
+BACKENDS = {
+    PycryptodomeBackend.name: PycryptodomeBackend,
+    CryptographyBackend.name: CryptographyBackend,
+}
+
+_instances = {}
+# Результат select_fastest в этом процессе
+_fastest = None
+
+
+def available_backends() -> list:
+    """Имена бэкендов, библиотеки которых установлены (без их импорта)"""
+    return [name for name, backend in BACKENDS.items() if importlib.util.find_spec(backend.module) is not None]
+
+
+def _create(name: str) -> CryptoBackend:
+    if name not in BACKENDS:
+        raise ValueError(f"Неизвестный криптографический бэкенд: {name}")
+    if name not in _instances:
+        _instances[name] = BACKENDS[name]()
+    return _instances[name]
+
+
+def benchmark_backend(backend: CryptoBackend) -> dict:
+    """Короткий замер: PBKDF2, AES-CBC, AES-GCM и HMAC; время в секундах"""
+    key = bytes(32)
+    data = bytes(BENCHMARK_CHUNK_SIZE)
+    chunks = BENCHMARK_DATA_SIZE // BENCHMARK_CHUNK_SIZE
+    timings = {}
+
+    start = time.perf_counter()
+    backend.pbkdf2(b'benchmark', bytes(32), 32, BENCHMARK_KDF_ITERATIONS)
+    timings['pbkdf2'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cipher = backend.cbc_encryptor(key, bytes(BLOCK_SIZE))
+    for _ in range(chunks):
+        cipher.update(data)
+    timings['aes_cbc'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    aead = backend.aead(key)
+    for index in range(chunks):
+        aead.encrypt(index.to_bytes(12, 'big'), data, b'')
+    timings['aes_gcm'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    mac = backend.hmac_sha256(key)
+    for _ in range(chunks):
+        mac.update(data)
+    mac.digest()
+    timings['hmac_sha256'] = time.perf_counter() - start
+
+    timings['total'] = sum(timings.values())
+    return timings
+
+
+def _cache_path() -> str:
+    return os.environ.get(CACHE_ENV) or os.path.join(os.path.expanduser('~'), '.sfp', 'backend.json')
+
+
+def _fingerprint(names: list) -> dict:
+    """Условия замера: при их изменении замер повторяется"""
+    versions = {}
+    for backend in BACKENDS.values():
+        # Импорт пакета верхнего уровня дешев: модули шифров не загружаются
+        module = importlib.import_module(backend.module) if backend.name in names else None
+        versions[backend.module] = getattr(module, '__version__', None) if module else None
+    return {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'backends': sorted(names),
+        'versions': versions,
+    }
+
+
+def select_fastest() -> str:
+    """Имя самого быстрого бэкенда (из кеша на диске или по новому замеру)"""
+    global _fastest
+    if _fastest is None:
+        _fastest = _select_fastest()
+    return _fastest
+
+
+def _select_fastest() -> str:
+    names = available_backends()
+    if not names:
+        raise ImportError("Не установлена ни pycryptodome, ни cryptography")
+    if len(names) == 1:
+        return names[0]
+
+    fingerprint = _fingerprint(names)
+    cache_path = _cache_path()
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as file:
+            cached = json.load(file)
+        if cached.get('fingerprint') == fingerprint and cached.get('fastest') in names:
+            return cached['fastest']
+    except (OSError, ValueError):
+        pass
+
+    results = {name: benchmark_backend(_create(name)) for name in names}
+    fastest = min(results, key=lambda name: results[name]['total'])
+    logging.info(f"Выбран криптографический бэкенд: {fastest}")
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(cache_path, 'w', encoding='utf-8') as file:
+            json.dump({'fingerprint': fingerprint, 'fastest': fastest, 'results': results}, file, indent=2)
+    except OSError as e:
+        logging.warning(f"Не удалось сохранить результат выбора бэкенда: {e}")
+    return fastest
+
+
+def get_backend(name: str = None) -> CryptoBackend:
+    """
+    Бэкенд по имени; без имени - из SFP_CRYPTO_BACKEND, иначе самый быстрый.
+    Можно передать и готовый объект CryptoBackend.
+    """
+    if isinstance(name, CryptoBackend):
+        return name
+    name = name or os.environ.get(BACKEND_ENV) or AUTO
+    if name == AUTO:
+        name = select_fastest()
+    return _create(name)
@@ -1,263 +1,600 @@
 import os
 import hmac
-import hashlib
+import functools
 import logging
-from Crypto.Cipher import AES
-from Crypto.Util.Padding import unpad
-from Crypto.Protocol.KDF import PBKDF2
-import tkinter as tk
-from tkinter import filedialog, simpledialog, messagebox, ttk
-import threading
 
-# Настройка логирования
-logging.basicConfig(
-    filename='decryption.log', 
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+import archive
+import atomic_io
+import chunk_store
+import compression
+import crypto_backends
+import file_format
+import folder_engine
+import job_journal
+import job_metrics
+import log_setup
+import mmap_io
+import pipeline
+import progress
+import random_access
+import segmented_format
+
+# Настройка логирования: запись в фоновом потоке (см. log_setup.py)
+log_setup.configure('decryption.log')
+# Сообщения об отдельных файлах (прореживаются, см. log_setup.FILE_EVENTS)
+file_logger = logging.getLogger(log_setup.FILE_EVENTS)
 
 class SecureFileDecryptor:
-    def __init__(self):
+    def __init__(self, buffer_size: int = 64 * 1024, queue_depth: int = 4, use_mmap: bool = True,
+                 backend=None, durability: str = atomic_io.DURABILITY_NONE):
         self.ITERATIONS = 100000  # PBKDF2 iterations
         self.KEY_SIZE = 32  # AES-256
         self.SALT_SIZE = 32
         self.HMAC_SIZE = 32
+        # Размер буфера потоковой обработки (кратен блоку AES)
+        self.BUFFER_SIZE = max(crypto_backends.BLOCK_SIZE, buffer_size - buffer_size % crypto_backends.BLOCK_SIZE)
+        # Глубина очередей конвейера чтение/дешифрование/запись (0 - без потоков)
+        self.QUEUE_DEPTH = queue_depth
+        # Конвейер включается только для файлов крупнее нескольких буферов
+        self.PIPELINE_THRESHOLD = 4 * self.BUFFER_SIZE
+        # Чтение шифртекста через mmap/memoryview без копирования
+        self.USE_MMAP = use_mmap
+        # Криптографический бэкенд: имя, объект или None (выбор по замеру)
+        self.backend = crypto_backends.get_backend(backend)
+        # Надежность записи результатов: 'none', 'file', 'group' (см. atomic_io.py)
+        self.DURABILITY = atomic_io.check_durability(durability)
         
-    def generate_keys(self, password: str, salt: bytes) -> tuple:
-        """Генерация ключей шифрования и HMAC из пароля"""
+    def generate_keys(self, password: str, salt: bytes, version: int = file_format.FORMAT_V2) -> tuple:
+        """Генерация ключей шифрования и HMAC из пароля (один запуск PBKDF2)"""
         try:
-            # Генерируем ключ шифрования
-            encryption_key = PBKDF2(
-                password,
-                salt,
-                dkLen=self.KEY_SIZE,
-                count=self.ITERATIONS
-            )
-            
-            # Генерируем ключ HMAC (используем ту же соль)
-            hmac_key = PBKDF2(
-                password,
-                salt,
-                dkLen=self.KEY_SIZE,
-                count=self.ITERATIONS
-            )
+            if version == file_format.FORMAT_LEGACY:
+                # Старый формат: оба ключа - один и тот же результат PBKDF2
+                # (PBKDF2-SHA1, пароль в latin-1, как у pycryptodome по умолчанию)
+                key = self.backend.pbkdf2(
+                    password.encode('latin-1'),
+                    salt,
+                    self.KEY_SIZE,
+                    self.ITERATIONS,
+                    'sha1'
+                )
+                return key, key
             
-            return encryption_key, hmac_key
+            # Формат v2: мастер-ключ PBKDF2 и независимые подключи через HKDF
+            master_key = self.derive_master_key(password, salt)
+            return file_format.derive_subkeys(master_key, self.KEY_SIZE)
         except Exception as e:
             logging.error(f"Ошибка генерации ключей: {e}")
             raise
     
+    def derive_master_key(self, password: str, salt: bytes) -> bytes:
+        """Мастер-ключ из пароля (единственный запуск PBKDF2)"""
+        return self.backend.pbkdf2(
+            password.encode('utf-8'),
+            salt,
+            self.KEY_SIZE,
+            self.ITERATIONS
+        )
+    
+    def get_folder_key(self, file_path: str, password: str, cache: dict) -> bytes:
+        """
+        Мастер-ключ папки для файла, зашифрованного в режиме папки.
+        Ищется ближайший заголовок .sfp_folder вверх от каталога файла;
+        ключи кешируются по пути заголовка. Неверный пароль отвергается
+        сразу после PBKDF2 (WrongPasswordError), если в заголовке есть
+        проверочное значение.
+        """
+        header_path = file_format.find_folder_header(os.path.dirname(os.path.abspath(file_path)))
+        if header_path is None:
+            raise ValueError(f"Не найден заголовок папки {file_format.FOLDER_HEADER_NAME} для файла: {file_path}")
+        if header_path not in cache:
+            salt, key_check = file_format.read_folder_header(header_path)
+            master_key = self.derive_master_key(password, salt)
+            file_format.check_key(key_check, master_key)
+            cache[header_path] = master_key
+        return cache[header_path]
+    
     def verify_hmac(self, hmac_key: bytes, encrypted_data: bytes, salt: bytes, expected_hmac: bytes) -> bool:
         """Проверка HMAC"""
         try:
-            calculated_hmac = hmac.new(hmac_key, encrypted_data + salt, hashlib.sha256).digest()
+            calculated_hmac = self.backend.hmac_sha256(hmac_key, encrypted_data + salt).digest()
             return hmac.compare_digest(calculated_hmac, expected_hmac)
         except Exception as e:
             logging.error(f"Ошибка проверки HMAC: {e}")
             return False
     
-    def decrypt_file(self, file_path: str, password: str) -> str:
-        """Дешифрование файла"""
+    def verify_hmac_stream(self, file, hmac_key: bytes, start: int, length: int, expected_hmac: bytes, suffix: bytes = b'',
+                           reporter: progress.ProgressReporter = None,
+                           metrics: job_metrics.JobMetrics = job_metrics.DISABLED) -> bool:
+        """Потоковая проверка HMAC по участку файла (и необязательному суффиксу)"""
+        try:
+            hmac_obj = metrics.wrap(job_metrics.PHASE_HMAC, self.backend.hmac_sha256(hmac_key))
+            chunks = self.read_chunks(file, start, length, self.queue_depth_for(length))
+            if reporter is not None:
+                chunks = reporter.track(chunks)
+            for chunk in chunks:
+                hmac_obj.update(chunk)
+            hmac_obj.update(suffix)
+            return hmac.compare_digest(hmac_obj.digest(), expected_hmac)
+        except job_journal.JobCancelled:
+            raise
+        except Exception as e:
+            logging.error(f"Ошибка проверки HMAC: {e}")
+            return False
+    
+    def read_chunks(self, file, start: int, length: int, queue_depth: int):
+        """
+        Куски участка файла по BUFFER_SIZE: memoryview поверх mmap
+        (без копирования) или bytes из фонового потока чтения.
+        """
+        if self.USE_MMAP:
+            return mmap_io.iter_mapped_chunks(file, start, length, self.BUFFER_SIZE)
+        file.seek(start)
+        return pipeline.ReadAhead(file, self.BUFFER_SIZE, queue_depth, length)
+    
+    def queue_depth_for(self, size: int) -> int:
+        """Глубина очередей конвейера для данных данного размера"""
+        return self.QUEUE_DEPTH if size > self.PIPELINE_THRESHOLD else 0
+    
+    def decrypt_file(self, file_path: str, password: str, key_cache: dict = None,
+                     on_progress=None, cancel_token: job_journal.CancelToken = None,
+                     defer_commit: bool = False, metrics: job_metrics.JobMetrics = job_metrics.DISABLED) -> str:
+        """
+        Дешифрование файла.
+        key_cache - общий кеш мастер-ключей папок (см. get_folder_key),
+        чтобы при дешифровании папки PBKDF2 не повторялся для каждого файла.
+        on_progress(event) получает progress.ProgressEvent; для формата v2
+        учитываются оба прохода (проверка HMAC и дешифрование).
+        cancel_token проверяется на каждом куске: после отмены частичный
+        результат удаляется и выбрасывается job_journal.JobCancelled.
+        Результат появляется под итоговым именем атомарно; с defer_commit и
+        надежностью 'group' он остается временным до atomic_io.GroupCommit.
+        metrics учитывает фазы дешифрования (см. job_metrics.py).
+        """
         try:
-            # Читаем зашифрованный файл
-            with open(file_path, 'rb') as file:
-                iv = file.read(16)
-                file_content = file.read()
-                # Новый разбор: [encrypted_data][hmac][salt]
-                salt = file_content[-32:]
-                hmac_value = file_content[-64:-32]
-                encrypted_data = file_content[:-64]
-            
-            # Генерируем ключи
-            encryption_key, hmac_key = self.generate_keys(password, salt)
-            
-            # Проверяем HMAC
-            if not self.verify_hmac(hmac_key, encrypted_data, salt, hmac_value):
-                raise ValueError("HMAC проверка не прошла. Файл может быть поврежден или пароль неверный.")
-            
-            # Дешифруем данные
-            cipher = AES.new(encryption_key, AES.MODE_CBC, iv)
-            decrypted_data = unpad(cipher.decrypt(encrypted_data), AES.block_size)
-            
-            # Сохраняем дешифрованный файл
             decrypted_file_path = file_path.replace('.encrypted', '.decrypted')
-            with open(decrypted_file_path, 'wb') as decrypted_file:
-                decrypted_file.write(decrypted_data)
             
-            logging.info(f"Файл дешифрован: {decrypted_file_path}")
+            with open(file_path, 'rb') as source:
+                file = metrics.wrap(job_metrics.PHASE_READ, source)
+                file_size = os.fstat(file.fileno()).st_size
+                header = file_format.read_header(file)
+                
+                if header is not None and header.flags & file_format.FLAG_ARCHIVE:
+                    raise ValueError("Файл является архивом папки: используйте extract_archive")
+                
+                if header is not None and header.version == file_format.FORMAT_SEGMENTED:
+                    with metrics.phase(job_metrics.PHASE_KDF):
+                        master_key, key_salt = self.get_master_key(header, file_path, password, key_cache)
+                    segment_key = file_format.derive_segment_key(master_key, self.KEY_SIZE, key_salt)
+                    reader = segmented_format.SegmentReader(
+                        file, metrics.wrap(job_metrics.PHASE_CIPHER, self.backend.aead(segment_key)), header, file_size
+                    )
+                    reporter = progress.ProgressReporter(on_progress, reader.body_size, 1, cancel_token=cancel_token)
+                    self.write_segments(reader, decrypted_file_path, reporter, defer_commit, metrics)
+                    reporter.file_done()
+                    reporter.finish()
+                    metrics.file_done(file_size)
+                    file_logger.info(f"Файл дешифрован: {decrypted_file_path}")
+                    return decrypted_file_path
+                
+                if header is None:
+                    # Старый формат: [IV][encrypted_data][hmac][salt]
+                    data_start = 16
+                    data_length = file_size - data_start - self.HMAC_SIZE - self.SALT_SIZE
+                    if data_length <= 0 or data_length % crypto_backends.BLOCK_SIZE:
+                        raise ValueError("Неверный формат файла или файл поврежден")
+                    iv = file.read(16)
+                    file.seek(data_start + data_length)
+                    hmac_value = file.read(self.HMAC_SIZE)
+                    salt = file.read(self.SALT_SIZE)
+                    version = file_format.FORMAT_LEGACY
+                    # HMAC по encrypted_data + salt
+                    hmac_start, hmac_length, hmac_suffix = data_start, data_length, salt
+                else:
+                    # Формат v2: [header][encrypted_data][hmac]
+                    data_start = header.size
+                    data_length = file_size - data_start - self.HMAC_SIZE
+                    if data_length <= 0 or data_length % crypto_backends.BLOCK_SIZE:
+                        raise ValueError("Неверный формат файла или файл поврежден")
+                    iv = header.iv
+                    salt = header.salt
+                    file.seek(data_start + data_length)
+                    hmac_value = file.read(self.HMAC_SIZE)
+                    version = header.version
+                    # HMAC по header + encrypted_data
+                    hmac_start, hmac_length, hmac_suffix = 0, data_start + data_length, b''
+                
+                # Генерируем ключи
+                with metrics.phase(job_metrics.PHASE_KDF):
+                    if header is None:
+                        encryption_key, hmac_key = self.generate_keys(password, salt, version)
+                    else:
+                        master_key, key_salt = self.get_master_key(header, file_path, password, key_cache)
+                        encryption_key, hmac_key = file_format.derive_subkeys(master_key, self.KEY_SIZE, key_salt)
+                
+                # Сначала проверяем HMAC по всему шифртексту, ничего не записывая
+                reporter = progress.ProgressReporter(on_progress, hmac_length + data_length, 1,
+                                                     cancel_token=cancel_token)
+                if not self.verify_hmac_stream(file, hmac_key, hmac_start, hmac_length, hmac_value, hmac_suffix,
+                                               reporter, metrics):
+                    raise ValueError("HMAC проверка не прошла. Файл может быть поврежден или пароль неверный.")
+                
+                # Затем дешифруем кусками; последний блок держим до конца,
+                # чтобы снять padding
+                # Открытый текст пишется в переиспользуемые буферы
+                cipher = metrics.wrap(job_metrics.PHASE_CIPHER, self.backend.cbc_decryptor(encryption_key, iv))
+                queue_depth = self.queue_depth_for(data_length)
+                buffers = mmap_io.BufferRing(queue_depth + 2, self.BUFFER_SIZE + crypto_backends.BLOCK_SIZE)
+                remaining = data_length
+                # Частично дешифрованный файл (ошибка или отмена) остается
+                # временным и удаляется
+                with atomic_io.AtomicOutput(decrypted_file_path, self.DURABILITY, defer_commit) as decrypted_file, \
+                        pipeline.WriteBehind(metrics.wrap(job_metrics.PHASE_WRITE, decrypted_file), queue_depth) as writer:
+                    output_writer = self.output_writer(writer, header, metrics)
+                    for chunk in reporter.track(self.read_chunks(file, data_start, data_length, queue_depth)):
+                        remaining -= len(chunk)
+                        output = buffers.next(len(chunk) + crypto_backends.BLOCK_SIZE)
+                        decrypted_chunk = output[:cipher.update_into(chunk, output)]
+                        if remaining == 0:
+                            decrypted_chunk = crypto_backends.pkcs7_unpad(bytes(decrypted_chunk))
+                        output_writer.write(decrypted_chunk)
+                    output_writer.close()
+            reporter.file_done()
+            reporter.finish()
+            metrics.file_done(file_size)
+            
+            file_logger.info(f"Файл дешифрован: {decrypted_file_path}")
             return decrypted_file_path
             
         except Exception as e:
             logging.error(f"Ошибка дешифрования файла: {e}")
             raise
     
-    def decrypt_folder(self, folder_path: str, password: str) -> list:
-        """Дешифрование папки"""
-        decrypted_files = []
+    def get_master_key(self, header, file_path: str, password: str, key_cache: dict = None) -> tuple:
+        """
+        Мастер-ключ файла с заголовком и соль для HKDF подключей:
+        из ключа папки для FLAG_FOLDER_KEY, иначе из пароля.
+        С FLAG_KEY_CHECK ключ сразу сверяется с заголовком: неверный пароль
+        дает WrongPasswordError до чтения шифртекста.
+        """
+        if header.flags & file_format.FLAG_FOLDER_KEY:
+            master_key = self.get_folder_key(file_path, password, {} if key_cache is None else key_cache)
+            key_salt = header.salt
+        else:
+            master_key = self.derive_master_key(password, header.salt)
+            key_salt = b''
+        file_format.check_key(header.key_check, master_key, key_salt)
+        return master_key, key_salt
+    
+    def check_password(self, file_path: str, password: str, key_cache: dict = None) -> bool:
+        """
+        Быстрая проверка пароля по заголовку файла, без чтения шифртекста.
+        False - пароль точно неверный (проверочное значение не совпало);
+        True - совпало или проверить нельзя (старый формат, файл поврежден).
+        """
+        try:
+            with open(file_path, 'rb') as file:
+                header = file_format.read_header(file)
+            if header is not None and header.key_check is not None:
+                self.get_master_key(header, file_path, password, key_cache)
+            return True
+        except file_format.WrongPasswordError:
+            return False
+        except Exception:
+            # Остальные ошибки файла попадут в его результат при дешифровании
+            return True
+    
+    def output_writer(self, writer, header, metrics: job_metrics.JobMetrics = job_metrics.DISABLED):
+        """Writer открытого текста: с распаковкой, если файл сжат (FLAG_COMPRESSED)"""
+        if header is None or header.compression == compression.NONE:
+            return compression.DecompressingWriter(writer)
+        compressor = compression.get_compressor(header.compression)
+        return metrics.wrap(job_metrics.PHASE_COMPRESS, compression.DecompressingWriter(writer, compressor))
+    
+    def write_segments(self, reader, decrypted_file_path: str, reporter: progress.ProgressReporter = None,
+                       defer_commit: bool = False, metrics: job_metrics.JobMetrics = job_metrics.DISABLED):
+        """
+        Проверка и дешифрование сегментов в файл.
+        Сегменты проверяются по одному, поэтому при ошибке в середине файла
+        частично записанный (временный) результат удаляется.
+        """
+        queue_depth = self.queue_depth_for(reader.body_size)
+        with atomic_io.AtomicOutput(decrypted_file_path, self.DURABILITY, defer_commit) as decrypted_file, \
+                pipeline.WriteBehind(metrics.wrap(job_metrics.PHASE_WRITE, decrypted_file), queue_depth) as writer:
+            output_writer = self.output_writer(writer, reader.header, metrics)
+            segments = reader.iter_segments(queue_depth)
+            if reporter is not None:
+                segments = reporter.track(segments)
+            for segment in segments:
+                output_writer.write(segment)
+            output_writer.close()
+    
+    def open_encrypted(self, file_path: str, password: str, key_cache: dict = None,
+                       cache_size: int = random_access.DEFAULT_CACHE_SIZE):
+        """
+        Открытие файла сегментированного формата для чтения с произвольным
+        доступом (read/seek) без дешифрования всего файла.
+        Дешифрованные сегменты кешируются, не больше cache_size байт.
+        """
+        file = open(file_path, 'rb')
+        try:
+            header = file_format.read_header(file)
+            if header is None or header.version != file_format.FORMAT_SEGMENTED:
+                raise ValueError("Произвольный доступ поддерживается только для сегментированного формата")
+            if header.compression != compression.NONE:
+                raise ValueError("Произвольный доступ не поддерживается для сжатых файлов")
+            master_key, key_salt = self.get_master_key(header, file_path, password, key_cache)
+            segment_key = file_format.derive_segment_key(master_key, self.KEY_SIZE, key_salt)
+            reader = segmented_format.SegmentReader(
+                file, self.backend.aead(segment_key), header, os.fstat(file.fileno()).st_size
+            )
+            return random_access.EncryptedFileReader(file, reader, cache_size)
+        except Exception as e:
+            file.close()
+            logging.error(f"Ошибка открытия файла {file_path}: {e}")
+            raise
+    
+    def open_archive(self, archive_path: str, password: str,
+                     cache_size: int = random_access.DEFAULT_CACHE_SIZE) -> archive.ArchiveReader:
+        """
+        Открытие архива папки: список элементов и извлечение отдельных
+        файлов без дешифрования всего архива.
+        """
+        reader = self.open_encrypted(archive_path, password, cache_size=cache_size)
+        try:
+            if not reader.header.flags & file_format.FLAG_ARCHIVE:
+                raise ValueError(f"Файл не является архивом папки: {archive_path}")
+            return archive.ArchiveReader(reader, durability=self.DURABILITY)
+        except Exception as e:
+            reader.close()
+            logging.error(f"Ошибка открытия архива {archive_path}: {e}")
+            raise
+    
+    def extract_archive(self, archive_path: str, password: str, destination: str = None,
+                        names: list = None) -> list:
+        """
+        Извлечение архива (или элементов names) в папку destination.
+        По умолчанию - рядом с архивом, в папку с именем архива без расширения.
+        """
+        if destination is None:
+            destination = archive_path[:-len(archive.ARCHIVE_EXTENSION)] \
+                if archive_path.endswith(archive.ARCHIVE_EXTENSION) else archive_path + '.decrypted'
+        try:
+            with self.open_archive(archive_path, password) as reader:
+                paths = reader.extractall(destination, names)
+            logging.info(f"Архив извлечен: {destination} (элементов: {len(paths)})")
+            return paths
+        except Exception as e:
+            logging.error(f"Ошибка извлечения архива: {e}")
+            raise
+    
+    def restore_file(self, recipe_path: str, password: str, store_dir: str, output_path: str = None,
+                     store_key: bytes = None) -> str:
+        """
+        Восстановление файла из хранилища чанков по рецепту <файл>.sfprecipe.
+        Каждый чанк проверяется; при ошибке частичный результат удаляется.
+        """
+        if output_path is None:
+            base = recipe_path[:-len(chunk_store.RECIPE_EXTENSION)] \
+                if recipe_path.endswith(chunk_store.RECIPE_EXTENSION) else recipe_path
+            output_path = base + '.decrypted'
+        try:
+            if store_key is None:
+                salt, key_check = chunk_store.read_store_header(store_dir)
+                store_key = self.derive_master_key(password, salt)
+                file_format.check_key(key_check, store_key)
+            store = chunk_store.ChunkStore(store_dir, store_key, self.backend, self.KEY_SIZE)
+            recipe = store.read_recipe(recipe_path)
+            with atomic_io.AtomicOutput(output_path, self.DURABILITY) as output_file:
+                store.restore(recipe, output_file)
+            
+            file_logger.info(f"Файл восстановлен из хранилища: {output_path}")
+            return output_path
+            
+        except Exception as e:
+            logging.error(f"Ошибка восстановления файла из хранилища: {e}")
+            raise
+    
+    def decrypt_folder(self, folder_path: str, password: str, workers: int = None, on_progress=None,
+                       cancel_token: job_journal.CancelToken = None,
+                       metrics: job_metrics.JobMetrics = job_metrics.DISABLED) -> list:
+        """
+        Дешифрование папки.
+        Мастер-ключи заголовков .sfp_folder вычисляются один раз здесь и
+        передаются рабочим процессам (workers, по умолчанию по числу ядер).
+        on_progress(event) получает progress.ProgressEvent по мере готовности файлов.
+        Прерванное или отмененное через cancel_token дешифрование при
+        повторном запуске продолжается по журналу задания (см. job_journal.py).
+        metrics собирает фазы из рабочих процессов (см. job_metrics.py).
+        Ошибка одного файла не останавливает остальные; если ошибки были,
+        в конце выбрасывается FolderProcessingError со всеми результатами.
+        """
+        file_paths = []
+        done_results = []
+        key_cache = {}
+        journal = job_journal.JobJournal.open(folder_path, 'decrypt')
         try:
             for root, dirs, files in os.walk(folder_path):
+                encrypted = []
                 for file in files:
+                    if not file.endswith('.encrypted'):
+                        continue
                     file_path = os.path.join(root, file)
-                    if file_path.endswith('.encrypted'):
-                        decrypted_file = self.decrypt_file(file_path, password)
-                        decrypted_files.append(decrypted_file)
+                    output_path = journal.done_output(file_path)
+                    if output_path is not None:
+                        done_results.append(folder_engine.FileResult(file_path, output_path))
+                    else:
+                        encrypted.append(file_path)
+                if encrypted and file_format.find_folder_header(root) is not None:
+                    with metrics.phase(job_metrics.PHASE_KDF):
+                        self.get_folder_key(encrypted[0], password, key_cache)
+                file_paths.extend(encrypted)
+            
+            # Неверный пароль виден по первому файлу: не запускаем пул ради
+            # одинаковых ошибок по каждому файлу
+            if file_paths and not self.check_password(file_paths[0], password, key_cache):
+                raise file_format.WrongPasswordError(f"Неверный пароль: {file_paths[0]}")
+            if done_results:
+                logging.info(f"Продолжение прерванного дешифрования: готово файлов {len(done_results)}")
+            tasks = [(file_path, password, key_cache) for file_path in file_paths]
+            sizes = {file_path: folder_engine.file_size(file_path) for file_path in file_paths}
+            reporter = progress.ProgressReporter(on_progress, sum(sizes.values()), len(tasks))
             
-            logging.info(f"Папка дешифрована: {folder_path}")
-            return decrypted_files
+            # С надежностью 'group' результаты фиксируются пакетами, и только
+            # зафиксированные попадают в журнал
+            group = atomic_io.GroupCommit(lambda result: journal.record(result.path, result.output))
+            defer = self.DURABILITY == atomic_io.DURABILITY_GROUP
             
+            def on_result(result):
+                if result.ok:
+                    if defer:
+                        group.add(result.output, result)
+                    else:
+                        journal.record(result.path, result.output)
+                else:
+                    metrics.file_failed()
+                metrics.merge(result.metrics)
+                reporter.file_done(sizes[result.path])
+            
+            with group:
+                results = done_results + folder_engine.run_parallel(
+                    functools.partial(self.decrypt_file, defer_commit=defer), tasks, workers, on_result, cancel_token,
+                    metrics.enabled
+                )
+            reporter.finish()
+            for result in results:
+                if not result.ok:
+                    logging.error(f"Ошибка дешифрования файла {result.path}: {result.error}")
+            folder_engine.raise_for_failures(results, "Дешифрование папки")
+            journal.complete()
+            
+            logging.info(f"Папка дешифрована: {folder_path} (файлов: {len(results)})")
+            return [result.output for result in results]
+            
+        except job_journal.JobCancelled:
+            logging.info(f"Дешифрование папки отменено, готовые файлы сохранены в журнале: {journal.path}")
+            raise
         except Exception as e:
             logging.error(f"Ошибка дешифрования папки: {e}")
             raise
+        finally:
+            journal.close()
 
-class DecryptorGUI:
-    def __init__(self):
-        self.decryptor = SecureFileDecryptor()
-        self.setup_gui()
-    
-    def setup_gui(self):
-        """Настройка графического интерфейса"""
-        self.root = tk.Tk()
-        self.root.title("SFP Secure File Decryptor v3.0")
-        self.root.geometry("600x400")
-        self.root.configure(bg='#2b2b2b')
-        
-        # Стили
-        style = ttk.Style()
-        style.theme_use('clam')
-        style.configure('TButton', padding=10, font=('Arial', 10))
-        style.configure('TLabel', background='#2b2b2b', foreground='white', font=('Arial', 10))
-        
-        # Заголовок
-        title_label = tk.Label(
-            self.root, 
-            text="SFP Secure File Decryptor", 
-            font=('Arial', 16, 'bold'),
-            bg='#2b2b2b',
-            fg='#00ff00'
-        )
-        title_label.pack(pady=20)
-        
-        # Фрейм для кнопок
-        button_frame = tk.Frame(self.root, bg='#2b2b2b')
-        button_frame.pack(pady=20)
-        
-        # Кнопки
-        decrypt_file_btn = tk.Button(
-            button_frame,
-            text="Дешифровать файл",
-            command=self.decrypt_file_gui,
-            bg='#FF9800',
-            fg='white',
-            font=('Arial', 12),
-            padx=20,
-            pady=10,
-            relief='flat'
-        )
-        decrypt_file_btn.pack(pady=10)
-        
-        decrypt_folder_btn = tk.Button(
-            button_frame,
-            text="Дешифровать папку",
-            command=self.decrypt_folder_gui,
-            bg='#9C27B0',
-            fg='white',
-            font=('Arial', 12),
-            padx=20,
-            pady=10,
-            relief='flat'
-        )
-        decrypt_folder_btn.pack(pady=10)
-        
-        # Статус
-        self.status_label = tk.Label(
-            self.root,
-            text="Готов к работе",
-            bg='#2b2b2b',
-            fg='#00ff00',
-            font=('Arial', 10)
-        )
-        self.status_label.pack(pady=20)
-        
-        # Прогресс бар
-        self.progress = ttk.Progressbar(
-            self.root,
-            mode='indeterminate'
-        )
-        self.progress.pack(pady=10, padx=50, fill='x')
+    def verify_file(self, file_path: str, password: str, key_cache: dict = None,
+                    on_progress=None, cancel_token: job_journal.CancelToken = None) -> bool:
+        """
+        Проверка подлинности зашифрованного файла без записи открытого текста:
+        HMAC (старый формат и v2) или теги всех сегментов (v3) считаются
+        потоково, файл только читается. Возвращает True; при повреждении или
+        неверном пароле выбрасывается исключение (WrongPasswordError - сразу
+        по заголовку, если в нем есть проверочное значение).
+        """
+        try:
+            with open(file_path, 'rb') as file:
+                file_size = os.fstat(file.fileno()).st_size
+                header = file_format.read_header(file)
+                
+                if header is not None and header.version == file_format.FORMAT_SEGMENTED:
+                    master_key, key_salt = self.get_master_key(header, file_path, password, key_cache)
+                    segment_key = file_format.derive_segment_key(master_key, self.KEY_SIZE, key_salt)
+                    reader = segmented_format.SegmentReader(
+                        file, self.backend.aead(segment_key), header, file_size
+                    )
+                    reporter = progress.ProgressReporter(on_progress, reader.body_size, 1, cancel_token=cancel_token)
+                    for _ in reporter.track(reader.iter_segments(self.queue_depth_for(reader.body_size))):
+                        pass
+                else:
+                    if header is None:
+                        # Старый формат: HMAC по encrypted_data + salt
+                        hmac_start = 16
+                        hmac_length = file_size - hmac_start - self.HMAC_SIZE - self.SALT_SIZE
+                        if hmac_length <= 0 or hmac_length % crypto_backends.BLOCK_SIZE:
+                            raise ValueError("Неверный формат файла или файл поврежден")
+                        file.seek(hmac_start + hmac_length)
+                        hmac_value = file.read(self.HMAC_SIZE)
+                        hmac_suffix = file.read(self.SALT_SIZE)
+                        _, hmac_key = self.generate_keys(password, hmac_suffix, file_format.FORMAT_LEGACY)
+                    else:
+                        # Формат v2: HMAC по header + encrypted_data
+                        hmac_start, hmac_suffix = 0, b''
+                        hmac_length = file_size - self.HMAC_SIZE
+                        data_length = hmac_length - header.size
+                        if data_length <= 0 or data_length % crypto_backends.BLOCK_SIZE:
+                            raise ValueError("Неверный формат файла или файл поврежден")
+                        file.seek(hmac_length)
+                        hmac_value = file.read(self.HMAC_SIZE)
+                        master_key, key_salt = self.get_master_key(header, file_path, password, key_cache)
+                        _, hmac_key = file_format.derive_subkeys(master_key, self.KEY_SIZE, key_salt)
+                    reporter = progress.ProgressReporter(on_progress, hmac_length, 1, cancel_token=cancel_token)
+                    if not self.verify_hmac_stream(file, hmac_key, hmac_start, hmac_length, hmac_value, hmac_suffix,
+                                                   reporter):
+                        raise ValueError("HMAC проверка не прошла. Файл может быть поврежден или пароль неверный.")
+            reporter.file_done()
+            reporter.finish()
+            
+            file_logger.info(f"Файл проверен: {file_path}")
+            return True
+            
+        except Exception as e:
+            logging.error(f"Проверка файла {file_path} не прошла: {e}")
+            raise
     
-    def update_status(self, message: str, color: str = '#00ff00'):
-        """Обновление статуса (безопасно для потоков)"""
-        def _update():
-            if self.status_label.winfo_exists():
-                self.status_label.config(text=message, fg=color)
-        self.root.after(0, _update)
-
-    def show_info(self, title, message):
-        self.root.after(0, lambda: messagebox.showinfo(title, message, parent=self.root))
-
-    def show_error(self, title, message):
-        self.root.after(0, lambda: messagebox.showerror(title, message, parent=self.root))
-
-    def decrypt_file_gui(self):
-        """GUI для дешифрования файла (диалоги только в главном потоке)"""
-        file_path = filedialog.askopenfilename(title="Выберите зашифрованный файл", filetypes=[("Encrypted files", "*.encrypted"), ("All files", "*.*")])
-        if not file_path:
-            self.update_status("Файл не выбран", '#ff0000')
-            return
-        password = simpledialog.askstring("Пароль", "Введите пароль для дешифрования:", show='*')
-        if not password:
-            self.update_status("Пароль не введен", '#ff0000')
-            return
-        def decrypt_thread():
-            try:
-                self.progress.start()
-                self.update_status("Дешифрование...", '#ffff00')
-                decrypted_file = self.decryptor.decrypt_file(file_path, password)
-                self.update_status(f"Файл дешифрован: {os.path.basename(decrypted_file)}", '#00ff00')
-                self.show_info("Успех", f"Файл успешно дешифрован!\nСохранен как: {decrypted_file}")
-            except Exception as e:
-                self.update_status(f"Ошибка: {str(e)}", '#ff0000')
-                self.show_error("Ошибка", f"Ошибка дешифрования: {str(e)}")
-            finally:
-                self.progress.stop()
-        threading.Thread(target=decrypt_thread, daemon=True).start()
+    def verify_folder(self, folder_path: str, password: str, workers: int = None, on_progress=None,
+                      cancel_token: job_journal.CancelToken = None) -> list:
+        """
+        Проверка всех зашифрованных файлов и архивов папки (параллельно, в
+        пуле процессов) без записи открытого текста - для регулярного аудита
+        резервных копий. Возвращает отчет: список FileResult в порядке обхода
+        папки; ошибки отдельных файлов не прерывают проверку остальных.
+        """
+        try:
+            file_paths = []
+            key_cache = {}
+            for root, dirs, files in os.walk(folder_path):
+                dirs.sort()
+                encrypted = [os.path.join(root, file) for file in sorted(files)
+                             if file.endswith(('.encrypted', archive.ARCHIVE_EXTENSION))]
+                if encrypted and file_format.find_folder_header(root) is not None:
+                    try:
+                        self.get_folder_key(encrypted[0], password, key_cache)
+                    except file_format.WrongPasswordError:
+                        raise
+                    except Exception:
+                        # Поврежденный заголовок папки попадет в отчет по ее файлам
+                        pass
+                file_paths.extend(encrypted)
+            
+            if file_paths and not self.check_password(file_paths[0], password, key_cache):
+                raise file_format.WrongPasswordError(f"Неверный пароль: {file_paths[0]}")
+            
+            tasks = [(file_path, password, key_cache) for file_path in file_paths]
+            sizes = {file_path: folder_engine.file_size(file_path) for file_path in file_paths}
+            reporter = progress.ProgressReporter(on_progress, sum(sizes.values()), len(tasks))
+            results = folder_engine.run_parallel(
+                self.verify_file, tasks, workers, lambda result: reporter.file_done(sizes[result.path]), cancel_token
+            )
+            reporter.finish()
+            
+            failed = [result for result in results if not result.ok]
+            for result in failed:
+                logging.error(f"Проверка файла {result.path} не прошла: {result.error}")
+            logging.info(f"Папка проверена: {folder_path} (файлов: {len(results)}, ошибок: {len(failed)})")
+            return results
+            
+        except Exception as e:
+            logging.error(f"Ошибка проверки папки: {e}")
+            raise
 
-    def decrypt_folder_gui(self):
-        """GUI для дешифрования папки (диалоги только в главном потоке)"""
-        folder_path = filedialog.askdirectory(title="Выберите папку с зашифрованными файлами")
-        if not folder_path:
-            self.update_status("Папка не выбрана", '#ff0000')
-            return
-        password = simpledialog.askstring("Пароль", "Введите пароль для дешифрования:", show='*')
-        if not password:
-            self.update_status("Пароль не введен", '#ff0000')
-            return
-        def decrypt_thread():
-            try:
-                self.progress.start()
-                self.update_status("Дешифрование папки...", '#ffff00')
-                decrypted_files = self.decryptor.decrypt_folder(folder_path, password)
-                self.update_status(f"Дешифровано файлов: {len(decrypted_files)}", '#00ff00')
-                self.show_info("Успех", f"Папка успешно дешифрована!\nДешифровано файлов: {len(decrypted_files)}")
-            except Exception as e:
-                self.update_status(f"Ошибка: {str(e)}", '#ff0000')
-                self.show_error("Ошибка", f"Ошибка дешифрования: {str(e)}")
-            finally:
-                self.progress.stop()
-        threading.Thread(target=decrypt_thread, daemon=True).start()
-    
-    def run(self):
-        """Запуск GUI"""
-        self.root.mainloop()
+def __getattr__(name):
+    # DecryptorGUI импортируется по требованию: tkinter не нужен без GUI
+    if name == 'DecryptorGUI':
+        from decryptor_gui import DecryptorGUI
+        return DecryptorGUI
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def main():
-    """Главная функция"""
-    try:
-        app = DecryptorGUI()
-        app.run()
-    except Exception as e:
-        logging.error(f"Критическая ошибка: {e}")
-        messagebox.showerror("Критическая ошибка", f"Ошибка запуска: {str(e)}")
+    """Главная функция: запуск графического интерфейса"""
+    import decryptor_gui
+    decryptor_gui.main()
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    main()
@@ -1,262 +1,479 @@
 import os
 import base64
-import hmac
-import hashlib
 import time
 import logging
 import sys
-from Crypto.Cipher import AES
-from Crypto.Util.Padding import pad, unpad
-from Crypto.Protocol.KDF import PBKDF2
-from Crypto.Random import get_random_bytes
-import tkinter as tk
-from tkinter import filedialog, simpledialog, messagebox, ttk
-import threading
+import functools
 
-# Настройка логирования
-logging.basicConfig(
-    filename='encryption.log', 
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+import archive
+import atomic_io
+import chunk_store
+import compression
+import crypto_backends
+import file_format
+import folder_engine
+import incremental
+import job_journal
+import job_metrics
+import log_setup
+import mmap_io
+import pipeline
+import progress
+import segmented_format
+
+# Настройка логирования: запись в фоновом потоке (см. log_setup.py)
+log_setup.configure('encryption.log')
+# Сообщения об отдельных файлах (прореживаются, см. log_setup.FILE_EVENTS)
+file_logger = logging.getLogger(log_setup.FILE_EVENTS)
 
 class SecureFileEncryptor:
-    def __init__(self):
+    def __init__(self, buffer_size: int = 64 * 1024, queue_depth: int = 4,
+                 format_version: int = file_format.FORMAT_V2,
+                 segment_size: int = segmented_format.DEFAULT_SEGMENT_SIZE,
+                 use_mmap: bool = True, backend=None, compress: str = None,
+                 durability: str = atomic_io.DURABILITY_NONE):
         self.ITERATIONS = 100000  # PBKDF2 iterations
         self.KEY_SIZE = 32  # AES-256
         self.SALT_SIZE = 32
         self.HMAC_SIZE = 32
+        # Размер буфера потоковой обработки (кратен блоку AES)
+        self.BUFFER_SIZE = max(crypto_backends.BLOCK_SIZE, buffer_size - buffer_size % crypto_backends.BLOCK_SIZE)
+        # Глубина очередей конвейера чтение/шифрование/запись (0 - без потоков)
+        self.QUEUE_DEPTH = queue_depth
+        # Конвейер включается только для файлов крупнее нескольких буферов
+        self.PIPELINE_THRESHOLD = 4 * self.BUFFER_SIZE
+        # Формат выходных файлов: FORMAT_V2 (CBC + HMAC) или FORMAT_SEGMENTED
+        if format_version not in (file_format.FORMAT_V2, file_format.FORMAT_SEGMENTED):
+            raise ValueError(f"Неподдерживаемая версия формата: {format_version}")
+        self.FORMAT_VERSION = format_version
+        self.SEGMENT_SIZE = segment_size
+        # Чтение входного файла через mmap/memoryview без копирования
+        self.USE_MMAP = use_mmap
+        # Служебные файлы папки, которые не шифруются
+        self.SERVICE_FILES = (file_format.FOLDER_HEADER_NAME, incremental.MANIFEST_NAME,
+                              incremental.MANIFEST_NAME + '.tmp', job_journal.JOURNAL_NAME)
+        # Криптографический бэкенд: имя, объект или None (выбор по замеру)
+        self.backend = crypto_backends.get_backend(backend)
+        # Сжатие перед шифрованием: None, 'zlib', 'lzma' (см. compression.py);
+        # несжимаемые данные все равно пишутся без сжатия
+        self.COMPRESSION = None if compress is None else compression.get_compressor(compress).name
+        # Надежность записи результатов: 'none', 'file', 'group' (см. atomic_io.py)
+        self.DURABILITY = atomic_io.check_durability(durability)
         
-    def generate_keys(self, password: str, salt: bytes) -> tuple:
-        """Генерация ключей шифрования и HMAC из пароля"""
+    def generate_keys(self, password: str, salt: bytes, version: int = file_format.FORMAT_V2) -> tuple:
+        """Генерация ключей шифрования и HMAC из пароля (один запуск PBKDF2)"""
         try:
-            # Генерируем ключ шифрования
-            encryption_key = PBKDF2(
-                password,
-                salt,
-                dkLen=self.KEY_SIZE,
-                count=self.ITERATIONS
-            )
+            if version == file_format.FORMAT_LEGACY:
+                # Старый формат: оба ключа - один и тот же результат PBKDF2
+                # (PBKDF2-SHA1, пароль в latin-1, как у pycryptodome по умолчанию)
+                key = self.backend.pbkdf2(
+                    password.encode('latin-1'),
+                    salt,
+                    self.KEY_SIZE,
+                    self.ITERATIONS,
+                    'sha1'
+                )
+                return key, key
             
-            # Генерируем ключ HMAC (используем ту же соль)
-            hmac_key = PBKDF2(
-                password,
-                salt,
-                dkLen=self.KEY_SIZE,
-                count=self.ITERATIONS
-            )
-            
-            return encryption_key, hmac_key
+            # Формат v2: мастер-ключ PBKDF2 и независимые подключи через HKDF
+            master_key = self.derive_master_key(password, salt)
+            return file_format.derive_subkeys(master_key, self.KEY_SIZE)
         except Exception as e:
             logging.error(f"Ошибка генерации ключей: {e}")
             raise
     
-    def encrypt_file(self, file_path: str, password: str) -> str:
-        """Шифрование файла"""
+    def queue_depth_for(self, size: int) -> int:
+        """Глубина очередей конвейера для файла данного размера"""
+        return self.QUEUE_DEPTH if size > self.PIPELINE_THRESHOLD else 0
+    
+    def derive_master_key(self, password: str, salt: bytes) -> bytes:
+        """Мастер-ключ из пароля (единственный запуск PBKDF2)"""
+        return self.backend.pbkdf2(
+            password.encode('utf-8'),
+            salt,
+            self.KEY_SIZE,
+            self.ITERATIONS
+        )
+    
+    def encrypt_file(self, file_path: str, password: str, folder_key: bytes = None,
+                     on_progress=None, cancel_token: job_journal.CancelToken = None,
+                     defer_commit: bool = False, metrics: job_metrics.JobMetrics = job_metrics.DISABLED) -> str:
+        """
+        Шифрование файла.
+        Если передан folder_key (мастер-ключ папки), PBKDF2 не выполняется:
+        ключи файла выводятся из него через HKDF со случайной солью файла.
+        on_progress(event) получает progress.ProgressEvent по ходу шифрования.
+        cancel_token проверяется на каждом куске: после отмены недописанный
+        результат удаляется и выбрасывается job_journal.JobCancelled.
+        Результат появляется под итоговым именем атомарно; с defer_commit и
+        надежностью 'group' он остается временным до atomic_io.GroupCommit.
+        metrics учитывает фазы шифрования (см. job_metrics.py).
+        """
         try:
             # Генерируем соль
-            salt = get_random_bytes(self.SALT_SIZE)
+            salt = os.urandom(self.SALT_SIZE)
             
-            # Генерируем ключи
-            encryption_key, hmac_key = self.generate_keys(password, salt)
-            
-            # Читаем файл
-            with open(file_path, 'rb') as file:
-                file_data = file.read()
+            # Мастер-ключ: из пароля (PBKDF2) или из ключа папки (HKDF)
+            if folder_key is None:
+                flags = 0
+                with metrics.phase(job_metrics.PHASE_KDF):
+                    master_key = self.derive_master_key(password, salt)
+                key_salt = b''
+            else:
+                flags = file_format.FLAG_FOLDER_KEY
+                master_key = folder_key
+                key_salt = salt
             
-            # Генерируем IV
-            iv = get_random_bytes(16)
-            
-            # Шифруем данные
-            cipher = AES.new(encryption_key, AES.MODE_CBC, iv)
-            encrypted_data = cipher.encrypt(pad(file_data, AES.block_size))
-            
-            # Создаем HMAC
-            hmac_value = hmac.new(hmac_key, encrypted_data + salt, hashlib.sha256).digest()
-            
-            # Сохраняем зашифрованный файл
             encrypted_file_path = file_path + '.encrypted'
-            with open(encrypted_file_path, 'wb') as encrypted_file:
-                # Формат: IV + encrypted_data + HMAC + salt
-                encrypted_file.write(iv)
-                encrypted_file.write(encrypted_data)
-                encrypted_file.write(hmac_value)
-                encrypted_file.write(salt)
+            with open(file_path, 'rb') as file:
+                file_size = os.fstat(file.fileno()).st_size
+                queue_depth = self.queue_depth_for(file_size)
+                reporter = progress.ProgressReporter(on_progress, file_size, 1, cancel_token=cancel_token)
+                # Запись через временный файл: при ошибке или отмене он удаляется,
+                # а на месте результата не остается обрезанного файла
+                with atomic_io.AtomicOutput(encrypted_file_path, self.DURABILITY, defer_commit) as encrypted_file, \
+                        pipeline.WriteBehind(metrics.wrap(job_metrics.PHASE_WRITE, encrypted_file), queue_depth) as writer:
+                    if self.USE_MMAP:
+                        chunks = mmap_io.iter_mapped_chunks(file, 0, file_size, self.BUFFER_SIZE)
+                    else:
+                        chunks = pipeline.ReadAhead(metrics.wrap(job_metrics.PHASE_READ, file), self.BUFFER_SIZE,
+                                                    queue_depth)
+                    chunks = reporter.track(chunks)
+                    # Сжатие выбирается по первому куску: несжимаемое не трогаем
+                    compressor, chunks = compression.choose(chunks, self.COMPRESSION)
+                    compression_id = compression.NONE
+                    if compressor is not None:
+                        chunks = metrics.track(job_metrics.PHASE_COMPRESS,
+                                               compression.compress_chunks(chunks, compressor, self.BUFFER_SIZE))
+                        compression_id = compressor.id
+                    # Проверочное значение ключа: неверный пароль виден сразу после PBKDF2
+                    key_check = file_format.key_check_value(master_key, key_salt)
+                    if self.FORMAT_VERSION == file_format.FORMAT_SEGMENTED:
+                        segment_key = file_format.derive_segment_key(master_key, self.KEY_SIZE, key_salt)
+                        self.write_segmented(chunks, writer, segment_key, salt, flags, compression_id, key_check,
+                                             metrics)
+                    else:
+                        encryption_key, hmac_key = file_format.derive_subkeys(master_key, self.KEY_SIZE, key_salt)
+                        buffers = mmap_io.BufferRing(queue_depth + 2, self.BUFFER_SIZE + crypto_backends.BLOCK_SIZE)
+                        self.write_v2(chunks, writer, encryption_key, hmac_key, salt, flags, buffers,
+                                      compression_id, key_check, metrics)
+            reporter.file_done()
+            reporter.finish()
+            metrics.file_done(file_size)
             
-            logging.info(f"Файл зашифрован: {encrypted_file_path}")
+            file_logger.info(f"Файл зашифрован: {encrypted_file_path}")
             return encrypted_file_path
             
         except Exception as e:
             logging.error(f"Ошибка шифрования файла: {e}")
             raise
     
-    def encrypt_folder(self, folder_path: str, password: str) -> list:
-        """Шифрование папки"""
-        encrypted_files = []
+    def write_v2(self, chunks, writer, encryption_key: bytes, hmac_key: bytes, salt: bytes, flags: int,
+                 buffers=None, compression_id: int = compression.NONE, key_check: bytes = b'',
+                 metrics: job_metrics.JobMetrics = job_metrics.DISABLED):
+        """
+        Запись формата v2: header + encrypted_data + HMAC(header + encrypted_data).
+        chunks - итератор кусков открытого текста размером BUFFER_SIZE
+        (bytes или memoryview). Если передан buffers (mmap_io.BufferRing),
+        шифртекст пишется в переиспользуемые буферы без лишних копий.
+        compression_id - алгоритм, которым уже сжаты chunks (записывается в заголовок).
+        key_check - проверочное значение ключа для заголовка (file_format.key_check_value).
+        """
+        iv = os.urandom(16)
+        header = file_format.build_header(salt, iv, flags, compression_id, key_check)
+        cipher = metrics.wrap(job_metrics.PHASE_CIPHER, self.backend.cbc_encryptor(encryption_key, iv))
+        hmac_obj = metrics.wrap(job_metrics.PHASE_HMAC, self.backend.hmac_sha256(hmac_key, header))
+        writer.write(header)
+        
+        # Шифруем потоково; последний блок дополняется padding
+        chunks = iter(chunks)
+        chunk = next(chunks, b'')
+        for next_chunk in chunks:
+            if buffers is None:
+                encrypted_chunk = cipher.update(chunk)
+            else:
+                output = buffers.next(len(chunk) + crypto_backends.BLOCK_SIZE)
+                encrypted_chunk = output[:cipher.update_into(chunk, output)]
+            hmac_obj.update(encrypted_chunk)
+            writer.write(encrypted_chunk)
+            chunk = next_chunk
+        
+        encrypted_chunk = cipher.update(crypto_backends.pkcs7_pad(chunk))
+        hmac_obj.update(encrypted_chunk)
+        writer.write(encrypted_chunk)
+        
+        writer.write(hmac_obj.digest())
+    
+    def write_segmented(self, chunks, writer, segment_key: bytes, salt: bytes, flags: int,
+                        compression_id: int = compression.NONE, key_check: bytes = b'',
+                        metrics: job_metrics.JobMetrics = job_metrics.DISABLED):
+        """Запись сегментированного формата v3 (каждый сегмент аутентифицирован)"""
+        nonce_prefix = os.urandom(file_format.NONCE_PREFIX_SIZE)
+        header = file_format.build_segmented_header(
+            salt, nonce_prefix, self.SEGMENT_SIZE, flags, compression_id, key_check
+        )
+        writer.write(header)
+        
+        segment_writer = segmented_format.SegmentWriter(
+            writer, metrics.wrap(job_metrics.PHASE_CIPHER, self.backend.aead(segment_key)), header, nonce_prefix,
+            self.SEGMENT_SIZE
+        )
+        for chunk in chunks:
+            segment_writer.write(chunk)
+        segment_writer.close()
+    
+    def get_folder_key(self, directory: str, folder_path: str, password: str, cache: dict) -> bytes:
+        """
+        Мастер-ключ для файлов каталога directory внутри folder_path.
+        Используется ближайший заголовок .sfp_folder не выше folder_path;
+        если его нет, он создается в корне папки с новой солью.
+        Ключи кешируются по пути заголовка, PBKDF2 выполняется раз на заголовок.
+        Пароль, не совпадающий с паролем существующего заголовка, отвергается
+        (WrongPasswordError), чтобы в одной папке не смешались разные пароли.
+        """
+        header_path = file_format.find_folder_header(directory, folder_path)
+        if header_path is None:
+            salt = os.urandom(self.SALT_SIZE)
+            master_key = self.derive_master_key(password, salt)
+            header_path = file_format.write_folder_header(folder_path, salt, file_format.key_check_value(master_key))
+            cache[header_path] = master_key
+            logging.info(f"Создан заголовок папки: {header_path}")
+        if header_path not in cache:
+            salt, key_check = file_format.read_folder_header(header_path)
+            master_key = self.derive_master_key(password, salt)
+            file_format.check_key(key_check, master_key)
+            cache[header_path] = master_key
+        return cache[header_path]
+    
+    def encrypt_folder(self, folder_path: str, password: str, use_folder_key: bool = True,
+                       workers: int = None, incremental_mode: bool = False, use_hash: bool = False,
+                       on_progress=None, cancel_token: job_journal.CancelToken = None,
+                       metrics: job_metrics.JobMetrics = job_metrics.DISABLED) -> list:
+        """
+        Шифрование папки.
+        По умолчанию PBKDF2 выполняется один раз на папку, а каждый файл
+        получает свои ключи из мастер-ключа папки (см. get_folder_key).
+        Файлы шифруются в пуле из workers процессов (по умолчанию по числу ядер).
+        С incremental_mode шифруются только новые и измененные файлы по
+        манифесту папки (см. incremental.py), а результаты удаленных файлов
+        удаляются; use_hash дополнительно сравнивает содержимое по отпечатку
+        HMAC-SHA256 с ключом из мастер-ключа папки.
+        on_progress(event) получает progress.ProgressEvent по мере готовности файлов.
+        Готовые файлы отмечаются в журнале задания (см. job_journal.py):
+        прерванное или отмененное через cancel_token шифрование при
+        повторном запуске продолжается с места остановки.
+        metrics собирает фазы из рабочих процессов (см. job_metrics.py).
+        Ошибка одного файла не останавливает остальные; если ошибки были,
+        в конце выбрасывается FolderProcessingError со всеми результатами.
+        """
+        tasks = []
+        done_results = []
+        states = {}
+        seen_names = set()
+        key_cache = {}
+        manifest = None
+        if incremental_mode:
+            hash_key = None
+            if use_hash:
+                with metrics.phase(job_metrics.PHASE_KDF):
+                    hash_key = incremental.hash_key(self.get_folder_key(folder_path, folder_path, password, key_cache))
+            manifest = incremental.Manifest.load(folder_path, hash_key)
+        journal = job_journal.JobJournal.open(folder_path, 'encrypt', {
+            'format': self.FORMAT_VERSION, 'segment_size': self.SEGMENT_SIZE,
+            'folder_key': use_folder_key, 'compress': self.COMPRESSION,
+        })
         try:
             for root, dirs, files in os.walk(folder_path):
+                folder_key = None
                 for file in files:
                     file_path = os.path.join(root, file)
-                    if not file_path.endswith('.encrypted'):
-                        encrypted_file = self.encrypt_file(file_path, password)
-                        encrypted_files.append(encrypted_file)
+                    if file_path.endswith('.encrypted') or file in self.SERVICE_FILES or atomic_io.is_temp(file):
+                        continue
+                    if manifest is not None:
+                        seen_names.add(manifest.relative_name(file_path))
+                        try:
+                            state = manifest.check(file_path, use_hash)
+                            if state is None:
+                                continue
+                            states[file_path] = state
+                        except OSError:
+                            # Недоступный файл: ошибка попадет в его результат при шифровании
+                            pass
+                    output_path = journal.done_output(file_path)
+                    if output_path is not None:
+                        # Зашифрован до прерывания предыдущего запуска
+                        done_results.append(folder_engine.FileResult(file_path, output_path))
+                        continue
+                    if use_folder_key and folder_key is None:
+                        with metrics.phase(job_metrics.PHASE_KDF):
+                            folder_key = self.get_folder_key(root, folder_path, password, key_cache)
+                    tasks.append((file_path, password, folder_key))
+            
+            if done_results:
+                logging.info(f"Продолжение прерванного шифрования: готово файлов {len(done_results)}")
+            sizes = {task[0]: folder_engine.file_size(task[0]) for task in tasks}
+            reporter = progress.ProgressReporter(on_progress, sum(sizes.values()), len(tasks))
+            
+            # С надежностью 'group' результаты фиксируются пакетами, и только
+            # зафиксированные попадают в журнал
+            group = atomic_io.GroupCommit(lambda result: journal.record(result.path, result.output))
+            defer = self.DURABILITY == atomic_io.DURABILITY_GROUP
+            
+            def on_result(result):
+                if result.ok:
+                    if defer:
+                        group.add(result.output, result)
+                    else:
+                        journal.record(result.path, result.output)
+                else:
+                    metrics.file_failed()
+                metrics.merge(result.metrics)
+                reporter.file_done(sizes[result.path])
+            
+            with group:
+                results = done_results + folder_engine.run_parallel(
+                    functools.partial(self.encrypt_file, defer_commit=defer), tasks, workers, on_result, cancel_token,
+                    metrics.enabled
+                )
+            reporter.finish()
+            for result in results:
+                if not result.ok:
+                    logging.error(f"Ошибка шифрования файла {result.path}: {result.error}")
             
-            logging.info(f"Папка зашифрована: {folder_path}")
-            return encrypted_files
+            if manifest is not None:
+                for result in results:
+                    if result.ok and result.path in states:
+                        manifest.record(states[result.path], result.output)
+                for removed in manifest.remove_missing(seen_names):
+                    logging.info(f"Удален результат отсутствующего файла: {removed}")
+                manifest.save()
+                logging.info(f"Инкрементальное шифрование: изменено файлов {len(results)} из {len(seen_names)}")
             
+            folder_engine.raise_for_failures(results, "Шифрование папки")
+            journal.complete()
+            
+            logging.info(f"Папка зашифрована: {folder_path} (файлов: {len(results)})")
+            return [result.output for result in results]
+            
+        except job_journal.JobCancelled:
+            logging.info(f"Шифрование папки отменено, готовые файлы сохранены в журнале: {journal.path}")
+            raise
         except Exception as e:
             logging.error(f"Ошибка шифрования папки: {e}")
             raise
-
-class EncryptorGUI:
-    def __init__(self):
-        self.encryptor = SecureFileEncryptor()
-        self.setup_gui()
+        finally:
+            journal.close()
     
-    def setup_gui(self):
-        """Настройка графического интерфейса"""
-        self.root = tk.Tk()
-        self.root.title("SFP Secure File Encryptor v3.0")
-        self.root.geometry("600x400")
-        self.root.configure(bg='#2b2b2b')
-        
-        # Стили
-        style = ttk.Style()
-        style.theme_use('clam')
-        style.configure('TButton', padding=10, font=('Arial', 10))
-        style.configure('TLabel', background='#2b2b2b', foreground='white', font=('Arial', 10))
-        
-        # Заголовок
-        title_label = tk.Label(
-            self.root, 
-            text="SFP Secure File Encryptor", 
-            font=('Arial', 16, 'bold'),
-            bg='#2b2b2b',
-            fg='#00ff00'
-        )
-        title_label.pack(pady=20)
-        
-        # Фрейм для кнопок
-        button_frame = tk.Frame(self.root, bg='#2b2b2b')
-        button_frame.pack(pady=20)
-        
-        # Кнопки
-        encrypt_file_btn = tk.Button(
-            button_frame,
-            text="Зашифровать файл",
-            command=self.encrypt_file_gui,
-            bg='#4CAF50',
-            fg='white',
-            font=('Arial', 12),
-            padx=20,
-            pady=10,
-            relief='flat'
-        )
-        encrypt_file_btn.pack(pady=10)
-        
-        encrypt_folder_btn = tk.Button(
-            button_frame,
-            text="Зашифровать папку",
-            command=self.encrypt_folder_gui,
-            bg='#2196F3',
-            fg='white',
-            font=('Arial', 12),
-            padx=20,
-            pady=10,
-            relief='flat'
-        )
-        encrypt_folder_btn.pack(pady=10)
-        
-        # Статус
-        self.status_label = tk.Label(
-            self.root,
-            text="Готов к работе",
-            bg='#2b2b2b',
-            fg='#00ff00',
-            font=('Arial', 10)
-        )
-        self.status_label.pack(pady=20)
-        
-        # Прогресс бар
-        self.progress = ttk.Progressbar(
-            self.root,
-            mode='indeterminate'
-        )
-        self.progress.pack(pady=10, padx=50, fill='x')
+    def get_store_key(self, store_dir: str, password: str) -> bytes:
+        """Мастер-ключ хранилища чанков store_dir (хранилище создается при первом обращении)"""
+        if not os.path.exists(os.path.join(store_dir, chunk_store.STORE_HEADER_NAME)):
+            salt = os.urandom(self.SALT_SIZE)
+            store_key = self.derive_master_key(password, salt)
+            chunk_store.write_store_header(store_dir, salt, file_format.key_check_value(store_key))
+            logging.info(f"Создано хранилище чанков: {store_dir}")
+            return store_key
+        salt, key_check = chunk_store.read_store_header(store_dir)
+        store_key = self.derive_master_key(password, salt)
+        file_format.check_key(key_check, store_key)
+        return store_key
     
-    def update_status(self, message: str, color: str = '#00ff00'):
-        """Обновление статуса (безопасно для потоков)"""
-        def _update():
-            if self.status_label.winfo_exists():
-                self.status_label.config(text=message, fg=color)
-        self.root.after(0, _update)
-
-    def show_info(self, title, message):
-        self.root.after(0, lambda: messagebox.showinfo(title, message, parent=self.root))
-
-    def show_error(self, title, message):
-        self.root.after(0, lambda: messagebox.showerror(title, message, parent=self.root))
-
-    def encrypt_file_gui(self):
-        """GUI для шифрования файла (диалоги только в главном потоке)"""
-        file_path = filedialog.askopenfilename(title="Выберите файл для шифрования")
-        if not file_path:
-            self.update_status("Файл не выбран", '#ff0000')
-            return
-        password = simpledialog.askstring("Пароль", "Введите пароль для шифрования:", show='*')
-        if not password:
-            self.update_status("Пароль не введен", '#ff0000')
-            return
-        def encrypt_thread():
-            try:
-                self.progress.start()
-                self.update_status("Шифрование...", '#ffff00')
-                encrypted_file = self.encryptor.encrypt_file(file_path, password)
-                self.update_status(f"Файл зашифрован: {os.path.basename(encrypted_file)}", '#00ff00')
-                self.show_info("Успех", f"Файл успешно зашифрован!\nСохранен как: {encrypted_file}")
-            except Exception as e:
-                self.update_status(f"Ошибка: {str(e)}", '#ff0000')
-                self.show_error("Ошибка", f"Ошибка шифрования: {str(e)}")
-            finally:
-                self.progress.stop()
-        threading.Thread(target=encrypt_thread, daemon=True).start()
-
-    def encrypt_folder_gui(self):
-        """GUI для шифрования папки (диалоги только в главном потоке)"""
-        folder_path = filedialog.askdirectory(title="Выберите папку для шифрования")
-        if not folder_path:
-            self.update_status("Папка не выбрана", '#ff0000')
-            return
-        password = simpledialog.askstring("Пароль", "Введите пароль для шифрования:", show='*')
-        if not password:
-            self.update_status("Пароль не введен", '#ff0000')
-            return
-        def encrypt_thread():
-            try:
-                self.progress.start()
-                self.update_status("Шифрование папки...", '#ffff00')
-                encrypted_files = self.encryptor.encrypt_folder(folder_path, password)
-                self.update_status(f"Зашифровано файлов: {len(encrypted_files)}", '#00ff00')
-                self.show_info("Успех", f"Папка успешно зашифрована!\nЗашифровано файлов: {len(encrypted_files)}")
-            except Exception as e:
-                self.update_status(f"Ошибка: {str(e)}", '#ff0000')
-                self.show_error("Ошибка", f"Ошибка шифрования: {str(e)}")
-            finally:
-                self.progress.stop()
-        threading.Thread(target=encrypt_thread, daemon=True).start()
+    def get_store(self, store_dir: str, password: str, store_key: bytes = None) -> chunk_store.ChunkStore:
+        """Хранилище чанков; store_key - уже вычисленный мастер-ключ, чтобы не повторять PBKDF2"""
+        if store_key is None:
+            store_key = self.get_store_key(store_dir, password)
+        return chunk_store.ChunkStore(store_dir, store_key, self.backend, self.KEY_SIZE)
+    
+    def store_file(self, file_path: str, password: str, store_dir: str, store_key: bytes = None) -> str:
+        """
+        Сохранение файла в хранилище чанков с дедупликацией.
+        Шифруются и записываются только чанки, которых еще нет в хранилище;
+        рядом с файлом создается зашифрованный рецепт <файл>.sfprecipe.
+        """
+        try:
+            store = self.get_store(store_dir, password, store_key)
+            recipe = store.put_file(file_path)
+            recipe_path = file_path + chunk_store.RECIPE_EXTENSION
+            store.write_recipe(recipe, recipe_path, self.DURABILITY)
+            
+            file_logger.info(
+                f"Файл сохранен в хранилище: {recipe_path} "
+                f"(новых чанков {recipe['new_chunks']} из {len(recipe['chunks'])}, {recipe['new_bytes']} байт)"
+            )
+            return recipe_path
+            
+        except Exception as e:
+            logging.error(f"Ошибка сохранения файла в хранилище: {e}")
+            raise
     
-    def run(self):
-        """Запуск GUI"""
-        self.root.mainloop()
+    def store_folder(self, folder_path: str, password: str, store_dir: str, workers: int = None) -> list:
+        """
+        Сохранение всех файлов папки в хранилище чанков (PBKDF2 один раз,
+        файлы обрабатываются в пуле процессов).
+        """
+        try:
+            store_key = self.get_store_key(store_dir, password)
+            store_root = os.path.abspath(store_dir)
+            tasks = []
+            for root, dirs, files in os.walk(folder_path):
+                # Само хранилище внутри папки не сохраняется
+                dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) != store_root]
+                for file in files:
+                    if file.endswith(chunk_store.RECIPE_EXTENSION) or file in self.SERVICE_FILES or atomic_io.is_temp(file):
+                        continue
+                    tasks.append((os.path.join(root, file), password, store_dir, store_key))
+            
+            results = folder_engine.run_parallel(self.store_file, tasks, workers)
+            for result in results:
+                if not result.ok:
+                    logging.error(f"Ошибка сохранения файла {result.path}: {result.error}")
+            folder_engine.raise_for_failures(results, "Сохранение папки в хранилище")
+            
+            logging.info(f"Папка сохранена в хранилище: {folder_path}")
+            return [result.output for result in results]
+            
+        except Exception as e:
+            logging.error(f"Ошибка сохранения папки в хранилище: {e}")
+            raise
+    
+    def encrypt_folder_to_archive(self, folder_path: str, password: str, archive_path: str = None) -> str:
+        """
+        Шифрование всей папки в один архив (см. archive.py).
+        PBKDF2 выполняется один раз, файлы пишутся потоком в один контейнер
+        с зашифрованным индексом. По умолчанию архив создается рядом с
+        папкой: <папка>.sfparchive.
+        """
+        archive_path = archive_path or os.path.abspath(folder_path).rstrip(os.sep) + archive.ARCHIVE_EXTENSION
+        try:
+            salt = os.urandom(self.SALT_SIZE)
+            master_key = self.derive_master_key(password, salt)
+            segment_key = file_format.derive_segment_key(master_key, self.KEY_SIZE)
+            with atomic_io.AtomicOutput(archive_path, self.DURABILITY) as archive_file, \
+                    pipeline.WriteBehind(archive_file, self.QUEUE_DEPTH) as writer:
+                file_count = archive.write_archive(
+                    writer, folder_path, self.backend.aead(segment_key), salt,
+                    segment_size=self.SEGMENT_SIZE, buffer_size=self.BUFFER_SIZE,
+                    exclude=(archive_path, atomic_io.temp_path(archive_path)),
+                    key_check=file_format.key_check_value(master_key)
+                )
+            
+            logging.info(f"Папка зашифрована в архив: {archive_path} (файлов: {file_count})")
+            return archive_path
+            
+        except Exception as e:
+            logging.error(f"Ошибка шифрования папки в архив: {e}")
+            raise
+
+def __getattr__(name):
+    # EncryptorGUI импортируется по требованию: tkinter не нужен без GUI
+    if name == 'EncryptorGUI':
+        from encryptor_gui import EncryptorGUI
+        return EncryptorGUI
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def main():
-    """Главная функция"""
-    try:
-        app = EncryptorGUI()
-        app.run()
-    except Exception as e:
-        logging.error(f"Критическая ошибка: {e}")
-        messagebox.showerror("Критическая ошибка", f"Ошибка запуска: {str(e)}")
+    """Главная функция: запуск графического интерфейса"""
+    import encryptor_gui
+    encryptor_gui.main()
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    main()
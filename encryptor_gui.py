@@ -0,0 +1,239 @@
+"""
+Графический интерфейс шифровальщика (tkinter)
+
+Вынесен из encryptor.py: библиотека и командная строка (cli.py) работают
+без tkinter и без дисплея.
+"""
+
+import os
+import logging
+import threading
+import tkinter as tk
+from tkinter import filedialog, simpledialog, messagebox, ttk
+
+import job_journal
+import progress
+from encryptor import SecureFileEncryptor
+
+class EncryptorGUI:
+    def __init__(self):
+        self.encryptor = SecureFileEncryptor()
+        self.setup_gui()
+    
+    def setup_gui(self):
+        """Настройка графического интерфейса"""
+        self.root = tk.Tk()
+        self.root.title("SFP Secure File Encryptor v3.0")
+        self.root.geometry("600x400")
+        self.root.configure(bg='#2b2b2b')
+        
+        # Стили
+        style = ttk.Style()
+        style.theme_use('clam')
+        style.configure('TButton', padding=10, font=('Arial', 10))
+        style.configure('TLabel', background='#2b2b2b', foreground='white', font=('Arial', 10))
+        
+        # Заголовок
+        title_label = tk.Label(
+            self.root, 
+            text="SFP Secure File Encryptor", 
+            font=('Arial', 16, 'bold'),
+            bg='#2b2b2b',
+            fg='#00ff00'
+        )
+        title_label.pack(pady=20)
+        
+        # Фрейм для кнопок
+        button_frame = tk.Frame(self.root, bg='#2b2b2b')
+        button_frame.pack(pady=20)
+        
+        # Кнопки
+        encrypt_file_btn = tk.Button(
+            button_frame,
+            text="Зашифровать файл",
+            command=self.encrypt_file_gui,
+            bg='#4CAF50',
+            fg='white',
+            font=('Arial', 12),
+            padx=20,
+            pady=10,
+            relief='flat'
+        )
+        encrypt_file_btn.pack(pady=10)
+        
+        encrypt_folder_btn = tk.Button(
+            button_frame,
+            text="Зашифровать папку",
+            command=self.encrypt_folder_gui,
+            bg='#2196F3',
+            fg='white',
+            font=('Arial', 12),
+            padx=20,
+            pady=10,
+            relief='flat'
+        )
+        encrypt_folder_btn.pack(pady=10)
+        
+        # Статус
+        self.status_label = tk.Label(
+            self.root,
+            text="Готов к работе",
+            bg='#2b2b2b',
+            fg='#00ff00',
+            font=('Arial', 10)
+        )
+        self.status_label.pack(pady=20)
+        
+        # Прогресс бар
+        self.progress = ttk.Progressbar(
+            self.root,
+            mode='determinate',
+            maximum=100
+        )
+        self.progress.pack(pady=10, padx=50, fill='x')
+        
+        # Отмена задания над папкой (готовые файлы остаются в журнале задания)
+        self.cancel_token = None
+        # Рабочие потоки: окно закрывается только после их завершения
+        self.workers = []
+        self.closing = False
+        self.cancel_btn = tk.Button(
+            self.root,
+            text="Отмена",
+            command=self.cancel_job,
+            bg='#f44336',
+            fg='white',
+            font=('Arial', 10),
+            relief='flat',
+            state='disabled'
+        )
+        self.cancel_btn.pack(pady=5)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+    
+    def update_status(self, message: str, color: str = '#00ff00'):
+        """Обновление статуса (безопасно для потоков)"""
+        def _update():
+            if self.status_label.winfo_exists():
+                self.status_label.config(text=message, fg=color)
+        self.root.after(0, _update)
+
+    def update_progress(self, event: progress.ProgressEvent):
+        """Обновление прогресса из рабочего потока (вызывается не чаще ProgressReporter.interval)"""
+        def _update():
+            if self.progress.winfo_exists():
+                self.progress['value'] = event.fraction * 100
+                self.status_label.config(text=progress.format_event(event), fg='#ffff00')
+        self.root.after(0, _update)
+
+    def cancel_job(self):
+        """Отмена задания: начатые файлы дописываются, новые не запускаются"""
+        if self.cancel_token is not None:
+            self.cancel_token.cancel()
+            self.update_status("Отмена...", '#ffff00')
+
+    def on_close(self):
+        """
+        Закрытие окна; прерванное задание продолжится при повторном запуске.
+        Окно скрывается сразу, а уничтожается после того, как рабочие потоки
+        допишут начатые файлы: потоки-демоны иначе оборвутся на середине файла.
+        """
+        self.closing = True
+        self.cancel_job()
+        self.root.withdraw()
+        self.destroy_when_idle()
+
+    def destroy_when_idle(self):
+        """Уничтожение окна после завершения рабочих потоков (опрос из mainloop)"""
+        self.workers = [worker for worker in self.workers if worker.is_alive()]
+        if self.workers:
+            self.root.after(100, self.destroy_when_idle)
+        else:
+            self.root.destroy()
+
+    def start_worker(self, target):
+        """Запуск рабочего потока задания"""
+        worker = threading.Thread(target=target, daemon=True)
+        self.workers.append(worker)
+        worker.start()
+
+    def show_info(self, title, message):
+        if not self.closing:
+            self.root.after(0, lambda: messagebox.showinfo(title, message, parent=self.root))
+
+    def show_error(self, title, message):
+        if not self.closing:
+            self.root.after(0, lambda: messagebox.showerror(title, message, parent=self.root))
+
+    def encrypt_file_gui(self):
+        """GUI для шифрования файла (диалоги только в главном потоке)"""
+        file_path = filedialog.askopenfilename(title="Выберите файл для шифрования")
+        if not file_path:
+            self.update_status("Файл не выбран", '#ff0000')
+            return
+        password = simpledialog.askstring("Пароль", "Введите пароль для шифрования:", show='*')
+        if not password:
+            self.update_status("Пароль не введен", '#ff0000')
+            return
+        def encrypt_thread():
+            try:
+                self.update_status("Шифрование...", '#ffff00')
+                encrypted_file = self.encryptor.encrypt_file(file_path, password, on_progress=self.update_progress)
+                self.update_status(f"Файл зашифрован: {os.path.basename(encrypted_file)}", '#00ff00')
+                self.show_info("Успех", f"Файл успешно зашифрован!\nСохранен как: {encrypted_file}")
+            except Exception as e:
+                self.update_status(f"Ошибка: {str(e)}", '#ff0000')
+                self.show_error("Ошибка", f"Ошибка шифрования: {str(e)}")
+        self.progress['value'] = 0
+        self.start_worker(encrypt_thread)
+
+    def encrypt_folder_gui(self):
+        """GUI для шифрования папки (диалоги только в главном потоке)"""
+        folder_path = filedialog.askdirectory(title="Выберите папку для шифрования")
+        if not folder_path:
+            self.update_status("Папка не выбрана", '#ff0000')
+            return
+        password = simpledialog.askstring("Пароль", "Введите пароль для шифрования:", show='*')
+        if not password:
+            self.update_status("Пароль не введен", '#ff0000')
+            return
+        incremental_mode = messagebox.askyesno(
+            "Режим шифрования",
+            "Шифровать только новые и измененные файлы?\n"
+            "(изменения отслеживаются по манифесту в корне папки)"
+        )
+        def encrypt_thread():
+            try:
+                self.update_status("Шифрование папки...", '#ffff00')
+                encrypted_files = self.encryptor.encrypt_folder(
+                    folder_path, password, incremental_mode=incremental_mode,
+                    on_progress=self.update_progress, cancel_token=self.cancel_token
+                )
+                self.update_status(f"Зашифровано файлов: {len(encrypted_files)}", '#00ff00')
+                self.show_info("Успех", f"Папка успешно зашифрована!\nЗашифровано файлов: {len(encrypted_files)}")
+            except job_journal.JobCancelled:
+                self.update_status("Отменено. Повторный запуск продолжит с места остановки", '#ffff00')
+            except Exception as e:
+                self.update_status(f"Ошибка: {str(e)}", '#ff0000')
+                self.show_error("Ошибка", f"Ошибка шифрования: {str(e)}")
+            finally:
+                self.root.after(0, lambda: self.cancel_btn.config(state='disabled'))
+        self.progress['value'] = 0
+        self.cancel_token = job_journal.CancelToken()
+        self.cancel_btn.config(state='normal')
+        self.start_worker(encrypt_thread)
+    
+    def run(self):
+        """Запуск GUI"""
+        self.root.mainloop()
+
+def main():
+    """Главная функция"""
+    try:
+        app = EncryptorGUI()
+        app.run()
+    except Exception as e:
+        logging.error(f"Критическая ошибка: {e}")
+        messagebox.showerror("Критическая ошибка", f"Ошибка запуска: {str(e)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,271 @@
+"""
+Формат зашифрованных файлов SFP
+
+Версия 0 (старый формат GUI, без заголовка):
+    IV(16) + encrypted_data + HMAC(32) + salt(32)
+    Ключи шифрования и HMAC совпадают: PBKDF2-HMAC-SHA1(password, salt).
+
+Версия 2:
+    MAGIC(8) + version(1) + flags(1) + salt(32) + IV(16) + encrypted_data + HMAC(32)
+    PBKDF2-HMAC-SHA256 выполняется один раз, ключи шифрования и HMAC
+    выводятся из его результата через HKDF-SHA256.
+    HMAC считается по заголовку и encrypted_data.
+
+    С флагом FLAG_FOLDER_KEY ключи файла выводятся не из пароля, а из
+    мастер-ключа папки: HKDF-SHA256(folder_key, salt=salt файла).
+    Соль мастер-ключа хранится один раз в заголовке папки (.sfp_folder):
+    FOLDER_MAGIC(8) + version(1) + salt(32)
+
+Версия 3 (сегментированный формат, см. segmented_format.py):
+    MAGIC(8) + version(1) + flags(1) + salt(32) + nonce_prefix(7) + segment_size(4)
+    + сегменты AES-256-GCM, каждый со своим тегом аутентификации.
+    Ключ сегментов выводится из мастер-ключа через HKDF-SHA256.
+    С флагом FLAG_ARCHIVE контейнер хранит архив папки (см. archive.py).
+
+В версиях 2 и 3 с флагом FLAG_COMPRESSED сразу после заголовка идет
+идентификатор алгоритма сжатия(1) (см. compression.py); этот байт входит в
+заголовок (HMAC / AAD), а шифруются уже сжатые данные.
+
+С флагом FLAG_KEY_CHECK заголовок заканчивается проверочным значением
+ключа(16): HKDF-SHA256(мастер-ключ, info=KEY_CHECK_INFO, salt как у подключей
+файла). Неверный пароль обнаруживается сразу после PBKDF2, без чтения
+шифртекста; подлинность данных по-прежнему проверяют HMAC / GCM.
+Заголовок папки версии 3 хранит такое же значение для мастер-ключа папки:
+FOLDER_MAGIC(8) + version(1) + salt(32) + key_check(16)
+
+Пароль для PBKDF2 в версиях 2 и 3 кодируется в UTF-8.
+"""
+
+import hashlib
+import hmac
+import os
+import struct
+
+MAGIC = b'SFPFILE\x00'
+
+FOLDER_MAGIC = b'SFPDIR\x00\x00'
+FOLDER_HEADER_NAME = '.sfp_folder'
+
+FORMAT_LEGACY = 0
+FORMAT_V2 = 2
+FORMAT_SEGMENTED = 3
+
+# Флаги заголовка
+FLAG_FOLDER_KEY = 0x01
+FLAG_ARCHIVE = 0x02  # Только версия 3
+FLAG_COMPRESSED = 0x04
+FLAG_KEY_CHECK = 0x08
+KNOWN_FLAGS = FLAG_FOLDER_KEY | FLAG_ARCHIVE | FLAG_COMPRESSED | FLAG_KEY_CHECK
+
+# Версии заголовка папки
+FOLDER_VERSION = FORMAT_V2
+FOLDER_VERSION_KEY_CHECK = 3
+
+SALT_SIZE = 32
+IV_SIZE = 16
+NONCE_PREFIX_SIZE = 7
+KEY_CHECK_SIZE = 16
+HEADER_V2_SIZE = len(MAGIC) + 2 + SALT_SIZE + IV_SIZE
+HEADER_V3_SIZE = len(MAGIC) + 2 + SALT_SIZE + NONCE_PREFIX_SIZE + 4
+
+# Контексты HKDF для подключей
+ENCRYPTION_KEY_INFO = b'SFP v2 encryption key'
+HMAC_KEY_INFO = b'SFP v2 hmac key'
+SEGMENT_KEY_INFO = b'SFP v3 segment key'
+KEY_CHECK_INFO = b'SFP key check'
+
+
+class WrongPasswordError(ValueError):
+    """Проверочное значение ключа не совпало: пароль неверный"""
+
+
+class FileHeader:
+    """Разобранный заголовок зашифрованного файла"""
+
+    def __init__(self, version: int, flags: int, salt: bytes, iv: bytes, raw: bytes,
+                 nonce_prefix: bytes = None, segment_size: int = None, compression: int = 0,
+                 key_check: bytes = None):
+        self.version = version
+        self.flags = flags
+        self.salt = salt
+        self.iv = iv  # Только версия 2
+        self.nonce_prefix = nonce_prefix  # Только версия 3
+        self.segment_size = segment_size  # Только версия 3
+        self.raw = raw  # Байты заголовка как в файле (входят в HMAC / AAD)
+        self.compression = compression  # Идентификатор алгоритма сжатия, 0 - без сжатия
+        self.key_check = key_check  # Проверочное значение ключа или None (старые файлы)
+
+    @property
+    def size(self) -> int:
+        return len(self.raw)
+
+
+def _optional_fields(flags: int, compression: int, key_check: bytes) -> tuple:
+    """Флаги и необязательные поля после заголовка: сжатие, затем проверочное значение"""
+    flags &= ~(FLAG_COMPRESSED | FLAG_KEY_CHECK)
+    suffix = b''
+    if compression:
+        flags |= FLAG_COMPRESSED
+        suffix += bytes([compression])
+    if key_check:
+        if len(key_check) != KEY_CHECK_SIZE:
+            raise ValueError("Неверный размер проверочного значения ключа")
+        flags |= FLAG_KEY_CHECK
+        suffix += key_check
+    return flags, suffix
+
+
+def build_header(salt: bytes, iv: bytes, flags: int = 0, compression: int = 0, key_check: bytes = b'') -> bytes:
+    """Сборка заголовка формата версии 2"""
+    flags, suffix = _optional_fields(flags, compression, key_check)
+    return MAGIC + bytes([FORMAT_V2, flags]) + salt + iv + suffix
+
+
+def build_segmented_header(salt: bytes, nonce_prefix: bytes, segment_size: int, flags: int = 0,
+                           compression: int = 0, key_check: bytes = b'') -> bytes:
+    """Сборка заголовка формата версии 3"""
+    flags, suffix = _optional_fields(flags, compression, key_check)
+    return MAGIC + bytes([FORMAT_SEGMENTED, flags]) + salt + nonce_prefix + struct.pack('>I', segment_size) + suffix
+
+
+def _read_exact(file, size: int) -> bytes:
+    data = file.read(size)
+    if len(data) != size:
+        raise ValueError("Заголовок файла обрезан")
+    return data
+
+
+def read_header(file) -> FileHeader:
+    """
+    Чтение заголовка с начала файла.
+    Возвращает None для файлов старого формата без заголовка
+    (позиция в файле при этом возвращается в начало; у потоков без
+    перемотки, например stdin, прочитанные байты теряются).
+    """
+    start = file.read(len(MAGIC))
+    if start != MAGIC:
+        if file.seekable():
+            file.seek(0)
+        return None
+
+    version_flags = _read_exact(file, 2)
+    version, flags = version_flags
+    if version not in (FORMAT_V2, FORMAT_SEGMENTED):
+        raise ValueError(f"Неподдерживаемая версия формата: {version}")
+    if flags & ~KNOWN_FLAGS:
+        raise ValueError(f"Неподдерживаемые флаги заголовка: {flags:#x}")
+
+    salt = _read_exact(file, SALT_SIZE)
+    if version == FORMAT_V2:
+        iv = _read_exact(file, IV_SIZE)
+        raw = start + version_flags + salt + iv
+        header = FileHeader(version, flags, salt, iv, raw)
+    else:
+        nonce_prefix = _read_exact(file, NONCE_PREFIX_SIZE)
+        segment_size_raw = _read_exact(file, 4)
+        segment_size = struct.unpack('>I', segment_size_raw)[0]
+        if segment_size == 0:
+            raise ValueError("Неверный размер сегмента в заголовке")
+        raw = start + version_flags + salt + nonce_prefix + segment_size_raw
+        header = FileHeader(version, flags, salt, None, raw, nonce_prefix, segment_size)
+
+    if flags & FLAG_COMPRESSED:
+        compression_raw = _read_exact(file, 1)
+        if compression_raw[0] == 0:
+            raise ValueError("Неверный идентификатор сжатия в заголовке")
+        header.compression = compression_raw[0]
+        header.raw += compression_raw
+    if flags & FLAG_KEY_CHECK:
+        header.key_check = _read_exact(file, KEY_CHECK_SIZE)
+        header.raw += header.key_check
+    return header
+
+
+def hkdf_sha256(key: bytes, length: int, info: bytes, salt: bytes = b'') -> bytes:
+    """HKDF-SHA256 (RFC 5869)"""
+    prk = hmac.new(salt or bytes(32), key, hashlib.sha256).digest()
+    output = b''
+    block = b''
+    counter = 1
+    while len(output) < length:
+        block = hmac.new(prk, block + info + bytes([counter]), hashlib.sha256).digest()
+        output += block
+        counter += 1
+    return output[:length]
+
+
+def derive_subkeys(master_key: bytes, key_size: int = 32, salt: bytes = b'') -> tuple:
+    """
+    Вывод независимых ключей шифрования и HMAC из одного мастер-ключа.
+    salt задается для ключей отдельного файла в режиме папки.
+    """
+    encryption_key = hkdf_sha256(master_key, key_size, ENCRYPTION_KEY_INFO, salt)
+    hmac_key = hkdf_sha256(master_key, key_size, HMAC_KEY_INFO, salt)
+    return encryption_key, hmac_key
+
+
+def derive_segment_key(master_key: bytes, key_size: int = 32, salt: bytes = b'') -> bytes:
+    """Ключ AES-GCM для сегментов формата версии 3"""
+    return hkdf_sha256(master_key, key_size, SEGMENT_KEY_INFO, salt)
+
+
+def key_check_value(master_key: bytes, salt: bytes = b'') -> bytes:
+    """Проверочное значение ключа для заголовка (ключи по нему не восстановить)"""
+    return hkdf_sha256(master_key, KEY_CHECK_SIZE, KEY_CHECK_INFO, salt)
+
+
+def check_key(key_check: bytes, master_key: bytes, salt: bytes = b''):
+    """
+    Быстрая проверка пароля по проверочному значению из заголовка.
+    key_check None (файл без FLAG_KEY_CHECK) - проверка пропускается.
+    """
+    if key_check is not None and not hmac.compare_digest(key_check, key_check_value(master_key, salt)):
+        raise WrongPasswordError("Неверный пароль")
+
+
+def write_folder_header(folder_path: str, salt: bytes, key_check: bytes = b'') -> str:
+    """Запись заголовка папки с солью (и проверочным значением) мастер-ключа"""
+    header_path = os.path.join(folder_path, FOLDER_HEADER_NAME)
+    if key_check and len(key_check) != KEY_CHECK_SIZE:
+        raise ValueError("Неверный размер проверочного значения ключа")
+    version = FOLDER_VERSION_KEY_CHECK if key_check else FOLDER_VERSION
+    with open(header_path, 'wb') as file:
+        file.write(FOLDER_MAGIC + bytes([version]) + salt + key_check)
+    return header_path
+
+
+def read_folder_header(header_path: str) -> tuple:
+    """
+    Чтение заголовка папки: (соль мастер-ключа, проверочное значение);
+    у заголовков версии 2 проверочного значения нет (None).
+    """
+    with open(header_path, 'rb') as file:
+        data = file.read()
+    if not data.startswith(FOLDER_MAGIC) or len(data) < len(FOLDER_MAGIC) + 1:
+        raise ValueError(f"Неверный формат заголовка папки: {header_path}")
+    version = data[len(FOLDER_MAGIC)]
+    sizes = {FOLDER_VERSION: SALT_SIZE, FOLDER_VERSION_KEY_CHECK: SALT_SIZE + KEY_CHECK_SIZE}
+    if version not in sizes:
+        raise ValueError(f"Неподдерживаемая версия заголовка папки: {version}")
+    body = data[len(FOLDER_MAGIC) + 1:]
+    if len(body) != sizes[version]:
+        raise ValueError(f"Неверный формат заголовка папки: {header_path}")
+    return body[:SALT_SIZE], body[SALT_SIZE:] or None
+
+
+def find_folder_header(start_dir: str, stop_dir: str = None) -> str:
+    """
+    Поиск ближайшего заголовка папки от start_dir вверх по дереву.
+    Если задан stop_dir, поиск не поднимается выше него.
+    Возвращает путь к заголовку или None.
+    """
+    current = os.path.abspath(start_dir)
+    stop = os.path.abspath(stop_dir) if stop_dir else None
+    while True:
+        header_path = os.path.join(current, FOLDER_HEADER_NAME)
+        if os.path.isfile(header_path):
+            return header_path
+        parent = os.path.dirname(current)
+        if current == stop or parent == current:
+            return None
+        current = parent
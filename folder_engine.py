@@ -0,0 +1,147 @@
+"""
+Параллельная обработка файлов папки в пуле процессов
+
+Используется шифровальщиком, дешифровальщиком и скриптами terminal_version.
+Результаты возвращаются в порядке входных задач; ошибка одного файла
+не прерывает обработку остальных.
+"""
+
+import os
+import signal
+from concurrent.futures import ProcessPoolExecutor
+
+import job_metrics
+
+
+class FileResult:
+    """Результат обработки одного файла"""
+
+    def __init__(self, path: str, output=None, error: str = None, metrics: dict = None):
+        self.path = path
+        self.output = output
+        self.error = error
+        self.metrics = metrics  # Снимок job_metrics.JobMetrics, если метрики собирались
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __repr__(self):
+        state = 'ok' if self.ok else f'error={self.error!r}'
+        return f"FileResult({self.path!r}, {state})"
+
+
+class FolderProcessingError(Exception):
+    """Часть файлов папки не обработана; results содержит все результаты"""
+
+    def __init__(self, message: str, results: list):
+        super().__init__(message)
+        self.results = results
+
+    @property
+    def failed(self) -> list:
+        return [result for result in self.results if not result.ok]
+
+
+def default_workers() -> int:
+    """Число рабочих процессов по умолчанию - по числу доступных ядер"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0)) or 1
+    return os.cpu_count() or 1
+
+
+def file_size(path: str) -> int:
+    """
+    Размер файла для отчета о прогрессе. Недоступный файл (удален, битая
+    ссылка, нет прав) считается пустым: его ошибка попадет в FileResult при
+    обработке, а не прервет всю папку еще до запуска пула.
+    """
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _ignore_interrupt():
+    """Ctrl+C обрабатывает главный процесс: рабочие дописывают текущие файлы"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _run_task(task) -> FileResult:
+    """Выполнение одной задачи с перехватом ошибки (в рабочем процессе)"""
+    func, args, collect_metrics = task
+    if not collect_metrics:
+        try:
+            return FileResult(args[0], func(*args))
+        except Exception as e:
+            return FileResult(args[0], error=f"{type(e).__name__}: {e}")
+    metrics = job_metrics.JobMetrics()
+    try:
+        return FileResult(args[0], func(*args, metrics=metrics), metrics=metrics.snapshot())
+    except Exception as e:
+        return FileResult(args[0], error=f"{type(e).__name__}: {e}", metrics=metrics.snapshot())
+
+
+def _run_chunk(tasks: list) -> list:
+    """Пачка задач в одном рабочем процессе"""
+    return [_run_task(task) for task in tasks]
+
+
+def run_parallel(func, tasks: list, workers: int = None, on_result=None, cancel_token=None,
+                 collect_metrics: bool = False) -> list:
+    """
+    Вызов func(*args) для каждого кортежа args из tasks в пуле процессов.
+    Первый аргумент каждой задачи - путь к файлу.
+    func и аргументы должны сериализоваться pickle (функция модуля или
+    метод объекта). Возвращает список FileResult в порядке tasks.
+    on_result(result) вызывается в текущем процессе по мере готовности
+    результатов (для отчета о ходе обработки и контрольных точек).
+    cancel_token (job_journal.CancelToken) проверяется между файлами: после
+    отмены новые задачи не запускаются и выбрасывается JobCancelled.
+    С collect_metrics func получает именованный аргумент metrics
+    (job_metrics.JobMetrics), а его снимок возвращается в result.metrics.
+    """
+    workers = workers or default_workers()
+    tasks = [(func, tuple(args), collect_metrics) for args in tasks]
+
+    if workers == 1 or len(tasks) < 2:
+        return _collect(map(_run_task, tasks), on_result, cancel_token)
+
+    workers = min(workers, len(tasks))
+    # Задачи отдаются пачками, чтобы не платить за IPC на каждый мелкий файл
+    chunksize = max(1, min(64, len(tasks) // (workers * 4)))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_ignore_interrupt) as executor:
+        futures = [executor.submit(_run_chunk, tasks[start:start + chunksize])
+                   for start in range(0, len(tasks), chunksize)]
+        try:
+            results = (result for future in futures for result in future.result())
+            return _collect(results, on_result, cancel_token)
+        except BaseException:
+            # Не ждем еще не начатые задачи (отмена, Ctrl+C, ошибка в on_result);
+            # shutdown(cancel_futures=True) появился только в Python 3.9
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
+            raise
+
+
+def _collect(results, on_result=None, cancel_token=None) -> list:
+    collected = []
+    for result in results:
+        collected.append(result)
+        if on_result is not None:
+            on_result(result)
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+    return collected
+
+
+def raise_for_failures(results: list, action: str):
+    """Исключение FolderProcessingError, если хотя бы один файл не обработан"""
+    failed = [result for result in results if not result.ok]
+    if failed:
+        raise FolderProcessingError(
+            f"{action}: ошибок {len(failed)} из {len(results)} файлов "
+            f"(первая: {failed[0].path}: {failed[0].error})",
+            results
+        )
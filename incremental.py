@@ -0,0 +1,163 @@
+"""
+Манифест изменений для инкрементального шифрования папки
+
+В корне папки хранится .sfp_manifest.json: для каждого исходного файла -
+размер, mtime (нс), inode, необязательный отпечаток содержимого и путь к
+зашифрованному результату. При следующем запуске файл шифруется заново,
+только если он новый, изменились размер/mtime/inode или пропал результат.
+С use_hash файл с новым mtime, но прежним содержимым, повторно не шифруется.
+Результаты файлов, которых больше нет, удаляются; удаляются и проверяются
+только пути внутри папки с расширением .encrypted.
+
+Манифест не зашифрован: он раскрывает имена и размеры файлов, которые и так
+видны по именам и размерам .encrypted файлов рядом с ним. Отпечаток
+содержимого - HMAC-SHA256 с ключом из мастер-ключа папки (hash_key), а не
+голый SHA-256: без пароля по манифесту нельзя проверить догадку о
+содержимом файла (как и идентификаторы чанков в chunk_store.py).
+"""
+
+import hmac
+import json
+import logging
+import os
+
+import file_format
+
+MANIFEST_NAME = '.sfp_manifest.json'
+MANIFEST_VERSION = 2
+HASH_CHUNK_SIZE = 1024 * 1024
+# Контекст HKDF ключа отпечатков содержимого
+HASH_KEY_INFO = b'SFP manifest hash key'
+
+
+def hash_key(master_key: bytes) -> bytes:
+    """Ключ отпечатков содержимого из мастер-ключа папки (заголовок .sfp_folder)"""
+    return file_format.hkdf_sha256(master_key, 32, HASH_KEY_INFO)
+
+
+def file_digest(path: str, key: bytes) -> str:
+    """Отпечаток содержимого файла: HMAC-SHA256 с ключом key"""
+    digest = hmac.new(key, digestmod='sha256')
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FileState:
+    """Состояние исходного файла на момент проверки"""
+
+    def __init__(self, name: str, size: int, mtime_ns: int, inode: int, digest: str = None):
+        self.name = name  # Путь относительно корня папки через '/'
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.inode = inode
+        self.digest = digest
+
+    @classmethod
+    def from_stat(cls, name: str, stat: os.stat_result) -> 'FileState':
+        return cls(name, stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+
+class Manifest:
+    """
+    Манифест папки folder_path.
+    hash_key (см. hash_key()) нужен только для сравнения содержимого (use_hash).
+    """
+
+    def __init__(self, folder_path: str, entries: dict = None, hash_key: bytes = None):
+        self.folder_path = os.path.abspath(folder_path)
+        self.path = os.path.join(self.folder_path, MANIFEST_NAME)
+        self.entries = entries or {}
+        self.hash_key = hash_key
+
+    @classmethod
+    def load(cls, folder_path: str, hash_key: bytes = None) -> 'Manifest':
+        """Загрузка манифеста; если его нет, манифест пустой"""
+        manifest = cls(folder_path, hash_key=hash_key)
+        try:
+            with open(manifest.path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            return manifest
+        if data.get('version') == 1:
+            # Версия 1 хранила открытый SHA-256 содержимого: он отбрасывается,
+            # манифест перезаписывается в версии 2 при сохранении
+            for entry in data['files'].values():
+                entry['digest'] = None
+                entry.pop('sha256', None)
+        elif data.get('version') != MANIFEST_VERSION:
+            raise ValueError(f"Неподдерживаемая версия манифеста: {data.get('version')}")
+        manifest.entries = data['files']
+        return manifest
+
+    def save(self):
+        """Запись манифеста через временный файл, чтобы не оставить его недописанным"""
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump({'version': MANIFEST_VERSION, 'files': self.entries}, file, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+    def relative_name(self, path: str) -> str:
+        return os.path.relpath(os.path.abspath(path), self.folder_path).replace(os.sep, '/')
+
+    def output_path(self, entry: dict) -> str:
+        """
+        Путь к результату записи манифеста или None, если путь ведет за
+        пределы папки или не к .encrypted файлу. Манифест не аутентифицирован,
+        поэтому такие записи пропускаются, а не удаляются по ним файлы.
+        """
+        output_path = os.path.realpath(os.path.join(self.folder_path, entry['output']))
+        root = os.path.realpath(self.folder_path)
+        if os.path.commonpath([root, output_path]) != root or not output_path.endswith('.encrypted'):
+            logging.warning(f"Пропущена запись манифеста с результатом вне папки: {entry['output']}")
+            return None
+        return output_path
+
+    def check(self, file_path: str, use_hash: bool = False) -> FileState:
+        """
+        Состояние файла, если его нужно зашифровать, иначе None.
+        С use_hash при совпадении размера сравниваются отпечатки содержимого.
+        """
+        if use_hash and self.hash_key is None:
+            raise ValueError("Для сравнения содержимого манифесту нужен hash_key")
+        state = FileState.from_stat(self.relative_name(file_path), os.stat(file_path))
+        entry = self.entries.get(state.name)
+        output_path = self.output_path(entry) if entry is not None else None
+        if output_path is None or not os.path.exists(output_path):
+            if use_hash:
+                state.digest = file_digest(file_path, self.hash_key)
+            return state
+        if (entry['size'], entry['mtime_ns'], entry['inode']) == (state.size, state.mtime_ns, state.inode):
+            return None
+        if use_hash:
+            state.digest = file_digest(file_path, self.hash_key)
+            if entry.get('digest') is not None and hmac.compare_digest(entry['digest'], state.digest) \
+                    and entry['size'] == state.size:
+                # Содержимое не изменилось (например, touch): запоминаем новые mtime/inode
+                self.record(state, os.path.join(self.folder_path, entry['output']))
+                return None
+        return state
+
+    def record(self, state: FileState, output_path: str):
+        """Запись состояния успешно зашифрованного файла"""
+        self.entries[state.name] = {
+            'size': state.size,
+            'mtime_ns': state.mtime_ns,
+            'inode': state.inode,
+            'digest': state.digest,
+            'output': self.relative_name(output_path),
+        }
+
+    def remove_missing(self, seen_names: set) -> list:
+        """
+        Удаление результатов файлов, которых больше нет в папке.
+        Возвращает пути удаленных результатов.
+        """
+        removed = []
+        for name in [name for name in self.entries if name not in seen_names]:
+            output_path = self.output_path(self.entries.pop(name))
+            if output_path is not None and os.path.exists(output_path):
+                os.remove(output_path)
+                removed.append(output_path)
+        return removed
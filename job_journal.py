@@ -0,0 +1,156 @@
+"""
+Журнал задания над папкой: контрольные точки, отмена и продолжение
+
+В корне папки во время шифрования/дешифрования ведется .sfp_job.jsonl:
+первая строка - действие и параметры задания, далее по строке на каждый
+готовый файл (исходный размер и mtime, путь и размер результата). Строки
+дописываются сразу после готовности файла, поэтому после перезагрузки,
+Ctrl+C или закрытия окна повторный запуск пропускает готовые файлы.
+
+Недописанный результат обнаруживается так: файла нет в журнале (его
+результат перезаписывается заново) или размер результата не совпадает с
+записанным. Если исходный файл изменился, он тоже обрабатывается заново.
+Журнал с другими действием или параметрами не используется. После
+успешной обработки всей папки журнал удаляется.
+"""
+
+import json
+import os
+import signal
+import sys
+import threading
+
+JOURNAL_NAME = '.sfp_job.jsonl'
+JOURNAL_VERSION = 1
+
+
+class JobCancelled(Exception):
+    """Задание отменено; готовые файлы сохранены в журнале"""
+
+
+class CancelToken:
+    """Флаг отмены, который можно выставить из другого потока или обработчика сигнала"""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise JobCancelled("Задание отменено")
+
+
+class JobJournal:
+    """Журнал задания action над папкой folder_path с параметрами options"""
+
+    def __init__(self, folder_path: str, action: str, options: dict = None):
+        self.folder_path = os.path.abspath(folder_path)
+        self.path = os.path.join(self.folder_path, JOURNAL_NAME)
+        self.header = {'version': JOURNAL_VERSION, 'action': action, 'options': options or {}}
+        self.entries = {}
+        self._file = None
+        self._partial_line = False
+
+    @classmethod
+    def open(cls, folder_path: str, action: str, options: dict = None) -> 'JobJournal':
+        """Продолжение подходящего журнала или начало нового"""
+        journal = cls(folder_path, action, options)
+        resumed = journal._load()
+        journal._file = open(journal.path, 'a' if resumed else 'w', encoding='utf-8')
+        if not resumed:
+            journal._append(journal.header)
+        elif journal._partial_line:
+            # Новые записи - с новой строки после недописанной
+            journal._file.write('\n')
+        return journal
+
+    def _load(self) -> bool:
+        try:
+            with open(self.path, 'r', encoding='utf-8', errors='replace') as file:
+                data = file.read()
+        except FileNotFoundError:
+            return False
+        lines = data.splitlines()
+        self._partial_line = not data.endswith('\n')
+        if not lines or self._parse(lines[0]) != self.header:
+            return False
+        for line in lines[1:]:
+            entry = self._parse(line)
+            # Последняя строка может быть недописана при сбое
+            if entry is not None:
+                self.entries[entry['name']] = entry
+        return True
+
+    @staticmethod
+    def _parse(line: str):
+        try:
+            return json.loads(line)
+        except ValueError:
+            return None
+
+    def _append(self, data: dict):
+        self._file.write(json.dumps(data, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self._file.flush()
+
+    def relative_name(self, path: str) -> str:
+        return os.path.relpath(os.path.abspath(path), self.folder_path).replace(os.sep, '/')
+
+    def done_output(self, source_path: str) -> str:
+        """
+        Путь результата, если файл уже обработан этим заданием и результат
+        цел, иначе None (файл нужно обработать заново).
+        """
+        entry = self.entries.get(self.relative_name(source_path))
+        if entry is None:
+            return None
+        try:
+            stat = os.stat(source_path)
+            output_path = os.path.join(self.folder_path, entry['output'])
+            output_size = os.path.getsize(output_path)
+        except OSError:
+            return None
+        if (stat.st_size, stat.st_mtime_ns, output_size) != (entry['size'], entry['mtime_ns'], entry['output_size']):
+            return None
+        return output_path
+
+    def record(self, source_path: str, output_path: str):
+        """Контрольная точка: файл обработан, результат записан целиком"""
+        stat = os.stat(source_path)
+        entry = {
+            'name': self.relative_name(source_path),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'output': self.relative_name(output_path),
+            'output_size': os.path.getsize(output_path),
+        }
+        self.entries[entry['name']] = entry
+        self._append(entry)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def complete(self):
+        """Задание выполнено целиком: журнал больше не нужен"""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def cancel_on_interrupt(token: CancelToken):
+    """
+    Ctrl+C в терминальных скриптах: первое нажатие отменяет задание через
+    token (начатые файлы дописываются), второе прерывает процесс как обычно.
+    """
+    def handler(signum, frame):
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        sys.stderr.write("\nОтмена: дописываются начатые файлы (повторный Ctrl+C - прервать сразу)\n")
+        token.cancel()
+    signal.signal(signal.SIGINT, handler)
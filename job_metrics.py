@@ -0,0 +1,345 @@
+"""
+Метрики задания: время по фазам, объем данных, скорость и пиковая память
+
+Шифровальщик, дешифровальщик и скрипты terminal_version принимают metrics
+(JobMetrics) и учитывают в нем фазы обработки:
+    kdf      - PBKDF2 (вывод мастер-ключа из пароля);
+    read     - чтение с диска (при чтении через mmap время чтения
+               приходится на фазы, которые первыми касаются данных);
+    compress - сжатие и распаковка (объем - сжатые данные);
+    cipher   - AES: CBC или GCM вместе с его аутентификацией;
+    hmac     - HMAC-SHA256 форматов v1/v2;
+    write    - запись результата.
+Время фазы - сумма времени ее вызовов во всех потоках и процессах, без
+вложенных фаз. С конвейером и пулом процессов фазы идут одновременно,
+поэтому их сумма может превышать длительность задания.
+
+Без metrics используется DISABLED: учет выключен, и обертки не создаются.
+Рабочие процессы пула возвращают снимок метрик (snapshot) вместе с
+результатом файла, главный процесс складывает их через merge.
+
+Отчет сохраняется в JSON (write_json) или в формате textfile collector
+Prometheus (write_prometheus) - файл *.prom для node exporter. Оба файла
+пишутся атомарно, поэтому экспортер не прочитает недописанный отчет.
+"""
+
+import json
+import sys
+import threading
+import time
+
+import atomic_io
+
+PHASE_KDF = 'kdf'
+PHASE_READ = 'read'
+PHASE_COMPRESS = 'compress'
+PHASE_CIPHER = 'cipher'
+PHASE_HMAC = 'hmac'
+PHASE_WRITE = 'write'
+PHASES = (PHASE_KDF, PHASE_READ, PHASE_COMPRESS, PHASE_CIPHER, PHASE_HMAC, PHASE_WRITE)
+
+PROMETHEUS_PREFIX = 'sfp_job'
+
+
+def peak_memory() -> int:
+    """
+    Пиковый RSS в байтах: максимум по текущему процессу и завершенным
+    дочерним (рабочим процессам пула). 0, если измерить нельзя (Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return 0
+    # ru_maxrss в килобайтах, в macOS - в байтах
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) * scale
+
+
+class _NullPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase:
+    """Контекст фазы: время без вложенных фаз того же потока"""
+
+    def __init__(self, metrics: 'JobMetrics', name: str, size: int):
+        self.metrics = metrics
+        self.name = name
+        self.size = size
+        self.start = 0.0
+
+    def __enter__(self):
+        self.metrics._stack().append(0.0)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics._leave(self.name, time.perf_counter() - self.start, self.size)
+        return False
+
+
+class _Timed:
+    """
+    Обертка файла, шифра, AEAD или HMAC: время вызовов read/write/update/
+    encrypt/decrypt и объем их данных идут в фазу, остальное - как есть
+    """
+
+    def __init__(self, metrics: 'JobMetrics', name: str, obj):
+        self._metrics = metrics
+        self._name = name
+        self._obj = obj
+
+    def __getattr__(self, attr):
+        return getattr(self._obj, attr)
+
+    def read(self, *args):
+        data = self._metrics.call(self._name, 0, self._obj.read, *args)
+        self._metrics.add_bytes(self._name, len(data))
+        return data
+
+    def write(self, data):
+        return self._metrics.call(self._name, len(data), self._obj.write, data)
+
+    def update(self, data):
+        return self._metrics.call(self._name, len(data), self._obj.update, data)
+
+    def update_into(self, data, output):
+        return self._metrics.call(self._name, len(data), self._obj.update_into, data, output)
+
+    def encrypt(self, nonce: bytes, data, associated_data: bytes):
+        return self._metrics.call(self._name, len(data), self._obj.encrypt, nonce, data, associated_data)
+
+    def decrypt(self, nonce: bytes, data, associated_data: bytes):
+        return self._metrics.call(self._name, len(data), self._obj.decrypt, nonce, data, associated_data)
+
+    def close(self):
+        return self._metrics.call(self._name, 0, self._obj.close)
+
+
+class JobMetrics:
+    """Учет метрик задания operation (encrypt, decrypt_folder и т.п.)"""
+
+    def __init__(self, operation: str = '', enabled: bool = True):
+        self.operation = operation
+        self.enabled = enabled
+        self.phases = {}  # Фаза -> [секунды, байты, вызовы]
+        self.files = 0
+        self.failed = 0
+        self.bytes = 0  # Объем входных данных обработанных файлов
+        self.peak_memory = 0
+        self.started = time.perf_counter()
+        self.finished = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stack(self) -> list:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _leave(self, name: str, elapsed: float, size: int):
+        stack = self._stack()
+        inner = stack.pop()
+        if stack:
+            stack[-1] += elapsed
+        with self._lock:
+            phase = self.phases.setdefault(name, [0.0, 0, 0])
+            phase[0] += elapsed - inner
+            phase[1] += size
+            phase[2] += 1
+
+    def phase(self, name: str, size: int = 0):
+        """Контекст фазы: with metrics.phase(PHASE_KDF): ..."""
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name, size)
+
+    def call(self, name: str, size: int, func, *args):
+        """Вызов func(*args) с учетом в фазе name"""
+        stack = self._stack()
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self._leave(name, time.perf_counter() - start, size)
+
+    def add_bytes(self, name: str, size: int):
+        with self._lock:
+            self.phases.setdefault(name, [0.0, 0, 0])[1] += size
+
+    def wrap(self, name: str, obj):
+        """Обертка объекта с учетом его вызовов в фазе name (см. _Timed)"""
+        if not self.enabled:
+            return obj
+        return _Timed(self, name, obj)
+
+    def track(self, name: str, chunks):
+        """Итератор кусков, время получения которых учитывается в фазе name"""
+        if not self.enabled:
+            return chunks
+        return self._track(name, chunks)
+
+    def _track(self, name: str, chunks):
+        iterator = iter(chunks)
+        while True:
+            chunk = self.call(name, 0, next, iterator, None)
+            if chunk is None:
+                return
+            self.add_bytes(name, len(chunk))
+            yield chunk
+
+    def file_done(self, size: int = 0):
+        """Файл обработан; size - объем входных данных"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.files += 1
+            self.bytes += size
+
+    def file_failed(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.failed += 1
+
+    def snapshot(self) -> dict:
+        """Метрики в виде словаря (передаются из рабочих процессов через pickle)"""
+        with self._lock:
+            return {
+                'phases': {name: list(values) for name, values in self.phases.items()},
+                'files': self.files,
+                'failed': self.failed,
+                'bytes': self.bytes,
+                'peak_memory': max(self.peak_memory, peak_memory()),
+            }
+
+    def merge(self, snapshot: dict):
+        """Добавление снимка метрик рабочего процесса"""
+        if not self.enabled or not snapshot:
+            return
+        with self._lock:
+            for name, values in snapshot['phases'].items():
+                phase = self.phases.setdefault(name, [0.0, 0, 0])
+                for index, value in enumerate(values):
+                    phase[index] += value
+            self.files += snapshot['files']
+            self.failed += snapshot['failed']
+            self.bytes += snapshot['bytes']
+            self.peak_memory = max(self.peak_memory, snapshot['peak_memory'])
+
+    def finish(self):
+        """Конец задания: фиксируется длительность"""
+        self.finished = time.perf_counter()
+
+    @property
+    def duration(self) -> float:
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return end - self.started
+
+    def report(self) -> dict:
+        """Итоговый отчет: длительность, файлы в секунду, скорость и фазы"""
+        snapshot = self.snapshot()
+        duration = self.duration
+        phases = {}
+        for name in sorted(snapshot['phases'], key=lambda name: (PHASES + (name,)).index(name)):
+            seconds, size, calls = snapshot['phases'][name]
+            phases[name] = {
+                'seconds': round(seconds, 6),
+                'bytes': size,
+                'calls': calls,
+                'bytes_per_second': round(size / seconds) if seconds > 0 else 0,
+            }
+        return {
+            'operation': self.operation,
+            'timestamp': time.time(),
+            'duration_seconds': round(duration, 6),
+            'files': snapshot['files'],
+            'failed_files': snapshot['failed'],
+            'bytes_in': snapshot['bytes'],
+            'bytes_out': phases.get(PHASE_WRITE, {}).get('bytes', 0),
+            'files_per_second': round(snapshot['files'] / duration, 3) if duration > 0 else 0,
+            'bytes_per_second': round(snapshot['bytes'] / duration) if duration > 0 else 0,
+            'peak_memory_bytes': snapshot['peak_memory'],
+            'phases': phases,
+        }
+
+    def summary(self) -> str:
+        """Отчет одной строкой для лога"""
+        report = self.report()
+        phases = ', '.join(f"{name} {values['seconds']:.3f} с" for name, values in report['phases'].items())
+        return (f"{self.operation}: файлов {report['files']} ({report['files_per_second']:.1f}/с), "
+                f"{report['bytes_in']} байт за {report['duration_seconds']:.3f} с, "
+                f"пик памяти {report['peak_memory_bytes'] // (1024 * 1024)} МБ; фазы: {phases or 'нет'}")
+
+    def write_json(self, path: str):
+        """Сохранение отчета в JSON"""
+        with atomic_io.AtomicOutput(path) as file:
+            file.write(json.dumps(self.report(), ensure_ascii=False, indent=2).encode('utf-8'))
+
+    def write_prometheus(self, path: str, labels: dict = None):
+        """
+        Сохранение отчета для textfile collector node exporter (файл *.prom).
+        labels - дополнительные метки всех метрик, например {'job': 'nightly'}.
+        """
+        report = self.report()
+        base = {'operation': self.operation, **(labels or {})}
+        lines = []
+
+        def metric(name: str, help_text: str, samples: list):
+            full_name = f"{PROMETHEUS_PREFIX}_{name}"
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} gauge")
+            for extra, value in samples:
+                lines.append(f"{full_name}{_format_labels({**base, **extra})} {value}")
+
+        metric('last_run_timestamp_seconds', "Время окончания последнего задания", [({}, report['timestamp'])])
+        metric('duration_seconds', "Длительность задания", [({}, report['duration_seconds'])])
+        metric('files', "Обработано файлов", [({}, report['files'])])
+        metric('failed_files', "Файлов с ошибкой", [({}, report['failed_files'])])
+        metric('bytes', "Объем данных", [({'direction': 'in'}, report['bytes_in']),
+                                         ({'direction': 'out'}, report['bytes_out'])])
+        metric('files_per_second', "Файлов в секунду", [({}, report['files_per_second'])])
+        metric('bytes_per_second', "Входных байт в секунду", [({}, report['bytes_per_second'])])
+        metric('peak_memory_bytes', "Пиковый RSS процесса", [({}, report['peak_memory_bytes'])])
+        phases = report['phases'].items()
+        metric('phase_seconds', "Время фазы без вложенных фаз",
+               [({'phase': name}, values['seconds']) for name, values in phases])
+        metric('phase_bytes', "Объем данных фазы",
+               [({'phase': name}, values['bytes']) for name, values in phases])
+        with atomic_io.AtomicOutput(path) as file:
+            file.write(('\n'.join(lines) + '\n').encode('utf-8'))
+
+    def export(self, json_path: str = None, prometheus_path: str = None):
+        """Завершение задания и сохранение запрошенных отчетов"""
+        if not self.enabled:
+            return
+        self.finish()
+        if json_path:
+            self.write_json(json_path)
+        if prometheus_path:
+            self.write_prometheus(prometheus_path)
+
+
+def _format_labels(labels: dict) -> str:
+    """Метки Prometheus: {name="value",...} с экранированием значений"""
+    if not labels:
+        return ''
+    pairs = []
+    for name, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+# Учет выключен: значение по умолчанию параметра metrics
+DISABLED = JobMetrics(enabled=False)
@@ -0,0 +1,205 @@
+"""
+Настройка логирования: запись в фоновом потоке и прореживание сообщений о файлах
+
+configure заменяет logging.basicConfig. Вызывающий поток только кладет
+запись в очередь (QueueHandler), а файл лога и консоль пишет фоновый поток
+(QueueListener), поэтому запись лога не задерживает обработку файлов.
+Очередь дочищается при выходе из программы.
+
+Сообщения об отдельных файлах пишутся в логгер FILE_EVENTS; на папках из
+сотен тысяч файлов их можно проредить (file_events):
+    all     - все сообщения (по умолчанию);
+    summary - ни одного, в логе остаются итоги задания;
+    N       - каждое N-е сообщение.
+Предупреждения и ошибки о файлах выводятся всегда.
+
+Каталог логов задается параметром log_dir или переменной окружения
+SFP_LOG_DIR (по умолчанию текущий каталог). configure сохраняет выбранные
+каталог и режим в окружении: рабочие процессы пула, запущенные через
+spawn, наследуют их. Рабочие процессы, запущенные через fork, пишут в те же
+обработчики напрямую: фоновый поток остается только в главном процессе.
+На время fork обработчики блокируются, чтобы дочерний процесс не унаследовал
+блокировку потока вывода, захваченную фоновым потоком посреди записи.
+"""
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+
+LOG_DIR_ENV = 'SFP_LOG_DIR'
+FILE_EVENTS_ENV = 'SFP_LOG_FILES'
+
+# Логгер сообщений об отдельных файлах
+FILE_EVENTS = 'sfp.files'
+
+FILE_EVENTS_ALL = 'all'
+FILE_EVENTS_SUMMARY = 'summary'
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+_listener = None
+
+
+def check_file_events(mode: str) -> str:
+    parse_file_events(mode)
+    return mode
+
+
+def parse_file_events(mode: str) -> int:
+    """Режим сообщений о файлах -> каждое какое сообщение выводить (0 - никакое)"""
+    if mode is None or mode == FILE_EVENTS_ALL:
+        return 1
+    if mode == FILE_EVENTS_SUMMARY:
+        return 0
+    try:
+        every = int(mode)
+    except ValueError:
+        every = 0
+    if every < 1:
+        raise ValueError(f"Неизвестный режим сообщений о файлах: {mode} "
+                         f"(доступны: {FILE_EVENTS_ALL}, {FILE_EVENTS_SUMMARY} или число N)")
+    return every
+
+
+class FileEventFilter(logging.Filter):
+    """Прореживание информационных сообщений логгера FILE_EVENTS"""
+
+    def __init__(self, every: int = 1):
+        super().__init__()
+        self.every = every
+        self.seen = 0
+        self.suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.name != FILE_EVENTS or record.levelno > logging.INFO:
+            return True
+        self.seen += 1
+        if self.every and (self.seen - 1) % self.every == 0:
+            return True
+        self.suppressed += 1
+        return False
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler, который в дочернем процессе (после fork) пишет в
+    обработчики сам: фоновый поток слушателя в нем не существует
+    """
+
+    def __init__(self, log_queue, handlers: list):
+        super().__init__(log_queue)
+        self.handlers = handlers
+        self.pid = os.getpid()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Очередь внутри процесса: запись не сериализуется, поэтому ее не нужно
+        # копировать и форматировать здесь - это делает фоновый поток
+        return record
+
+    def emit(self, record: logging.LogRecord):
+        if os.getpid() == self.pid:
+            super().emit(record)
+            return
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
+def _lock_handlers():
+    """Перед fork: фоновый поток не должен быть посреди записи в обработчик"""
+    if _listener is not None:
+        for handler in _listener.handlers:
+            handler.acquire()
+
+
+def _unlock_handlers():
+    if _listener is not None:
+        for handler in reversed(_listener.handlers):
+            try:
+                handler.release()
+            except RuntimeError:
+                # В дочернем процессе блокировку уже сбросил logging
+                pass
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(before=_lock_handlers, after_in_parent=_unlock_handlers,
+                        after_in_child=_unlock_handlers)
+
+
+def log_path(log_name: str, log_dir: str = None) -> str:
+    """Путь файла лога: в log_dir, в SFP_LOG_DIR или в текущем каталоге"""
+    log_dir = log_dir or os.environ.get(LOG_DIR_ENV)
+    if not log_dir:
+        return log_name
+    os.makedirs(log_dir, exist_ok=True)
+    return os.path.join(log_dir, log_name)
+
+
+def configure(log_name: str, console=None, log_dir: str = None, file_events: str = None,
+              level: int = logging.INFO, force: bool = False):
+    """
+    Лог в файл log_name (и в поток console, например sys.stdout) через очередь.
+    Как и logging.basicConfig, без force ничего не делает, если у корневого
+    логгера уже есть обработчики; с force прежняя настройка заменяется.
+    file_events - режим сообщений о файлах (см. описание модуля).
+    """
+    global _listener
+    root = logging.getLogger()
+    if root.handlers and not force:
+        return
+    if log_dir:
+        os.environ[LOG_DIR_ENV] = os.path.abspath(log_dir)
+    if file_events:
+        os.environ[FILE_EVENTS_ENV] = check_file_events(file_events)
+    every = parse_file_events(os.environ.get(FILE_EVENTS_ENV))
+    previous = _listener.handlers if _listener is not None else ()
+    shutdown()
+    for handler in previous:
+        handler.close()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    # Файл создается при первой записи: без сообщений пустой лог не появляется
+    handlers = [logging.FileHandler(log_path(log_name), encoding='utf-8', delay=True)]
+    if console is not None:
+        handlers.append(logging.StreamHandler(console))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue, handlers)
+    queue_handler.addFilter(FileEventFilter(every))
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    # В режиме summary сообщения о файлах отсекаются уровнем логгера,
+    # еще до создания записи
+    logging.getLogger(FILE_EVENTS).setLevel(logging.WARNING if every == 0 else logging.NOTSET)
+    _listener = logging.handlers.QueueListener(log_queue, *handlers)
+    _listener.start()
+
+
+def set_console(stream):
+    """Перенаправление консольного вывода лога (например, в stderr в режиме конвейера)"""
+    if _listener is None:
+        return
+    for handler in _listener.handlers:
+        if isinstance(handler, logging.StreamHandler) and not isinstance(handler, logging.FileHandler):
+            handler.setStream(stream)
+
+
+def shutdown():
+    """Остановка фонового потока с записью всех сообщений из очереди"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.flush()
+        _listener = None
+
+
+atexit.register(shutdown)
@@ -0,0 +1,64 @@
+"""
+Ввод-вывод без копирования через mmap и memoryview
+
+iter_mapped_chunks отдает куски файла как memoryview поверх отображения
+в память: данные не копируются в объекты bytes, а шифр и HMAC читают их
+прямо из страничного кеша. Файл отображается окнами, и одновременно
+живы не больше двух окон, поэтому пиковый RSS не растет с размером файла.
+
+BufferRing - набор переиспользуемых выходных буферов для шифра
+(параметр output у pycryptodome), чтобы не создавать bytes на каждый кусок.
+"""
+
+import mmap
+
+DEFAULT_WINDOW_SIZE = 1024 * 1024
+
+
+def iter_mapped_chunks(file, start: int, length: int, chunk_size: int, window_size: int = DEFAULT_WINDOW_SIZE):
+    """
+    Куски участка [start, start + length) файла в виде memoryview.
+    Границы кусков отсчитываются от start, как при обычном чтении по chunk_size.
+    Куски нужно использовать сразу: следующий шаг итерации может освободить окно.
+    """
+    if length <= 0:
+        return
+    # Окно - целое число кусков, чтобы границы кусков не зависели от окон
+    window_size = max(chunk_size, window_size - window_size % chunk_size)
+    fileno = file.fileno()
+    position = start
+    end = start + length
+    while position < end:
+        window_length = min(window_size, end - position)
+        base = position - position % mmap.ALLOCATIONGRANULARITY
+        mapped = mmap.mmap(fileno, position + window_length - base, offset=base, access=mmap.ACCESS_READ)
+        if hasattr(mapped, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+            mapped.madvise(mmap.MADV_SEQUENTIAL)
+        view = memoryview(mapped)
+        offset = position - base
+        window_end = offset + window_length
+        while offset < window_end:
+            yield view[offset:min(offset + chunk_size, window_end)]
+            offset += chunk_size
+        # Окно отображается до тех пор, пока жив последний отданный кусок;
+        # явный close() здесь вызвал бы BufferError
+        del view, mapped
+        position += window_length
+
+
+class BufferRing:
+    """
+    Кольцо из count выходных буферов размера size.
+    При записи через WriteBehind с глубиной очереди N нужно N + 2 буфера:
+    N в очереди, один пишется фоновым потоком, в один пишет шифр.
+    """
+
+    def __init__(self, count: int, size: int):
+        self._buffers = [bytearray(size) for _ in range(max(1, count))]
+        self._index = 0
+
+    def next(self, length: int) -> memoryview:
+        """Следующий свободный буфер длины length"""
+        buffer = self._buffers[self._index]
+        self._index = (self._index + 1) % len(self._buffers)
+        return memoryview(buffer)[:length]
@@ -0,0 +1,153 @@
+"""
+Конвейер чтения/записи для потоковой обработки больших файлов
+
+ReadAhead читает файл в фоновом потоке, WriteBehind пишет в фоновом потоке;
+между ними и потоком шифрования - очереди ограниченной глубины. Чтение с
+диска, AES/HMAC и запись на диск идут одновременно (pycryptodome, hashlib
+и файловый ввод-вывод отпускают GIL на больших буферах).
+
+При queue_depth <= 0 оба класса работают синхронно, без потоков.
+"""
+
+import queue
+import threading
+
+# Маркер конца данных в очереди
+_EOF = object()
+
+
+class _Failure:
+    """Исключение фонового потока, передаваемое через очередь"""
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+class ReadAhead:
+    """
+    Итератор по кускам файла размером chunk_size.
+    Если задан length, читается не больше length байт с текущей позиции.
+    """
+
+    def __init__(self, file, chunk_size: int, queue_depth: int = 4, length: int = None):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.length = length
+        self.queue_depth = queue_depth
+        self._queue = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _chunks(self):
+        """Синхронное чтение кусков"""
+        remaining = self.length
+        while remaining is None or remaining > 0:
+            size = self.chunk_size if remaining is None else min(self.chunk_size, remaining)
+            chunk = self.file.read(size)
+            if not chunk:
+                if remaining is not None:
+                    raise ValueError("Файл обрезан")
+                return
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+    def _put(self, item) -> bool:
+        """Помещение в очередь с проверкой остановки; False - потребитель ушел"""
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self):
+        try:
+            for chunk in self._chunks():
+                if not self._put(chunk):
+                    return
+            self._put(_EOF)
+        except BaseException as e:
+            self._put(_Failure(e))
+
+    def __iter__(self):
+        if self.queue_depth <= 0:
+            yield from self._chunks()
+            return
+
+        self._queue = queue.Queue(maxsize=self.queue_depth)
+        self._thread = threading.Thread(target=self._run, name='sfp-read-ahead', daemon=True)
+        self._thread.start()
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _EOF:
+                    return
+                if isinstance(item, _Failure):
+                    raise item.error
+                yield item
+        finally:
+            self.close()
+
+    def close(self):
+        """Остановка фонового потока чтения"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+class WriteBehind:
+    """Запись кусков в файл из фонового потока"""
+
+    def __init__(self, file, queue_depth: int = 4):
+        self.file = file
+        self.queue_depth = queue_depth
+        self._error = None
+        self._thread = None
+        if queue_depth > 0:
+            self._queue = queue.Queue(maxsize=queue_depth)
+            self._thread = threading.Thread(target=self._run, name='sfp-write-behind', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _EOF:
+                return
+            if self._error is None:
+                try:
+                    self.file.write(item)
+                except BaseException as e:
+                    # Дальше только вычитываем очередь, чтобы не блокировать писателя
+                    self._error = e
+
+    def write(self, data):
+        if self._error is not None:
+            raise self._error
+        if self._thread is None:
+            self.file.write(data)
+        else:
+            self._queue.put(data)
+
+    def close(self):
+        """Дожидается записи всех кусков; пробрасывает ошибку записи"""
+        if self._thread is not None:
+            self._queue.put(_EOF)
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self._thread is not None:
+            # При ошибке просто останавливаем поток, не маскируя исходное исключение
+            self._queue.put(_EOF)
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,177 @@
+"""
+Отчет о ходе обработки: байты, файлы, скорость и оставшееся время
+
+Шифровальщик и дешифровальщик принимают on_progress - функцию, которая
+получает ProgressEvent. События прореживаются (не чаще раза в interval
+секунд), поэтому учет в горячем цикле - это сложение и сравнение времени.
+Последнее событие (finished=True) отправляется всегда. Если передан
+cancel_token (job_journal.CancelToken), он проверяется на каждом куске:
+так обработку одного файла можно остановить из другого потока.
+
+Скорость - экспоненциальное среднее по интервалам между событиями, чтобы
+оценка времени не прыгала и при этом отражала текущую, а не среднюю скорость.
+"""
+
+import sys
+import time
+
+DEFAULT_INTERVAL = 0.2
+# Вес нового замера скорости в экспоненциальном среднем
+SMOOTHING = 0.3
+
+
+class ProgressEvent:
+    """Снимок хода обработки"""
+
+    def __init__(self, bytes_done: int, total_bytes: int, files_done: int, total_files: int,
+                 elapsed: float, throughput: float, finished: bool = False):
+        self.bytes_done = bytes_done
+        self.total_bytes = total_bytes
+        self.files_done = files_done
+        self.total_files = total_files
+        self.elapsed = elapsed  # Секунды с начала
+        self.throughput = throughput  # Байт в секунду
+        self.finished = finished
+
+    @property
+    def fraction(self) -> float:
+        """Доля выполненного от 0 до 1 (по байтам, если размер известен, иначе по файлам)"""
+        if self.finished:
+            return 1.0
+        if self.total_bytes:
+            return min(1.0, self.bytes_done / self.total_bytes)
+        if self.total_files:
+            return min(1.0, self.files_done / self.total_files)
+        return 0.0
+
+    @property
+    def eta(self) -> float:
+        """Оставшееся время в секундах или None, если оценить нельзя"""
+        if self.finished:
+            return 0.0
+        if not self.total_bytes or self.throughput <= 0:
+            return None
+        return max(0, self.total_bytes - self.bytes_done) / self.throughput
+
+
+class ProgressReporter:
+    """Учет хода обработки и прореженный вызов callback(ProgressEvent)"""
+
+    def __init__(self, callback=None, total_bytes: int = 0, total_files: int = 0,
+                 interval: float = DEFAULT_INTERVAL, cancel_token=None):
+        self.callback = callback
+        self.cancel_token = cancel_token
+        self.total_bytes = total_bytes
+        self.total_files = total_files
+        self.interval = interval
+        self.bytes_done = 0
+        self.files_done = 0
+        self.throughput = 0.0
+        self.started = time.monotonic()
+        self._last_time = self.started
+        self._last_bytes = 0
+        self._next_time = self.started + interval
+
+    def add_bytes(self, count: int):
+        self.bytes_done += count
+        if self.cancel_token is not None:
+            self.cancel_token.raise_if_cancelled()
+        if self.callback is not None and time.monotonic() >= self._next_time:
+            self._emit()
+
+    def file_done(self, size: int = 0):
+        """Файл обработан целиком; size - байты, еще не учтенные через add_bytes"""
+        self.files_done += 1
+        self.add_bytes(size)
+
+    def track(self, chunks):
+        """Итератор кусков, учитывающий их размер"""
+        if self.callback is None and self.cancel_token is None:
+            return chunks
+        return self._track(chunks)
+
+    def _track(self, chunks):
+        for chunk in chunks:
+            yield chunk
+            self.add_bytes(len(chunk))
+
+    def _emit(self, finished: bool = False):
+        now = time.monotonic()
+        if now > self._last_time:
+            rate = (self.bytes_done - self._last_bytes) / (now - self._last_time)
+            self.throughput = rate if self.throughput == 0 else \
+                SMOOTHING * rate + (1 - SMOOTHING) * self.throughput
+        self._last_time = now
+        self._last_bytes = self.bytes_done
+        self._next_time = now + self.interval
+        self.callback(ProgressEvent(
+            self.bytes_done, self.total_bytes, self.files_done, self.total_files,
+            now - self.started, self.throughput, finished
+        ))
+
+    def finish(self):
+        """Итоговое событие; скорость в нем - средняя за всю обработку"""
+        if self.callback is None:
+            return
+        elapsed = time.monotonic() - self.started
+        if elapsed > 0:
+            self.throughput = self.bytes_done / elapsed
+        self._last_time = time.monotonic()
+        self._last_bytes = self.bytes_done
+        self.callback(ProgressEvent(
+            self.bytes_done, self.total_bytes, self.files_done, self.total_files,
+            elapsed, self.throughput, True
+        ))
+
+
+def format_size(size: float) -> str:
+    for unit in ('Б', 'КБ', 'МБ', 'ГБ'):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} ТБ"
+
+
+def format_duration(seconds: float) -> str:
+    if seconds is None:
+        return '--:--'
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    if hours:
+        return f"{hours}:{rest // 60:02d}:{rest % 60:02d}"
+    return f"{rest // 60:02d}:{rest % 60:02d}"
+
+
+def format_event(event: ProgressEvent) -> str:
+    """Строка вида '42.0% 1.2 ГБ / 3.0 ГБ 150.3 МБ/с осталось 00:12 файлов 3/10'"""
+    parts = [f"{event.fraction * 100:5.1f}%", format_size(event.bytes_done)]
+    if event.total_bytes:
+        parts[-1] += f" / {format_size(event.total_bytes)}"
+    parts.append(f"{format_size(event.throughput)}/с")
+    if event.finished:
+        parts.append(f"за {format_duration(event.elapsed)}")
+    else:
+        parts.append(f"осталось {format_duration(event.eta)}")
+    if event.total_files > 1:
+        parts.append(f"файлов {event.files_done}/{event.total_files}")
+    return ' '.join(parts)
+
+
+class TerminalProgress:
+    """on_progress для терминала: строка, обновляемая на месте через '\\r'"""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stderr
+        self.enabled = self.stream.isatty()
+        self._width = 0
+
+    def __call__(self, event: ProgressEvent):
+        if not self.enabled:
+            return
+        line = format_event(event)
+        self.stream.write('\r' + line.ljust(self._width))
+        self._width = len(line)
+        if event.finished:
+            self.stream.write('\n')
+            self._width = 0
+        self.stream.flush()
@@ -0,0 +1,158 @@
+"""
+Сегментированный формат зашифрованных файлов (версия 3)
+
+После заголовка (file_format.build_segmented_header) идут сегменты:
+    AES-256-GCM(plaintext[i*segment_size:(i+1)*segment_size]) + tag(16)
+Все сегменты, кроме последнего, содержат ровно segment_size байт данных,
+последний - от 0 до segment_size байт.
+
+Nonce сегмента: nonce_prefix(7) + номер сегмента(4, big-endian) + флаг(1),
+флаг равен 1 только у последнего сегмента. Поэтому обрезка файла по
+границе сегмента, перестановка или удаление сегментов обнаруживаются.
+Заголовок целиком передается в GCM как associated data каждого сегмента.
+
+Каждый сегмент проверяется и дешифруется независимо от остальных:
+это основа для потоковой обработки, параллелизма и произвольного доступа.
+Поток без известного размера (pipe) читается через iter_stream_segments:
+последний сегмент определяется по концу потока.
+
+Шифр передается объектом с интерфейсом cryptography AESGCM:
+encrypt(nonce, data, aad) -> ciphertext + tag, decrypt(nonce, data, aad)
+(см. crypto_backends.CryptoBackend.aead).
+"""
+
+import struct
+
+import file_format
+import pipeline
+
+DEFAULT_SEGMENT_SIZE = 64 * 1024
+TAG_SIZE = 16
+MAX_SEGMENTS = 2 ** 32
+
+
+def segment_nonce(nonce_prefix: bytes, index: int, final: bool) -> bytes:
+    """Nonce сегмента с номером index"""
+    return nonce_prefix + struct.pack('>I', index) + (b'\x01' if final else b'\x00')
+
+
+class SegmentWriter:
+    """Потоковая запись данных сегментами после уже записанного заголовка"""
+
+    def __init__(self, file, aead, header: bytes, nonce_prefix: bytes, segment_size: int):
+        self.file = file
+        self.aead = aead
+        self.header = header
+        self.nonce_prefix = nonce_prefix
+        self.segment_size = segment_size
+        self.index = 0
+        self._buffer = bytearray()
+
+    def _write_segment(self, data, final: bool):
+        if self.index >= MAX_SEGMENTS:
+            raise ValueError("Слишком много сегментов для одного файла")
+        nonce = segment_nonce(self.nonce_prefix, self.index, final)
+        self.file.write(self.aead.encrypt(nonce, bytes(data), self.header))
+        self.index += 1
+
+    def write(self, data):
+        self._buffer += data
+        # Полный сегмент можно записать, только когда известно, что он не последний
+        offset = 0
+        while len(self._buffer) - offset > self.segment_size:
+            self._write_segment(self._buffer[offset:offset + self.segment_size], final=False)
+            offset += self.segment_size
+        if offset:
+            del self._buffer[:offset]
+
+    def close(self):
+        """Запись последнего сегмента (возможно, пустого)"""
+        self._write_segment(self._buffer, final=True)
+        self._buffer = bytearray()
+
+
+class SegmentReader:
+    """Проверка и дешифрование сегментов файла версии 3"""
+
+    def __init__(self, file, aead, header, file_size: int):
+        if header.version != file_format.FORMAT_SEGMENTED:
+            raise ValueError("Файл не в сегментированном формате")
+        self.file = file
+        self.aead = aead
+        self.header = header
+        self.segment_size = header.segment_size
+        self.encrypted_segment_size = header.segment_size + TAG_SIZE
+        self.data_start = header.size
+
+        body_size = file_size - self.data_start
+        if body_size < TAG_SIZE:
+            raise ValueError("Неверный формат файла или файл поврежден")
+        self.segment_count = -(-body_size // self.encrypted_segment_size)
+        self.last_segment_size = body_size - (self.segment_count - 1) * self.encrypted_segment_size
+        if self.last_segment_size < TAG_SIZE:
+            raise ValueError("Файл обрезан или поврежден")
+        self.body_size = body_size
+        self.plaintext_size = (self.segment_count - 1) * self.segment_size + self.last_segment_size - TAG_SIZE
+
+    def decrypt_segment(self, index: int, data: bytes) -> bytes:
+        """Проверка и дешифрование зашифрованного сегмента index"""
+        final = index == self.segment_count - 1
+        nonce = segment_nonce(self.header.nonce_prefix, index, final)
+        try:
+            return self.aead.decrypt(nonce, data, self.header.raw)
+        except Exception:
+            raise ValueError(
+                f"Проверка подлинности сегмента {index} не прошла. "
+                "Файл поврежден, обрезан или пароль неверный."
+            )
+
+    def read_segment(self, index: int) -> bytes:
+        """Чтение, проверка и дешифрование одного сегмента"""
+        if not 0 <= index < self.segment_count:
+            raise IndexError(f"Нет сегмента с номером {index}")
+        size = self.last_segment_size if index == self.segment_count - 1 else self.encrypted_segment_size
+        self.file.seek(self.data_start + index * self.encrypted_segment_size)
+        data = self.file.read(size)
+        if len(data) != size:
+            raise ValueError("Файл обрезан")
+        return self.decrypt_segment(index, data)
+
+    def iter_segments(self, queue_depth: int = 0):
+        """Последовательная проверка и дешифрование всех сегментов"""
+        self.file.seek(self.data_start)
+        chunks = pipeline.ReadAhead(self.file, self.encrypted_segment_size, queue_depth, self.body_size)
+        for index, data in enumerate(chunks):
+            yield self.decrypt_segment(index, data)
+
+
+
+def iter_stream_segments(file, aead, header):
+    """
+    Последовательная проверка и дешифрование сегментов из потока без
+    известного размера и перемотки (stdin). Сегмент считается последним,
+    когда после него поток закончился, поэтому в памяти не больше двух
+    сегментов.
+    """
+    if header.version != file_format.FORMAT_SEGMENTED:
+        raise ValueError("Поток не в сегментированном формате")
+    encrypted_segment_size = header.segment_size + TAG_SIZE
+    index = 0
+    data = file.read(encrypted_segment_size)
+    while True:
+        if len(data) < TAG_SIZE:
+            raise ValueError("Поток обрезан или поврежден")
+        following = file.read(encrypted_segment_size) if len(data) == encrypted_segment_size else b''
+        final = not following
+        nonce = segment_nonce(header.nonce_prefix, index, final)
+        try:
+            plaintext = aead.decrypt(nonce, data, header.raw)
+        except Exception:
+            raise ValueError(
+                f"Проверка подлинности сегмента {index} не прошла. "
+                "Поток поврежден, обрезан или пароль неверный."
+            )
+        yield plaintext
+        if final:
+            return
+        data = following
+        index += 1
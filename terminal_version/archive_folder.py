@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+SFA Secure File Program - Folder Archive Script
+Шифрует всю папку в один контейнер (формат архива основного шифровальщика)
+"""
+
+import sys
+import os
+import argparse
+import logging
+from pathlib import Path
+from encrypt_file import derive_key
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import archive
+import atomic_io
+import crypto_backends
+import file_format
+import log_setup
+
+# Настройка логирования: запись в фоновом потоке (см. log_setup.py)
+LOG_NAME = 'archive_encryption.log'
+log_setup.configure(LOG_NAME, sys.stdout)
+logger = logging.getLogger(__name__)
+
+def archive_folder(folder_path: str, password: str, archive_path: str = None) -> bool:
+    """Шифрование папки в один архив"""
+    try:
+        path_obj = Path(folder_path)
+
+        if not path_obj.exists():
+            logger.error(f"Папка не найдена: {folder_path}")
+            return False
+
+        if not path_obj.is_dir():
+            logger.error(f"Путь не является папкой: {folder_path}")
+            return False
+
+        archive_path = Path(archive_path) if archive_path else \
+            path_obj.resolve().with_name(path_obj.resolve().name + archive.ARCHIVE_EXTENSION)
+        salt = os.urandom(file_format.SALT_SIZE)
+        master_key = derive_key(password, salt)
+        key = file_format.derive_segment_key(master_key)
+
+        # Недописанный архив остается временным файлом и удаляется
+        with atomic_io.AtomicOutput(archive_path) as dst:
+            file_count = archive.write_archive(
+                dst, str(path_obj), crypto_backends.get_backend().aead(key), salt,
+                exclude=(str(archive_path), atomic_io.temp_path(archive_path)),
+                key_check=file_format.key_check_value(master_key)
+            )
+
+        logger.info(f"Зашифровано {file_count} файлов в архив: {archive_path}")
+        return True
+
+    except Exception as e:
+        logger.error(f"Ошибка при шифровании папки {folder_path} в архив: {e}")
+        return False
+
+def main():
+    """Главная функция"""
+    parser = argparse.ArgumentParser(description="Шифрование папки в один архив")
+    parser.add_argument("folder_path", help="путь к папке")
+    parser.add_argument("password", help="пароль")
+    parser.add_argument("-o", "--output", help=f"путь к архиву (по умолчанию <папка>{archive.ARCHIVE_EXTENSION})")
+    parser.add_argument("--backend", choices=[crypto_backends.AUTO, *crypto_backends.BACKENDS],
+                        help="криптографический бэкенд (по умолчанию самый быстрый)")
+    parser.add_argument("--log-dir", help="каталог для файла лога (по умолчанию текущий)")
+    parser.add_argument("--log-files", type=log_setup.check_file_events, metavar="all|summary|N",
+                        help="сообщения о каждом файле: all - все, summary - только итоги, N - каждое N-е")
+    args = parser.parse_args()
+    log_setup.configure(LOG_NAME, sys.stdout, args.log_dir, args.log_files, force=True)
+    if args.backend:
+        os.environ[crypto_backends.BACKEND_ENV] = args.backend
+
+    folder_path = args.folder_path
+    password = args.password
+
+    if not password:
+        print("Ошибка: пароль не может быть пустым")
+        sys.exit(1)
+
+    logger.info(f"Начинаем шифрование папки в архив: {folder_path}")
+
+    success = archive_folder(folder_path, password, args.output)
+
+    if success:
+        print(f"Папка успешно зашифрована в архив: {folder_path}")
+    else:
+        print(f"Ошибка при шифровании папки в архив: {folder_path}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -6,40 +6,202 @@ SFA Secure File Program - File Decryption Script
 
 import sys
 import os
+import argparse
 import base64
 import hashlib
 import hmac
 import logging
 from pathlib import Path
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-from cryptography.hazmat.backends import default_backend
-
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('decryption.log', encoding='utf-8'),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import atomic_io
+import compression
+import crypto_backends
+import file_format
+import job_metrics
+import log_setup
+import progress
+import segmented_format
+
+# Настройка логирования: запись в фоновом потоке (см. log_setup.py)
+LOG_NAME = 'decryption.log'
+log_setup.configure(LOG_NAME, sys.stdout)
 logger = logging.getLogger(__name__)
+# Сообщения об отдельных файлах (прореживаются, см. --log-files)
+file_logger = logging.getLogger(log_setup.FILE_EVENTS)
+
+# Заголовки формата v1: V1K хранит проверочное значение ключа (пишется по
+# умолчанию), V1 без него читается для совместимости со старыми файлами
+V1_HEADER = b'SFA_ENCRYPTED_FILE_V1\n'
+V1_KEY_CHECK_HEADER = b'SFA_ENCRYPTED_FILE_V1K\n'
 
 def derive_key(password: str, salt: bytes) -> bytes:
     """Генерация ключа из пароля с использованием PBKDF2"""
-    kdf = PBKDF2HMAC(
-        algorithm=hashes.SHA256(),
-        length=32,  # 256 бит
-        salt=salt,
-        iterations=100000,
-        backend=default_backend()
+    return crypto_backends.get_backend().pbkdf2(
+        password.encode('utf-8'),
+        salt,
+        32,  # 256 бит
+        100000
     )
-    return kdf.derive(password.encode('utf-8'))
 
-def decrypt_file(file_path: str, password: str) -> bool:
-    """Дешифрование файла"""
+def decrypted_path_for(path_obj: Path) -> Path:
+    """Путь для дешифрованного файла"""
+    if path_obj.suffix == '.encrypted':
+        return path_obj.with_suffix('')
+    return path_obj.with_suffix(path_obj.suffix + '.decrypted')
+
+def segment_key_for(path_obj: Path, header, password: str) -> bytes:
+    """
+    Ключ сегментов файла версии 3. Проверочные значения ключа из заголовков
+    сверяются сразу после PBKDF2: неверный пароль дает WrongPasswordError
+    до чтения сегментов.
+    """
+    if header.flags & file_format.FLAG_FOLDER_KEY:
+        # Ключ файла выводится из мастер-ключа папки
+        header_path = file_format.find_folder_header(str(path_obj.resolve().parent))
+        if header_path is None:
+            raise ValueError(f"Не найден заголовок папки {file_format.FOLDER_HEADER_NAME}")
+        folder_salt, folder_key_check = file_format.read_folder_header(header_path)
+        folder_key = derive_key(password, folder_salt)
+        file_format.check_key(folder_key_check, folder_key)
+        file_format.check_key(header.key_check, folder_key, header.salt)
+        return file_format.derive_segment_key(folder_key, salt=header.salt)
+    master_key = derive_key(password, header.salt)
+    file_format.check_key(header.key_check, master_key)
+    return file_format.derive_segment_key(master_key)
+
+def read_v1_header(src):
+    """
+    Чтение заголовка формата v1 без шифртекста: (salt, iv, key_check, hmac).
+    key_check None - старый заголовок V1 без проверочного значения.
+    После вызова src стоит на начале шифртекста.
+    """
+    line = src.readline(len(V1_KEY_CHECK_HEADER))
+    if line == V1_KEY_CHECK_HEADER:
+        salt, iv = src.read(16), src.read(16)
+        key_check = src.read(file_format.KEY_CHECK_SIZE)
+        if len(key_check) != file_format.KEY_CHECK_SIZE:
+            raise ValueError("Неверный формат файла")
+    elif line == V1_HEADER:
+        salt, iv = src.read(16), src.read(16)
+        key_check = None
+    else:
+        raise ValueError("Неверный формат файла")
+    hmac_digest = src.read(32)
+    if len(hmac_digest) != 32:
+        raise ValueError("Неверный формат файла")
+    return salt, iv, key_check, hmac_digest
+
+def check_password(path_obj: Path, password: str) -> bool:
+    """
+    Быстрая проверка пароля по заголовку файла, без чтения шифртекста.
+    False - пароль точно неверный; True - совпал или проверить нельзя
+    (формат без проверочного значения, файл поврежден).
+    """
+    try:
+        with open(path_obj, 'rb') as src:
+            header = file_format.read_header(src)
+            if header is None:
+                src.seek(0)
+                salt, _, key_check, _ = read_v1_header(src)
+                file_format.check_key(key_check, derive_key(password, salt))
+        if header is not None and header.key_check is not None:
+            segment_key_for(path_obj, header, password)
+        return True
+    except file_format.WrongPasswordError:
+        return False
+    except Exception:
+        return True
+
+def decrypt_file_segmented(path_obj: Path, password: str, on_progress=None,
+                           durability: str = atomic_io.DURABILITY_NONE, defer_commit: bool = False,
+                           metrics: job_metrics.JobMetrics = job_metrics.DISABLED) -> Path:
+    """Дешифрование сегментированного формата (версия 3)"""
+    with open(path_obj, 'rb') as source:
+        src = metrics.wrap(job_metrics.PHASE_READ, source)
+        header = file_format.read_header(src)
+        if header is None or header.version != file_format.FORMAT_SEGMENTED:
+            raise ValueError("Файл не в сегментированном формате")
+        if header.flags & file_format.FLAG_ARCHIVE:
+            raise ValueError("Файл является архивом папки: используйте extract_archive.py")
+        
+        with metrics.phase(job_metrics.PHASE_KDF):
+            key = segment_key_for(path_obj, header, password)
+        aead = metrics.wrap(job_metrics.PHASE_CIPHER, crypto_backends.get_backend().aead(key))
+        file_size = os.fstat(src.fileno()).st_size
+        reader = segmented_format.SegmentReader(src, aead, header, file_size)
+        decrypted_file_path = decrypted_path_for(path_obj)
+        compressor = None
+        if header.compression != compression.NONE:
+            compressor = compression.get_compressor(header.compression)
+        reporter = progress.ProgressReporter(on_progress, reader.body_size, 1)
+        # Частично дешифрованный файл остается временным и удаляется
+        with atomic_io.AtomicOutput(decrypted_file_path, durability, defer_commit) as dst:
+            # Сжатые данные (FLAG_COMPRESSED) распаковываются на лету
+            writer = compression.DecompressingWriter(metrics.wrap(job_metrics.PHASE_WRITE, dst), compressor)
+            if compressor is not None:
+                writer = metrics.wrap(job_metrics.PHASE_COMPRESS, writer)
+            for segment in reporter.track(reader.iter_segments()):
+                writer.write(segment)
+            writer.close()
+        reporter.file_done()
+        reporter.finish()
+    metrics.file_done(file_size)
+    return decrypted_file_path
+
+def decrypt_pipe(password: str, on_progress=None, metrics: job_metrics.JobMetrics = job_metrics.DISABLED) -> bool:
+    """
+    Режим конвейера: зашифрованный поток читается из stdin, открытые данные
+    пишутся в stdout. Поддерживается только сегментированный формат
+    (версия 3): каждый сегмент выводится после проверки его тега, в памяти
+    не больше двух сегментов. Если поток поврежден, уже выведенные сегменты
+    подлинные, а команда завершается с ошибкой.
+    """
+    try:
+        src = metrics.wrap(job_metrics.PHASE_READ, sys.stdin.buffer)
+        header = file_format.read_header(src)
+        if header is None or header.version != file_format.FORMAT_SEGMENTED:
+            logger.error("В режиме конвейера поддерживается только сегментированный формат")
+            return False
+        if header.flags & (file_format.FLAG_FOLDER_KEY | file_format.FLAG_ARCHIVE):
+            logger.error("Файлы с ключом папки и архивы дешифруются только из файла")
+            return False
+        
+        with metrics.phase(job_metrics.PHASE_KDF):
+            master_key = derive_key(password, header.salt)
+        file_format.check_key(header.key_check, master_key)
+        key = file_format.derive_segment_key(master_key)
+        aead = metrics.wrap(job_metrics.PHASE_CIPHER, crypto_backends.get_backend().aead(key))
+        compressor = None
+        if header.compression != compression.NONE:
+            compressor = compression.get_compressor(header.compression)
+        reporter = progress.ProgressReporter(on_progress, 0, 1)
+        writer = compression.DecompressingWriter(metrics.wrap(job_metrics.PHASE_WRITE, sys.stdout.buffer), compressor)
+        if compressor is not None:
+            writer = metrics.wrap(job_metrics.PHASE_COMPRESS, writer)
+        for segment in reporter.track(segmented_format.iter_stream_segments(src, aead, header)):
+            writer.write(segment)
+        writer.close()
+        sys.stdout.buffer.flush()
+        reporter.file_done()
+        reporter.finish()
+        metrics.file_done(reporter.bytes_done)
+        logger.info("Поток успешно дешифрован")
+        return True
+        
+    except Exception as e:
+        logger.error(f"Ошибка при дешифровании потока: {e}")
+        return False
+
+def decrypt_file(file_path: str, password: str, on_progress=None,
+                 durability: str = atomic_io.DURABILITY_NONE, defer_commit: bool = False,
+                 metrics: job_metrics.JobMetrics = job_metrics.DISABLED) -> bool:
+    """
+    Дешифрование файла; on_progress(event) получает progress.ProgressEvent.
+    Результат пишется атомарно с надежностью durability (см. atomic_io.py);
+    с defer_commit и 'group' он остается временным до GroupCommit.
+    metrics учитывает фазы дешифрования (см. job_metrics.py).
+    """
     try:
         path_obj = Path(file_path)
         
@@ -51,44 +213,50 @@ def decrypt_file(file_path: str, password: str) -> bool:
             logger.error(f"Путь не является файлом: {file_path}")
             return False
 
-        # Читаем зашифрованный файл
         with open(path_obj, 'rb') as f:
-            encrypted_data = f.read()
-            
-        if not encrypted_data:
-            logger.error(f"Файл пустой: {file_path}")
-            return False
+            is_segmented = f.read(len(file_format.MAGIC)) == file_format.MAGIC
+        if is_segmented:
+            decrypted_file_path = decrypt_file_segmented(path_obj, password, on_progress, durability, defer_commit,
+                                                         metrics)
+            file_logger.info(f"Файл успешно дешифрован: {decrypted_file_path}")
+            return True
 
-        # Проверяем заголовок
-        if not encrypted_data.startswith(b'SFA_ENCRYPTED_FILE_V1\n'):
-            logger.error(f"Неверный формат файла: {file_path}")
-            return False
-
-        # Извлекаем компоненты
-        header_end = encrypted_data.find(b'\n') + 1
-        salt = encrypted_data[header_end:header_end + 16]
-        iv = encrypted_data[header_end + 16:header_end + 32]
-        hmac_digest = encrypted_data[header_end + 32:header_end + 64]
-        ciphertext = encrypted_data[header_end + 64:]
-
-        # Генерируем ключ из пароля
-        key = derive_key(password, salt)
+        # Заголовок читается отдельно: неверный пароль отклоняется по
+        # проверочному значению сразу после PBKDF2, до чтения шифртекста
+        with open(path_obj, 'rb') as f:
+            try:
+                salt, iv, key_check, hmac_digest = read_v1_header(f)
+            except ValueError:
+                logger.error(f"Неверный формат файла: {file_path}")
+                return False
+            
+            # Генерируем ключ из пароля
+            with metrics.phase(job_metrics.PHASE_KDF):
+                key = derive_key(password, salt)
+            file_format.check_key(key_check, key)
+            
+            # Читаем шифртекст
+            ciphertext = metrics.wrap(job_metrics.PHASE_READ, f).read()
+        encrypted_size = path_obj.stat().st_size
+        backend = crypto_backends.get_backend()
         
         # Проверяем HMAC
         hmac_key = hashlib.sha256(key + salt).digest()
-        hmac_obj = hmac.new(hmac_key, ciphertext, hashlib.sha256)
-        expected_hmac = hmac_obj.digest()
+        with metrics.phase(job_metrics.PHASE_HMAC, len(ciphertext)):
+            expected_hmac = backend.hmac_sha256(hmac_key, ciphertext).digest()
         
         if not hmac.compare_digest(hmac_digest, expected_hmac):
             logger.error(f"HMAC не совпадает - файл поврежден или неверный пароль: {file_path}")
             return False
 
         # Создаем дешифр
-        cipher = Cipher(algorithms.AES(key), modes.CBC(iv), backend=default_backend())
-        decryptor = cipher.decryptor()
+        if not ciphertext or len(ciphertext) % 16:
+            logger.error(f"Неверный формат файла: {file_path}")
+            return False
+        decryptor = metrics.wrap(job_metrics.PHASE_CIPHER, backend.cbc_decryptor(key, iv))
         
         # Дешифруем данные
-        decrypted_data = decryptor.update(ciphertext) + decryptor.finalize()
+        decrypted_data = decryptor.update(ciphertext)
         
         # Удаляем padding
         padding_length = decrypted_data[-1]
@@ -99,37 +267,86 @@ def decrypt_file(file_path: str, password: str) -> bool:
         original_data = decrypted_data[:-padding_length]
         
         # Сохраняем дешифрованный файл
-        if path_obj.suffix == '.encrypted':
-            decrypted_file_path = path_obj.with_suffix('')
-        else:
-            decrypted_file_path = path_obj.with_suffix(path_obj.suffix + '.decrypted')
+        decrypted_file_path = decrypted_path_for(path_obj)
             
-        with open(decrypted_file_path, 'wb') as f:
-            f.write(original_data)
+        with atomic_io.AtomicOutput(decrypted_file_path, durability, defer_commit) as f:
+            metrics.wrap(job_metrics.PHASE_WRITE, f).write(original_data)
+        metrics.file_done(encrypted_size)
+        
+        reporter = progress.ProgressReporter(on_progress, encrypted_size, 1)
+        reporter.file_done(encrypted_size)
+        reporter.finish()
             
-        logger.info(f"Файл успешно дешифрован: {decrypted_file_path}")
+        file_logger.info(f"Файл успешно дешифрован: {decrypted_file_path}")
         return True
         
     except Exception as e:
         logger.error(f"Ошибка при дешифровании файла {file_path}: {e}")
         return False
 
+def log_to_stderr():
+    """В режиме конвейера stdout занят данными: сообщения выводятся в stderr"""
+    log_setup.set_console(sys.stderr)
+
+def export_metrics(metrics: job_metrics.JobMetrics, json_path: str = None, prometheus_path: str = None):
+    """Сохранение отчетов метрик и итог по фазам в лог"""
+    if not metrics.enabled:
+        return
+    try:
+        metrics.export(json_path, prometheus_path)
+        logger.info(f"Метрики: {metrics.summary()}")
+    except Exception as e:
+        logger.error(f"Ошибка сохранения метрик: {e}")
+
 def main():
     """Главная функция"""
-    if len(sys.argv) != 3:
-        print("Использование: python decrypt_file.py <путь_к_файлу> <пароль>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Дешифрование файла")
+    parser.add_argument("file_path", help="путь к файлу или '-' для режима конвейера (stdin -> stdout)")
+    parser.add_argument("password", help="пароль")
+    parser.add_argument("--durability", choices=atomic_io.DURABILITY_LEVELS, default=atomic_io.DURABILITY_NONE,
+                        help="надежность записи: none - без fsync, file/group - fsync результата")
+    parser.add_argument("--backend", choices=[crypto_backends.AUTO, *crypto_backends.BACKENDS],
+                        help="криптографический бэкенд (по умолчанию самый быстрый)")
+    parser.add_argument("--metrics-json", metavar="PATH",
+                        help="сохранить метрики (время фаз, скорость, память) в JSON")
+    parser.add_argument("--metrics-prom", metavar="PATH",
+                        help="сохранить метрики для textfile collector Prometheus (*.prom)")
+    parser.add_argument("--log-dir", help="каталог для файла лога (по умолчанию текущий)")
+    parser.add_argument("--log-files", type=log_setup.check_file_events, metavar="all|summary|N",
+                        help="сообщения о каждом файле: all - все, summary - только итоги, N - каждое N-е")
+    args = parser.parse_args()
+    log_setup.configure(LOG_NAME, sys.stdout, args.log_dir, args.log_files, force=True)
+    if args.backend:
+        os.environ[crypto_backends.BACKEND_ENV] = args.backend
         
-    file_path = sys.argv[1]
-    password = sys.argv[2]
+    file_path = args.file_path
+    password = args.password
     
     if not password:
-        print("Ошибка: пароль не может быть пустым")
+        print("Ошибка: пароль не может быть пустым", file=sys.stderr)
         sys.exit(1)
         
+    metrics = job_metrics.DISABLED
+    if args.metrics_json or args.metrics_prom:
+        metrics = job_metrics.JobMetrics('decrypt_file')
+        
+    if file_path == '-':
+        log_to_stderr()
+        logger.info("Начинаем дешифрование потока stdin -> stdout")
+        success = decrypt_pipe(password, progress.TerminalProgress(), metrics)
+        if not success:
+            metrics.file_failed()
+        export_metrics(metrics, args.metrics_json, args.metrics_prom)
+        if not success:
+            sys.exit(1)
+        return
+        
     logger.info(f"Начинаем дешифрование файла: {file_path}")
     
-    success = decrypt_file(file_path, password)
+    success = decrypt_file(file_path, password, progress.TerminalProgress(), args.durability, metrics=metrics)
+    if not success:
+        metrics.file_failed()
+    export_metrics(metrics, args.metrics_json, args.metrics_prom)
     
     if success:
         print(f"Файл успешно дешифрован: {file_path}")
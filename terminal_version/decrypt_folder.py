@@ -5,23 +5,37 @@ SFA Secure File Program - Folder Decryption Script
 
 import sys
 import os
+import argparse
 import logging
 from pathlib import Path
-from decrypt_file import decrypt_file
-
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('folder_decryption.log', encoding='utf-8'),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+from decrypt_file import check_password, decrypt_file, decrypted_path_for, export_metrics
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import atomic_io
+import crypto_backends
+import folder_engine
+import job_journal
+import job_metrics
+import log_setup
+import progress
+
+# Настройка логирования: запись в фоновом потоке (см. log_setup.py)
+LOG_NAME = 'folder_decryption.log'
+log_setup.configure(LOG_NAME, sys.stdout)
 logger = logging.getLogger(__name__)
 
-def decrypt_folder(folder_path: str, password: str) -> bool:
-    """Дешифрование папки"""
+def decrypt_folder(folder_path: str, password: str, workers: int = None, on_progress=None,
+                   cancel_token: job_journal.CancelToken = None,
+                   durability: str = atomic_io.DURABILITY_NONE,
+                   metrics: job_metrics.JobMetrics = job_metrics.DISABLED) -> bool:
+    """
+    Дешифрование папки; on_progress(event) получает progress.ProgressEvent.
+    Результаты пишутся атомарно с надежностью durability (см. atomic_io.py).
+    metrics собирает фазы из рабочих процессов (см. job_metrics.py).
+    После прерывания или отмены через cancel_token повторный запуск
+    продолжает с места остановки по журналу задания.
+    """
+    journal = None
     try:
         path_obj = Path(folder_path)
         
@@ -39,39 +53,103 @@ def decrypt_folder(folder_path: str, password: str) -> bool:
             if file_path.is_file():
                 files_to_decrypt.append(file_path)
 
+        # Файлы, дешифрованные до прерывания предыдущего запуска
+        journal = job_journal.JobJournal.open(folder_path, 'decrypt')
+        done_count = len(files_to_decrypt)
+        files_to_decrypt = [file_path for file_path in files_to_decrypt if not journal.done_output(str(file_path))]
+        done_count -= len(files_to_decrypt)
+        if done_count:
+            logger.info(f"Продолжение прерванного дешифрования: готово файлов {done_count}")
+
         if not files_to_decrypt:
+            journal.complete()
             logger.warning(f"В папке нет зашифрованных файлов: {folder_path}")
             return True
 
         logger.info(f"Найдено {len(files_to_decrypt)} зашифрованных файлов")
 
-        # Дешифруем каждый файл
-        success_count = 0
-        for file_path in files_to_decrypt:
-            try:
-                if decrypt_file(str(file_path), password):
-                    success_count += 1
-                    logger.info(f"Дешифрован файл: {file_path}")
+        # Неверный пароль виден по первому файлу сразу после PBKDF2
+        if not check_password(files_to_decrypt[0], password):
+            logger.error(f"Неверный пароль: {files_to_decrypt[0]}")
+            return False
+
+        # Дешифруем файлы в пуле процессов; порядок результатов сохраняется
+        # С надежностью 'group' результаты фиксируются пакетами (atomic_io.GroupCommit),
+        # и только зафиксированные попадают в журнал
+        defer = durability == atomic_io.DURABILITY_GROUP
+        tasks = [(str(file_path), password, None, durability, defer) for file_path in files_to_decrypt]
+        sizes = {str(file_path): folder_engine.file_size(file_path) for file_path in files_to_decrypt}
+        reporter = progress.ProgressReporter(on_progress, sum(sizes.values()), len(tasks))
+        group = atomic_io.GroupCommit(lambda source: journal.record(source, str(decrypted_path_for(Path(source)))))
+
+        def on_result(result):
+            if result.ok and result.output:
+                if defer:
+                    group.add(decrypted_path_for(Path(result.path)), result.path)
                 else:
-                    logger.error(f"Ошибка дешифрования файла: {file_path}")
-            except Exception as e:
-                logger.error(f"Исключение при дешифровании файла {file_path}: {e}")
+                    journal.record(result.path, str(decrypted_path_for(Path(result.path))))
+            else:
+                metrics.file_failed()
+            metrics.merge(result.metrics)
+            reporter.file_done(sizes[result.path])
+
+        with group:
+            results = folder_engine.run_parallel(decrypt_file, tasks, workers, on_result, cancel_token,
+                                                 metrics.enabled)
+        reporter.finish()
+
+        success_count = 0
+        for result in results:
+            if result.ok and result.output:
+                success_count += 1
+            elif result.ok:
+                logger.error(f"Ошибка дешифрования файла: {result.path}")
+            else:
+                logger.error(f"Исключение при дешифровании файла {result.path}: {result.error}")
 
         logger.info(f"Успешно дешифровано {success_count} из {len(files_to_decrypt)} файлов")
+        if success_count == len(files_to_decrypt):
+            journal.complete()
         return success_count == len(files_to_decrypt)
         
+    except job_journal.JobCancelled:
+        logger.warning(f"Дешифрование отменено, повторный запуск продолжит с места остановки: {folder_path}")
+        return False
+        
     except Exception as e:
         logger.error(f"Ошибка при дешифровании папки {folder_path}: {e}")
         return False
 
+    finally:
+        if journal is not None:
+            journal.close()
+
 def main():
     """Главная функция"""
-    if len(sys.argv) != 3:
-        print("Использование: python decrypt_folder.py <путь_к_папке> <пароль>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Дешифрование папки")
+    parser.add_argument("folder_path", help="путь к папке")
+    parser.add_argument("password", help="пароль")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="число процессов (по умолчанию по числу ядер)")
+    parser.add_argument("--durability", choices=atomic_io.DURABILITY_LEVELS, default=atomic_io.DURABILITY_NONE,
+                        help="надежность записи: none - без fsync, file - fsync каждого файла, "
+                             "group - fsync файлов и каталога один раз на пакет файлов")
+    parser.add_argument("--backend", choices=[crypto_backends.AUTO, *crypto_backends.BACKENDS],
+                        help="криптографический бэкенд (по умолчанию самый быстрый)")
+    parser.add_argument("--metrics-json", metavar="PATH",
+                        help="сохранить метрики (время фаз, скорость, память) в JSON")
+    parser.add_argument("--metrics-prom", metavar="PATH",
+                        help="сохранить метрики для textfile collector Prometheus (*.prom)")
+    parser.add_argument("--log-dir", help="каталог для файла лога (по умолчанию текущий)")
+    parser.add_argument("--log-files", type=log_setup.check_file_events, metavar="all|summary|N",
+                        help="сообщения о каждом файле: all - все, summary - только итоги, N - каждое N-е")
+    args = parser.parse_args()
+    log_setup.configure(LOG_NAME, sys.stdout, args.log_dir, args.log_files, force=True)
+    # Бэкенд выбирается один раз здесь; рабочие процессы наследуют выбор
+    os.environ[crypto_backends.BACKEND_ENV] = crypto_backends.get_backend(args.backend).name
         
-    folder_path = sys.argv[1]
-    password = sys.argv[2]
+    folder_path = args.folder_path
+    password = args.password
     
     if not password:
         print("Ошибка: пароль не может быть пустым")
@@ -79,7 +157,15 @@ def main():
         
     logger.info(f"Начинаем дешифрование папки: {folder_path}")
     
-    success = decrypt_folder(folder_path, password)
+    # Ctrl+C отменяет задание; готовые файлы сохраняются в журнале
+    cancel_token = job_journal.CancelToken()
+    job_journal.cancel_on_interrupt(cancel_token)
+    metrics = job_metrics.DISABLED
+    if args.metrics_json or args.metrics_prom:
+        metrics = job_metrics.JobMetrics('decrypt_folder')
+    success = decrypt_folder(folder_path, password, args.workers, progress.TerminalProgress(), cancel_token,
+                             args.durability, metrics)
+    export_metrics(metrics, args.metrics_json, args.metrics_prom)
     
     if success:
         print(f"Папка успешно дешифрована: {folder_path}")
@@ -6,40 +6,121 @@ SFA Secure File Program - File Encryption Script
 
 import sys
 import os
+import argparse
 import base64
 import hashlib
 import hmac
 import logging
 from pathlib import Path
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-from cryptography.hazmat.backends import default_backend
-
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('encryption.log', encoding='utf-8'),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import atomic_io
+import compression
+import crypto_backends
+import file_format
+import job_metrics
+import log_setup
+import progress
+import segmented_format
+
+# Настройка логирования: запись в фоновом потоке (см. log_setup.py)
+LOG_NAME = 'encryption.log'
+log_setup.configure(LOG_NAME, sys.stdout)
 logger = logging.getLogger(__name__)
+# Сообщения об отдельных файлах (прореживаются, см. --log-files)
+file_logger = logging.getLogger(log_setup.FILE_EVENTS)
 
 def derive_key(password: str, salt: bytes) -> bytes:
     """Генерация ключа из пароля с использованием PBKDF2"""
-    kdf = PBKDF2HMAC(
-        algorithm=hashes.SHA256(),
-        length=32,  # 256 бит
-        salt=salt,
-        iterations=100000,
-        backend=default_backend()
+    return crypto_backends.get_backend().pbkdf2(
+        password.encode('utf-8'),
+        salt,
+        32,  # 256 бит
+        100000
     )
-    return kdf.derive(password.encode('utf-8'))
 
-def encrypt_file(file_path: str, password: str) -> bool:
-    """Шифрование файла"""
+def encrypt_stream(src, dst, password: str, compress: str = None, reporter=None,
+                   metrics: job_metrics.JobMetrics = job_metrics.DISABLED):
+    """
+    Потоковое шифрование src в dst в сегментированном формате (версия 3,
+    общий с основным шифровальщиком): каждый сегмент AES-256-GCM
+    аутентифицирован отдельно, в памяти не больше нескольких сегментов.
+    compress - алгоритм сжатия перед шифрованием ('zlib', 'lzma'),
+    несжимаемые данные пишутся без сжатия.
+    metrics учитывает фазы шифрования (см. job_metrics.py).
+    """
+    salt = os.urandom(file_format.SALT_SIZE)
+    nonce_prefix = os.urandom(file_format.NONCE_PREFIX_SIZE)
+    segment_size = segmented_format.DEFAULT_SEGMENT_SIZE
+    
+    with metrics.phase(job_metrics.PHASE_KDF):
+        master_key = derive_key(password, salt)
+    key = file_format.derive_segment_key(master_key)
+    
+    reporter = reporter or progress.ProgressReporter()
+    src = metrics.wrap(job_metrics.PHASE_READ, src)
+    dst = metrics.wrap(job_metrics.PHASE_WRITE, dst)
+    chunks = reporter.track(iter(lambda: src.read(segment_size), b''))
+    compressor, chunks = compression.choose(chunks, compress)
+    compression_id = compression.NONE
+    if compressor is not None:
+        chunks = metrics.track(job_metrics.PHASE_COMPRESS, compression.compress_chunks(chunks, compressor, segment_size))
+        compression_id = compressor.id
+        logger.info(f"Сжатие {compressor.name} перед шифрованием")
+    elif compress:
+        logger.info("Данные несжимаемы, сжатие пропущено")
+    header = file_format.build_segmented_header(salt, nonce_prefix, segment_size, compression=compression_id,
+                                                key_check=file_format.key_check_value(master_key))
+    dst.write(header)
+    aead = metrics.wrap(job_metrics.PHASE_CIPHER, crypto_backends.get_backend().aead(key))
+    writer = segmented_format.SegmentWriter(dst, aead, header, nonce_prefix, segment_size)
+    for chunk in chunks:
+        writer.write(chunk)
+    writer.close()
+    reporter.file_done()
+    reporter.finish()
+
+def encrypt_file_segmented(path_obj: Path, password: str, compress: str = None, on_progress=None,
+                           durability: str = atomic_io.DURABILITY_NONE, defer_commit: bool = False,
+                           metrics: job_metrics.JobMetrics = job_metrics.DISABLED) -> Path:
+    """Шифрование файла в сегментированный формат (версия 3)"""
+    encrypted_file_path = path_obj.with_suffix(path_obj.suffix + '.encrypted')
+    with open(path_obj, 'rb') as src, \
+            atomic_io.AtomicOutput(encrypted_file_path, durability, defer_commit) as dst:
+        file_size = os.fstat(src.fileno()).st_size
+        reporter = progress.ProgressReporter(on_progress, file_size, 1)
+        encrypt_stream(src, dst, password, compress, reporter, metrics)
+    metrics.file_done(file_size)
+    return encrypted_file_path
+
+def encrypt_pipe(password: str, compress: str = None, on_progress=None,
+                 metrics: job_metrics.JobMetrics = job_metrics.DISABLED) -> bool:
+    """
+    Режим конвейера: открытые данные читаются из stdin, зашифрованные
+    пишутся в stdout. Всегда сегментированный формат: формат v1 хранит
+    HMAC перед данными и требует держать файл в памяти целиком.
+    """
+    try:
+        reporter = progress.ProgressReporter(on_progress, 0, 1)
+        encrypt_stream(sys.stdin.buffer, sys.stdout.buffer, password, compress, reporter, metrics)
+        sys.stdout.buffer.flush()
+        metrics.file_done(reporter.bytes_done)
+        logger.info("Поток успешно зашифрован")
+        return True
+        
+    except Exception as e:
+        logger.error(f"Ошибка при шифровании потока: {e}")
+        return False
+
+def encrypt_file(file_path: str, password: str, segmented: bool = False, compress: str = None,
+                 on_progress=None, durability: str = atomic_io.DURABILITY_NONE, defer_commit: bool = False,
+                 metrics: job_metrics.JobMetrics = job_metrics.DISABLED) -> bool:
+    """
+    Шифрование файла; on_progress(event) получает progress.ProgressEvent.
+    Результат пишется атомарно с надежностью durability (см. atomic_io.py);
+    с defer_commit и 'group' он остается временным до GroupCommit.
+    metrics учитывает фазы шифрования (см. job_metrics.py).
+    """
     try:
         path_obj = Path(file_path)
         
@@ -51,9 +132,19 @@ def encrypt_file(file_path: str, password: str) -> bool:
             logger.error(f"Путь не является файлом: {file_path}")
             return False
 
+        if compress and not segmented:
+            logger.error("Сжатие поддерживается только в сегментированном формате (--segmented)")
+            return False
+
+        if segmented:
+            encrypted_file_path = encrypt_file_segmented(path_obj, password, compress, on_progress,
+                                                         durability, defer_commit, metrics)
+            file_logger.info(f"Файл успешно зашифрован: {encrypted_file_path}")
+            return True
+
         # Читаем исходный файл
         with open(path_obj, 'rb') as f:
-            data = f.read()
+            data = metrics.wrap(job_metrics.PHASE_READ, f).read()
             
         if not data:
             logger.warning(f"Файл пустой: {file_path}")
@@ -64,61 +155,121 @@ def encrypt_file(file_path: str, password: str) -> bool:
         iv = os.urandom(16)
         
         # Генерируем ключ из пароля
-        key = derive_key(password, salt)
+        with metrics.phase(job_metrics.PHASE_KDF):
+            key = derive_key(password, salt)
         
         # Создаем шифр
-        cipher = Cipher(algorithms.AES(key), modes.CBC(iv), backend=default_backend())
-        encryptor = cipher.encryptor()
+        backend = crypto_backends.get_backend()
+        encryptor = metrics.wrap(job_metrics.PHASE_CIPHER, backend.cbc_encryptor(key, iv))
         
         # Добавляем padding к данным
         padding_length = 16 - (len(data) % 16)
         padded_data = data + bytes([padding_length] * padding_length)
         
         # Шифруем данные
-        encrypted_data = encryptor.update(padded_data) + encryptor.finalize()
+        encrypted_data = encryptor.update(padded_data)
         
         # Создаем HMAC для проверки целостности
         hmac_key = hashlib.sha256(key + salt).digest()
-        hmac_obj = hmac.new(hmac_key, encrypted_data, hashlib.sha256)
-        hmac_digest = hmac_obj.digest()
+        with metrics.phase(job_metrics.PHASE_HMAC, len(encrypted_data)):
+            hmac_digest = backend.hmac_sha256(hmac_key, encrypted_data).digest()
         
         # Формируем зашифрованный файл
         encrypted_file_data = (
-            b'SFA_ENCRYPTED_FILE_V1\n' +  # Заголовок версии
-            salt +                        # Соль (16 байт)
-            iv +                          # IV (16 байт)
-            hmac_digest +                 # HMAC (32 байта)
-            encrypted_data                # Зашифрованные данные
+            b'SFA_ENCRYPTED_FILE_V1K\n' +          # Заголовок версии (v1 с проверкой ключа)
+            salt +                                 # Соль (16 байт)
+            iv +                                   # IV (16 байт)
+            file_format.key_check_value(key) +     # Проверочное значение ключа (16 байт)
+            hmac_digest +                          # HMAC (32 байта)
+            encrypted_data                         # Зашифрованные данные
         )
         
         # Сохраняем зашифрованный файл
         encrypted_file_path = path_obj.with_suffix(path_obj.suffix + '.encrypted')
-        with open(encrypted_file_path, 'wb') as f:
-            f.write(encrypted_file_data)
+        with atomic_io.AtomicOutput(encrypted_file_path, durability, defer_commit) as f:
+            metrics.wrap(job_metrics.PHASE_WRITE, f).write(encrypted_file_data)
+        metrics.file_done(len(data))
+        
+        # Формат v1 обрабатывается в памяти целиком: только итоговое событие
+        reporter = progress.ProgressReporter(on_progress, len(data), 1)
+        reporter.file_done(len(data))
+        reporter.finish()
             
-        logger.info(f"Файл успешно зашифрован: {encrypted_file_path}")
+        file_logger.info(f"Файл успешно зашифрован: {encrypted_file_path}")
         return True
         
     except Exception as e:
         logger.error(f"Ошибка при шифровании файла {file_path}: {e}")
         return False
 
+def log_to_stderr():
+    """В режиме конвейера stdout занят данными: сообщения выводятся в stderr"""
+    log_setup.set_console(sys.stderr)
+
+def export_metrics(metrics: job_metrics.JobMetrics, json_path: str = None, prometheus_path: str = None):
+    """Сохранение отчетов метрик и итог по фазам в лог"""
+    if not metrics.enabled:
+        return
+    try:
+        metrics.export(json_path, prometheus_path)
+        logger.info(f"Метрики: {metrics.summary()}")
+    except Exception as e:
+        logger.error(f"Ошибка сохранения метрик: {e}")
+
 def main():
     """Главная функция"""
-    if len(sys.argv) != 3:
-        print("Использование: python encrypt_file.py <путь_к_файлу> <пароль>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Шифрование файла")
+    parser.add_argument("file_path", help="путь к файлу или '-' для режима конвейера (stdin -> stdout)")
+    parser.add_argument("password", help="пароль")
+    parser.add_argument("--segmented", action="store_true",
+                        help="сегментированный формат v3 (аутентификация каждого сегмента)")
+    parser.add_argument("--compress", choices=[compressor.name for compressor in compression.COMPRESSORS.values()],
+                        help="сжатие перед шифрованием (только с --segmented или в режиме конвейера)")
+    parser.add_argument("--durability", choices=atomic_io.DURABILITY_LEVELS, default=atomic_io.DURABILITY_NONE,
+                        help="надежность записи: none - без fsync, file/group - fsync результата")
+    parser.add_argument("--backend", choices=[crypto_backends.AUTO, *crypto_backends.BACKENDS],
+                        help="криптографический бэкенд (по умолчанию самый быстрый)")
+    parser.add_argument("--metrics-json", metavar="PATH",
+                        help="сохранить метрики (время фаз, скорость, память) в JSON")
+    parser.add_argument("--metrics-prom", metavar="PATH",
+                        help="сохранить метрики для textfile collector Prometheus (*.prom)")
+    parser.add_argument("--log-dir", help="каталог для файла лога (по умолчанию текущий)")
+    parser.add_argument("--log-files", type=log_setup.check_file_events, metavar="all|summary|N",
+                        help="сообщения о каждом файле: all - все, summary - только итоги, N - каждое N-е")
+    args = parser.parse_args()
+    log_setup.configure(LOG_NAME, sys.stdout, args.log_dir, args.log_files, force=True)
+    if args.backend:
+        os.environ[crypto_backends.BACKEND_ENV] = args.backend
         
-    file_path = sys.argv[1]
-    password = sys.argv[2]
+    file_path = args.file_path
+    password = args.password
     
     if not password:
-        print("Ошибка: пароль не может быть пустым")
+        print("Ошибка: пароль не может быть пустым", file=sys.stderr)
         sys.exit(1)
         
+    metrics = job_metrics.DISABLED
+    if args.metrics_json or args.metrics_prom:
+        metrics = job_metrics.JobMetrics('encrypt_file')
+        
+    if file_path == '-':
+        log_to_stderr()
+        logger.info("Начинаем шифрование потока stdin -> stdout")
+        success = encrypt_pipe(password, args.compress, progress.TerminalProgress(), metrics)
+        if not success:
+            metrics.file_failed()
+        export_metrics(metrics, args.metrics_json, args.metrics_prom)
+        if not success:
+            sys.exit(1)
+        return
+        
     logger.info(f"Начинаем шифрование файла: {file_path}")
     
-    success = encrypt_file(file_path, password)
+    success = encrypt_file(file_path, password, args.segmented, args.compress, progress.TerminalProgress(),
+                           args.durability, metrics=metrics)
+    if not success:
+        metrics.file_failed()
+    export_metrics(metrics, args.metrics_json, args.metrics_prom)
     
     if success:
         print(f"Файл успешно зашифрован: {file_path}")
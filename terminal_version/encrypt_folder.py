@@ -5,23 +5,66 @@ SFA Secure File Program - Folder Encryption Script
 
 import sys
 import os
+import argparse
 import logging
 from pathlib import Path
-from encrypt_file import encrypt_file
-
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('folder_encryption.log', encoding='utf-8'),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+from encrypt_file import derive_key, encrypt_file, export_metrics
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import atomic_io
+import crypto_backends
+import file_format
+import folder_engine
+import incremental
+import job_journal
+import job_metrics
+import log_setup
+import progress
+
+# Настройка логирования: запись в фоновом потоке (см. log_setup.py)
+LOG_NAME = 'folder_encryption.log'
+log_setup.configure(LOG_NAME, sys.stdout)
 logger = logging.getLogger(__name__)
 
-def encrypt_folder(folder_path: str, password: str) -> bool:
-    """Шифрование папки"""
+# Служебные файлы, которые не шифруются
+SERVICE_FILES = (file_format.FOLDER_HEADER_NAME, incremental.MANIFEST_NAME, incremental.MANIFEST_NAME + '.tmp',
+                 job_journal.JOURNAL_NAME)
+
+def folder_hash_key(folder_path: str, password: str) -> bytes:
+    """
+    Ключ отпечатков содержимого в манифесте (--hash) из мастер-ключа папки.
+    Соль мастер-ключа хранится в заголовке .sfp_folder в корне папки (общем с
+    основным шифровальщиком); другой пароль отвергается по его проверочному
+    значению (WrongPasswordError).
+    """
+    header_path = file_format.find_folder_header(folder_path, folder_path)
+    if header_path is None:
+        salt = os.urandom(file_format.SALT_SIZE)
+        master_key = derive_key(password, salt)
+        file_format.write_folder_header(folder_path, salt, file_format.key_check_value(master_key))
+    else:
+        salt, key_check = file_format.read_folder_header(header_path)
+        master_key = derive_key(password, salt)
+        file_format.check_key(key_check, master_key)
+    return incremental.hash_key(master_key)
+
+def encrypt_folder(folder_path: str, password: str, workers: int = None, segmented: bool = False,
+                   incremental_mode: bool = False, use_hash: bool = False, on_progress=None,
+                   cancel_token: job_journal.CancelToken = None,
+                   durability: str = atomic_io.DURABILITY_NONE,
+                   metrics: job_metrics.JobMetrics = job_metrics.DISABLED) -> bool:
+    """
+    Шифрование папки.
+    Результаты пишутся атомарно с надежностью durability (см. atomic_io.py).
+    metrics собирает фазы из рабочих процессов (см. job_metrics.py).
+    С incremental_mode шифруются только новые и измененные файлы по манифесту
+    папки, а результаты удаленных файлов удаляются; use_hash дополнительно
+    сравнивает содержимое по отпечатку (см. folder_hash_key).
+    on_progress(event) получает progress.ProgressEvent по мере готовности файлов.
+    Готовые файлы отмечаются в журнале задания: после прерывания или отмены
+    через cancel_token повторный запуск продолжает с места остановки.
+    """
+    journal = None
     try:
         path_obj = Path(folder_path)
         
@@ -34,44 +77,140 @@ def encrypt_folder(folder_path: str, password: str) -> bool:
             return False
 
         # Получаем список всех файлов в папке
+        manifest = None
+        if incremental_mode:
+            hash_key = None
+            if use_hash:
+                with metrics.phase(job_metrics.PHASE_KDF):
+                    hash_key = folder_hash_key(folder_path, password)
+            manifest = incremental.Manifest.load(folder_path, hash_key)
         files_to_encrypt = []
+        seen_names = set()
+        states = {}
         for file_path in path_obj.rglob('*'):
-            if file_path.is_file() and not file_path.name.endswith('.encrypted'):
+            if file_path.is_file() and not file_path.name.endswith('.encrypted') \
+                    and file_path.name not in SERVICE_FILES and not atomic_io.is_temp(file_path.name):
+                if manifest is not None:
+                    seen_names.add(manifest.relative_name(str(file_path)))
+                    state = manifest.check(str(file_path), use_hash)
+                    if state is None:
+                        continue
+                    states[str(file_path)] = state
                 files_to_encrypt.append(file_path)
 
+        if manifest is not None:
+            for removed in manifest.remove_missing(seen_names):
+                logger.info(f"Удален результат отсутствующего файла: {removed}")
+
+        # Файлы, зашифрованные до прерывания предыдущего запуска
+        journal = job_journal.JobJournal.open(folder_path, 'encrypt', {'segmented': segmented})
+        done_files = [file_path for file_path in files_to_encrypt if journal.done_output(str(file_path))]
+        if done_files:
+            logger.info(f"Продолжение прерванного шифрования: готово файлов {len(done_files)}")
+            if manifest is not None:
+                for file_path in done_files:
+                    manifest.record(states[str(file_path)], str(file_path) + '.encrypted')
+            done = set(done_files)
+            files_to_encrypt = [file_path for file_path in files_to_encrypt if file_path not in done]
+
         if not files_to_encrypt:
+            journal.complete()
+            if manifest is not None:
+                manifest.save()
+                logger.info(f"Изменений нет: {folder_path}")
+                return True
             logger.warning(f"В папке нет файлов для шифрования: {folder_path}")
             return True
 
         logger.info(f"Найдено {len(files_to_encrypt)} файлов для шифрования")
 
-        # Шифруем каждый файл
-        success_count = 0
-        for file_path in files_to_encrypt:
-            try:
-                if encrypt_file(str(file_path), password):
-                    success_count += 1
-                    logger.info(f"Зашифрован файл: {file_path}")
+        # Шифруем файлы в пуле процессов; порядок результатов сохраняется
+        # С надежностью 'group' результаты фиксируются пакетами (atomic_io.GroupCommit),
+        # и только зафиксированные попадают в журнал
+        defer = durability == atomic_io.DURABILITY_GROUP
+        tasks = [(str(file_path), password, segmented, None, None, durability, defer) for file_path in files_to_encrypt]
+        sizes = {str(file_path): folder_engine.file_size(file_path) for file_path in files_to_encrypt}
+        reporter = progress.ProgressReporter(on_progress, sum(sizes.values()), len(tasks))
+        group = atomic_io.GroupCommit(lambda source: journal.record(source, source + '.encrypted'))
+
+        def on_result(result):
+            if result.ok and result.output:
+                if defer:
+                    group.add(result.path + '.encrypted', result.path)
                 else:
-                    logger.error(f"Ошибка шифрования файла: {file_path}")
-            except Exception as e:
-                logger.error(f"Исключение при шифровании файла {file_path}: {e}")
+                    journal.record(result.path, result.path + '.encrypted')
+            else:
+                metrics.file_failed()
+            metrics.merge(result.metrics)
+            reporter.file_done(sizes[result.path])
+
+        with group:
+            results = folder_engine.run_parallel(encrypt_file, tasks, workers, on_result, cancel_token,
+                                                 metrics.enabled)
+        reporter.finish()
+
+        success_count = 0
+        for result in results:
+            if result.ok and result.output:
+                success_count += 1
+                if manifest is not None:
+                    manifest.record(states[result.path], result.path + '.encrypted')
+            elif result.ok:
+                logger.error(f"Ошибка шифрования файла: {result.path}")
+            else:
+                logger.error(f"Исключение при шифровании файла {result.path}: {result.error}")
 
+        if manifest is not None:
+            manifest.save()
         logger.info(f"Успешно зашифровано {success_count} из {len(files_to_encrypt)} файлов")
+        if success_count == len(files_to_encrypt):
+            journal.complete()
         return success_count == len(files_to_encrypt)
         
+    except job_journal.JobCancelled:
+        logger.warning(f"Шифрование отменено, повторный запуск продолжит с места остановки: {folder_path}")
+        return False
+
     except Exception as e:
         logger.error(f"Ошибка при шифровании папки {folder_path}: {e}")
         return False
 
+    finally:
+        if journal is not None:
+            journal.close()
+
 def main():
     """Главная функция"""
-    if len(sys.argv) != 3:
-        print("Использование: python encrypt_folder.py <путь_к_папке> <пароль>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Шифрование папки")
+    parser.add_argument("folder_path", help="путь к папке")
+    parser.add_argument("password", help="пароль")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="число процессов (по умолчанию по числу ядер)")
+    parser.add_argument("--segmented", action="store_true",
+                        help="сегментированный формат v3 (аутентификация каждого сегмента)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="шифровать только новые и измененные файлы (манифест в корне папки)")
+    parser.add_argument("--hash", action="store_true",
+                        help="в режиме --incremental сравнивать содержимое (по HMAC с ключом папки)")
+    parser.add_argument("--durability", choices=atomic_io.DURABILITY_LEVELS, default=atomic_io.DURABILITY_NONE,
+                        help="надежность записи: none - без fsync, file - fsync каждого файла, "
+                             "group - fsync файлов и каталога один раз на пакет файлов")
+    parser.add_argument("--backend", choices=[crypto_backends.AUTO, *crypto_backends.BACKENDS],
+                        help="криптографический бэкенд (по умолчанию самый быстрый)")
+    parser.add_argument("--metrics-json", metavar="PATH",
+                        help="сохранить метрики (время фаз, скорость, память) в JSON")
+    parser.add_argument("--metrics-prom", metavar="PATH",
+                        help="сохранить метрики для textfile collector Prometheus (*.prom)")
+    parser.add_argument("--log-dir", help="каталог для файла лога (по умолчанию текущий)")
+    parser.add_argument("--log-files", type=log_setup.check_file_events, metavar="all|summary|N",
+                        help="сообщения о каждом файле: all - все, summary - только итоги, N - каждое N-е")
+    args = parser.parse_args()
+    log_setup.configure(LOG_NAME, sys.stdout, args.log_dir, args.log_files, force=True)
+    # Бэкенд выбирается один раз здесь; рабочие процессы наследуют выбор
+    os.environ[crypto_backends.BACKEND_ENV] = crypto_backends.get_backend(args.backend).name
         
-    folder_path = sys.argv[1]
-    password = sys.argv[2]
+    folder_path = args.folder_path
+    password = args.password
     
     if not password:
         print("Ошибка: пароль не может быть пустым")
@@ -79,7 +218,15 @@ def main():
         
     logger.info(f"Начинаем шифрование папки: {folder_path}")
     
-    success = encrypt_folder(folder_path, password)
+    # Ctrl+C отменяет задание; готовые файлы сохраняются в журнале
+    cancel_token = job_journal.CancelToken()
+    job_journal.cancel_on_interrupt(cancel_token)
+    metrics = job_metrics.DISABLED
+    if args.metrics_json or args.metrics_prom:
+        metrics = job_metrics.JobMetrics('encrypt_folder')
+    success = encrypt_folder(folder_path, password, args.workers, args.segmented, args.incremental, args.hash,
+                             progress.TerminalProgress(), cancel_token, args.durability, metrics)
+    export_metrics(metrics, args.metrics_json, args.metrics_prom)
     
     if success:
         print(f"Папка успешно зашифрована: {folder_path}")
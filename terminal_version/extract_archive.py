@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+SFA Secure File Program - Archive Extraction Script
+Список и извлечение элементов зашифрованного архива папки
+"""
+
+import sys
+import os
+import argparse
+import logging
+from pathlib import Path
+from decrypt_file import derive_key
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import archive
+import crypto_backends
+import file_format
+import log_setup
+import random_access
+import segmented_format
+
+# Настройка логирования: запись в фоновом потоке (см. log_setup.py)
+LOG_NAME = 'archive_decryption.log'
+log_setup.configure(LOG_NAME, sys.stdout)
+logger = logging.getLogger(__name__)
+
+def open_archive(archive_path: str, password: str) -> archive.ArchiveReader:
+    """Открытие архива: проверяется только индекс, данные не дешифруются"""
+    src = open(archive_path, 'rb')
+    try:
+        header = file_format.read_header(src)
+        if header is None or not header.flags & file_format.FLAG_ARCHIVE:
+            raise ValueError("Файл не является архивом папки")
+        master_key = derive_key(password, header.salt)
+        # Неверный пароль отвергается сразу, без проверки индекса архива
+        file_format.check_key(header.key_check, master_key)
+        key = file_format.derive_segment_key(master_key)
+        aead = crypto_backends.get_backend().aead(key)
+        reader = segmented_format.SegmentReader(src, aead, header, os.fstat(src.fileno()).st_size)
+        return archive.ArchiveReader(random_access.EncryptedFileReader(src, reader))
+    except Exception:
+        src.close()
+        raise
+
+def list_archive(archive_path: str, password: str) -> bool:
+    """Вывод списка элементов архива"""
+    try:
+        with open_archive(archive_path, password) as reader:
+            for member in reader.members:
+                if member.is_dir():
+                    print(f"{'<папка>':>12}  {member.name}/")
+                else:
+                    print(f"{member.size:>12}  {member.name}")
+        return True
+
+    except Exception as e:
+        logger.error(f"Ошибка при чтении архива {archive_path}: {e}")
+        return False
+
+def extract_archive(archive_path: str, password: str, destination: str = None, names: list = None) -> bool:
+    """Извлечение всего архива или перечисленных элементов"""
+    try:
+        path_obj = Path(archive_path)
+
+        if not path_obj.is_file():
+            logger.error(f"Файл не найден: {archive_path}")
+            return False
+
+        if destination is None:
+            destination = str(path_obj.with_suffix('')) if path_obj.suffix == archive.ARCHIVE_EXTENSION \
+                else str(path_obj) + '.decrypted'
+
+        with open_archive(archive_path, password) as reader:
+            paths = reader.extractall(destination, names or None)
+
+        logger.info(f"Извлечено {len(paths)} элементов в: {destination}")
+        return True
+
+    except Exception as e:
+        logger.error(f"Ошибка при извлечении архива {archive_path}: {e}")
+        return False
+
+def main():
+    """Главная функция"""
+    parser = argparse.ArgumentParser(description="Извлечение зашифрованного архива папки")
+    parser.add_argument("archive_path", help="путь к архиву")
+    parser.add_argument("password", help="пароль")
+    parser.add_argument("members", nargs='*', help="элементы для извлечения (по умолчанию все)")
+    parser.add_argument("-d", "--destination", help="папка назначения")
+    parser.add_argument("-l", "--list", action="store_true", help="только вывести список элементов")
+    parser.add_argument("--backend", choices=[crypto_backends.AUTO, *crypto_backends.BACKENDS],
+                        help="криптографический бэкенд (по умолчанию самый быстрый)")
+    parser.add_argument("--log-dir", help="каталог для файла лога (по умолчанию текущий)")
+    parser.add_argument("--log-files", type=log_setup.check_file_events, metavar="all|summary|N",
+                        help="сообщения о каждом файле: all - все, summary - только итоги, N - каждое N-е")
+    args = parser.parse_args()
+    log_setup.configure(LOG_NAME, sys.stdout, args.log_dir, args.log_files, force=True)
+    if args.backend:
+        os.environ[crypto_backends.BACKEND_ENV] = args.backend
+
+    if not args.password:
+        print("Ошибка: пароль не может быть пустым")
+        sys.exit(1)
+
+    if args.list:
+        success = list_archive(args.archive_path, args.password)
+    else:
+        logger.info(f"Начинаем извлечение архива: {args.archive_path}")
+        success = extract_archive(args.archive_path, args.password, args.destination, args.members)
+
+    if success:
+        if not args.list:
+            print(f"Архив успешно извлечен: {args.archive_path}")
+    else:
+        print(f"Ошибка при обработке архива: {args.archive_path}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
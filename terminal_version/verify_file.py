@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+SFA Secure File Program - File Verification Script
+Проверка подлинности зашифрованного файла без записи открытого текста
+"""
+
+import sys
+import os
+import argparse
+import hashlib
+import hmac
+import logging
+from pathlib import Path
+from decrypt_file import V1_HEADER, V1_KEY_CHECK_HEADER, derive_key, read_v1_header, segment_key_for
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import crypto_backends
+import file_format
+import log_setup
+import progress
+import segmented_format
+
+# Настройка логирования: запись в фоновом потоке (см. log_setup.py)
+LOG_NAME = 'verification.log'
+log_setup.configure(LOG_NAME, sys.stdout)
+logger = logging.getLogger(__name__)
+# Сообщения об отдельных файлах (прореживаются, см. --log-files)
+file_logger = logging.getLogger(log_setup.FILE_EVENTS)
+
+READ_SIZE = 1024 * 1024
+
+def verify_segmented(src, path_obj: Path, password: str, reporter: progress.ProgressReporter):
+    """Проверка тегов всех сегментов формата версии 3 (в том числе архивов)"""
+    header = file_format.read_header(src)
+    if header is None or header.version != file_format.FORMAT_SEGMENTED:
+        raise ValueError("Неверный формат файла")
+    aead = crypto_backends.get_backend().aead(segment_key_for(path_obj, header, password))
+    reader = segmented_format.SegmentReader(src, aead, header, os.fstat(src.fileno()).st_size)
+    reporter.total_bytes = reader.body_size
+    for _ in reporter.track(reader.iter_segments()):
+        pass
+
+def verify_v1(src, password: str, reporter: progress.ProgressReporter):
+    """Потоковая проверка HMAC формата v1 терминальной версии"""
+    salt, _, key_check, hmac_digest = read_v1_header(src)  # IV для проверки не нужен
+    ciphertext_size = os.fstat(src.fileno()).st_size - src.tell()
+    if ciphertext_size <= 0 or ciphertext_size % 16:
+        raise ValueError("Неверный формат файла")
+    
+    key = derive_key(password, salt)
+    file_format.check_key(key_check, key)
+    hmac_obj = crypto_backends.get_backend().hmac_sha256(hashlib.sha256(key + salt).digest())
+    reporter.total_bytes = ciphertext_size
+    for chunk in reporter.track(iter(lambda: src.read(READ_SIZE), b'')):
+        hmac_obj.update(chunk)
+    if not hmac.compare_digest(hmac_digest, hmac_obj.digest()):
+        raise ValueError("HMAC не совпадает - файл поврежден или неверный пароль")
+
+def authenticate_file(file_path: str, password: str, on_progress=None) -> bool:
+    """
+    Проверка файла: файл только читается, открытый текст никуда не пишется.
+    При повреждении или неверном пароле выбрасывается исключение.
+    """
+    path_obj = Path(file_path)
+    reporter = progress.ProgressReporter(on_progress, 0, 1)
+    with open(path_obj, 'rb') as src:
+        start = src.read(max(len(file_format.MAGIC), len(V1_KEY_CHECK_HEADER)))
+        src.seek(0)
+        if start.startswith(file_format.MAGIC):
+            verify_segmented(src, path_obj, password, reporter)
+        elif start.startswith((V1_HEADER, V1_KEY_CHECK_HEADER)):
+            verify_v1(src, password, reporter)
+        else:
+            raise ValueError("Неверный формат файла")
+    reporter.file_done()
+    reporter.finish()
+    return True
+
+def verify_file(file_path: str, password: str, on_progress=None) -> bool:
+    """Проверка файла; on_progress(event) получает progress.ProgressEvent"""
+    try:
+        path_obj = Path(file_path)
+        
+        if not path_obj.is_file():
+            logger.error(f"Файл не найден: {file_path}")
+            return False
+        
+        authenticate_file(file_path, password, on_progress)
+        file_logger.info(f"Файл цел: {file_path}")
+        return True
+        
+    except Exception as e:
+        logger.error(f"Проверка файла {file_path} не прошла: {e}")
+        return False
+
+def main():
+    """Главная функция"""
+    parser = argparse.ArgumentParser(description="Проверка подлинности зашифрованного файла без дешифрования на диск")
+    parser.add_argument("file_path", help="путь к зашифрованному файлу")
+    parser.add_argument("password", help="пароль")
+    parser.add_argument("--backend", choices=[crypto_backends.AUTO, *crypto_backends.BACKENDS],
+                        help="криптографический бэкенд (по умолчанию самый быстрый)")
+    parser.add_argument("--log-dir", help="каталог для файла лога (по умолчанию текущий)")
+    parser.add_argument("--log-files", type=log_setup.check_file_events, metavar="all|summary|N",
+                        help="сообщения о каждом файле: all - все, summary - только итоги, N - каждое N-е")
+    args = parser.parse_args()
+    log_setup.configure(LOG_NAME, sys.stdout, args.log_dir, args.log_files, force=True)
+    if args.backend:
+        os.environ[crypto_backends.BACKEND_ENV] = args.backend
+        
+    file_path = args.file_path
+    password = args.password
+    
+    if not password:
+        print("Ошибка: пароль не может быть пустым")
+        sys.exit(1)
+        
+    logger.info(f"Начинаем проверку файла: {file_path}")
+    
+    if verify_file(file_path, password, progress.TerminalProgress()):
+        print(f"Файл цел: {file_path}")
+    else:
+        print(f"Файл поврежден или пароль неверный: {file_path}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+SFA Secure File Program - Folder Verification Script
+Аудит зашифрованной папки: все файлы проверяются параллельно, открытый
+текст никуда не пишется; итог - отчет о целых и поврежденных файлах.
+"""
+
+import sys
+import os
+import argparse
+import json
+import logging
+from pathlib import Path
+from decrypt_file import check_password
+from verify_file import authenticate_file
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import archive
+import crypto_backends
+import folder_engine
+import job_journal
+import log_setup
+import progress
+
+# Настройка логирования: запись в фоновом потоке (см. log_setup.py)
+LOG_NAME = 'folder_verification.log'
+log_setup.configure(LOG_NAME, sys.stdout)
+logger = logging.getLogger(__name__)
+
+def write_report(report_path: str, folder_path: str, results: list):
+    """Отчет в JSON: по записи на файл и итоговые счетчики"""
+    report = {
+        'folder': os.path.abspath(folder_path),
+        'passed': sum(1 for result in results if result.ok),
+        'failed': sum(1 for result in results if not result.ok),
+        'files': [{'path': result.path, 'ok': result.ok, 'error': result.error} for result in results],
+    }
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+def verify_folder(folder_path: str, password: str, workers: int = None, on_progress=None,
+                  cancel_token: job_journal.CancelToken = None, report_path: str = None) -> bool:
+    """
+    Проверка всех зашифрованных файлов и архивов папки в пуле процессов.
+    True, если все файлы целы; report_path - необязательный отчет в JSON.
+    """
+    try:
+        path_obj = Path(folder_path)
+        
+        if not path_obj.is_dir():
+            logger.error(f"Папка не найдена: {folder_path}")
+            return False
+
+        files_to_verify = sorted(
+            file_path for file_path in path_obj.rglob('*')
+            if file_path.is_file() and file_path.name.endswith(('.encrypted', archive.ARCHIVE_EXTENSION))
+        )
+        if not files_to_verify:
+            logger.warning(f"В папке нет зашифрованных файлов: {folder_path}")
+            return True
+
+        logger.info(f"Найдено {len(files_to_verify)} зашифрованных файлов")
+
+        # Неверный пароль виден по первому файлу сразу после PBKDF2
+        if not check_password(files_to_verify[0], password):
+            logger.error(f"Неверный пароль: {files_to_verify[0]}")
+            return False
+
+        tasks = [(str(file_path), password) for file_path in files_to_verify]
+        sizes = {str(file_path): folder_engine.file_size(file_path) for file_path in files_to_verify}
+        reporter = progress.ProgressReporter(on_progress, sum(sizes.values()), len(tasks))
+        results = folder_engine.run_parallel(
+            authenticate_file, tasks, workers, lambda result: reporter.file_done(sizes[result.path]), cancel_token
+        )
+        reporter.finish()
+
+        # В выводе только поврежденные файлы; полный список - в отчете JSON
+        for result in results:
+            if not result.ok:
+                print(f"ОШИБКА  {result.path}: {result.error}")
+        passed = sum(1 for result in results if result.ok)
+        logger.info(f"Проверено файлов: {len(results)}, целых: {passed}, поврежденных: {len(results) - passed}")
+        if report_path:
+            write_report(report_path, folder_path, results)
+            logger.info(f"Отчет сохранен: {report_path}")
+        return passed == len(results)
+        
+    except job_journal.JobCancelled:
+        logger.warning(f"Проверка папки отменена: {folder_path}")
+        return False
+        
+    except Exception as e:
+        logger.error(f"Ошибка при проверке папки {folder_path}: {e}")
+        return False
+
+def main():
+    """Главная функция"""
+    parser = argparse.ArgumentParser(description="Проверка подлинности всех зашифрованных файлов папки")
+    parser.add_argument("folder_path", help="путь к папке")
+    parser.add_argument("password", help="пароль")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="число процессов (по умолчанию по числу ядер)")
+    parser.add_argument("--report", help="путь для отчета в JSON")
+    parser.add_argument("--backend", choices=[crypto_backends.AUTO, *crypto_backends.BACKENDS],
+                        help="криптографический бэкенд (по умолчанию самый быстрый)")
+    parser.add_argument("--log-dir", help="каталог для файла лога (по умолчанию текущий)")
+    parser.add_argument("--log-files", type=log_setup.check_file_events, metavar="all|summary|N",
+                        help="сообщения о каждом файле: all - все, summary - только итоги, N - каждое N-е")
+    args = parser.parse_args()
+    log_setup.configure(LOG_NAME, sys.stdout, args.log_dir, args.log_files, force=True)
+    # Бэкенд выбирается один раз здесь; рабочие процессы наследуют выбор
+    os.environ[crypto_backends.BACKEND_ENV] = crypto_backends.get_backend(args.backend).name
+        
+    folder_path = args.folder_path
+    password = args.password
+    
+    if not password:
+        print("Ошибка: пароль не может быть пустым")
+        sys.exit(1)
+        
+    logger.info(f"Начинаем проверку папки: {folder_path}")
+    
+    cancel_token = job_journal.CancelToken()
+    job_journal.cancel_on_interrupt(cancel_token)
+    success = verify_folder(folder_path, password, args.workers, progress.TerminalProgress(), cancel_token, args.report)
+    
+    if success:
+        print(f"Все файлы папки целы: {folder_path}")
+    else:
+        print(f"Проверка папки не пройдена: {folder_path}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -148,23 +148,1473 @@ def test_wrong_password():
         except:
             pass
 
+def test_streaming_large_file():
+    """Тест потокового шифрования файла, который больше буфера"""
+    print("\n🔍 Тестирование потокового шифрования...")
+    
+    fd, original_file = tempfile.mkstemp(suffix='.bin')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(os.urandom(1024 * 1024 + 7))
+    original_hash = get_file_hash(original_file)
+    
+    try:
+        # Маленький буфер, чтобы файл обрабатывался многими кусками
+        encryptor = SecureFileEncryptor(buffer_size=4096)
+        decryptor = SecureFileDecryptor()
+        password = "StreamPassword123!"
+        
+        encrypted_file = encryptor.encrypt_file(original_file, password)
+        decrypted_file = decryptor.decrypt_file(encrypted_file, password)
+        
+        if get_file_hash(decrypted_file) == original_hash:
+            print("✅ ТЕСТ ПРОЙДЕН: Потоковое шифрование совместимо с дешифровальщиком")
+            return True
+        else:
+            print("❌ ТЕСТ ПРОВАЛЕН: Хеши не совпадают!")
+            return False
+            
+    except Exception as e:
+        print(f"❌ ОШИБКА ТЕСТА: {e}")
+        return False
+    
+    finally:
+        for path in (original_file, locals().get('encrypted_file'), locals().get('decrypted_file')):
+            if path and os.path.exists(path):
+                os.remove(path)
+
+def test_legacy_format():
+    """Тест дешифрования файла старого формата (без заголовка)"""
+    print("\n🔍 Тестирование совместимости со старым форматом...")
+    
+    from Crypto.Cipher import AES
+    from Crypto.Util.Padding import pad
+    from Crypto.Protocol.KDF import PBKDF2
+    import hmac
+    
+    test_content = b"Legacy file content\n" * 100
+    password = "LegacyPassword123!"
+    
+    # Собираем файл так, как его писали прежние версии:
+    # IV + encrypted_data + HMAC(encrypted_data + salt) + salt
+    salt = os.urandom(32)
+    iv = os.urandom(16)
+    key = PBKDF2(password, salt, dkLen=32, count=100000)
+    encrypted_data = AES.new(key, AES.MODE_CBC, iv).encrypt(pad(test_content, AES.block_size))
+    hmac_value = hmac.new(key, encrypted_data + salt, hashlib.sha256).digest()
+    
+    fd, encrypted_file = tempfile.mkstemp(suffix='.encrypted')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(iv + encrypted_data + hmac_value + salt)
+    
+    try:
+        decrypted_file = SecureFileDecryptor().decrypt_file(encrypted_file, password)
+        with open(decrypted_file, 'rb') as f:
+            if f.read() == test_content:
+                print("✅ ТЕСТ ПРОЙДЕН: Файл старого формата дешифрован")
+                return True
+        print("❌ ТЕСТ ПРОВАЛЕН: Содержимое файлов отличается!")
+        return False
+        
+    except Exception as e:
+        print(f"❌ ОШИБКА ТЕСТА: {e}")
+        return False
+    
+    finally:
+        for path in (encrypted_file, locals().get('decrypted_file')):
+            if path and os.path.exists(path):
+                os.remove(path)
+
+def test_folder_encryption():
+    """Тест шифрования папки с общим мастер-ключом"""
+    print("\n🔍 Тестирование шифрования папки...")
+    
+    import shutil
+    folder = tempfile.mkdtemp()
+    contents = {}
+    for i in range(10):
+        subfolder = os.path.join(folder, f"sub{i % 3}")
+        os.makedirs(subfolder, exist_ok=True)
+        file_path = os.path.join(subfolder, f"file{i}.txt")
+        contents[file_path] = f"Файл номер {i}\n" * (i + 1)
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(contents[file_path])
+    
+    try:
+        password = "FolderPassword123!"
+        encrypted_files = SecureFileEncryptor().encrypt_folder(folder, password)
+        
+        if not os.path.exists(os.path.join(folder, '.sfp_folder')):
+            print("❌ ТЕСТ ПРОВАЛЕН: Заголовок папки не создан")
+            return False
+        
+        for encrypted_file in encrypted_files:
+            os.remove(encrypted_file[:-len('.encrypted')])
+        SecureFileDecryptor().decrypt_folder(folder, password)
+        
+        for file_path, content in contents.items():
+            with open(file_path + '.decrypted', 'r', encoding='utf-8') as f:
+                if f.read() != content:
+                    print(f"❌ ТЕСТ ПРОВАЛЕН: Содержимое отличается: {file_path}")
+                    return False
+        
+        # Пул процессов: результаты в порядке задач, ошибка одного файла
+        # не мешает остальным
+        import folder_engine
+        paths = sorted(file_path + '.decrypted' for file_path in contents)
+        tasks = [(path,) for path in paths[:4]] + [(os.path.join(folder, 'missing.txt'),)] + [(path,) for path in paths[4:]]
+        results = folder_engine.run_parallel(os.path.getsize, tasks, workers=4)
+        if [result.path for result in results] != [task[0] for task in tasks]:
+            print("❌ ТЕСТ ПРОВАЛЕН: Результаты пула не в порядке задач")
+            return False
+        if [result.ok for result in results].count(False) != 1 or results[4].ok:
+            print("❌ ТЕСТ ПРОВАЛЕН: Ошибка одного файла не попала в его результат")
+            return False
+        if any(result.output != os.path.getsize(result.path) for result in results if result.ok):
+            print("❌ ТЕСТ ПРОВАЛЕН: Неверный результат задачи пула")
+            return False
+        import job_journal
+        cancel_token = job_journal.CancelToken()
+        cancel_token.cancel()
+        try:
+            folder_engine.run_parallel(os.path.getsize, tasks, workers=2, cancel_token=cancel_token)
+            print("❌ ТЕСТ ПРОВАЛЕН: Отмена пула не сработала")
+            return False
+        except job_journal.JobCancelled:
+            pass
+        
+        # Поврежденный файл попадает в FolderProcessingError, остальные дешифруются
+        for file_path in contents:
+            os.remove(file_path + '.decrypted')
+        corrupted = sorted(encrypted_files)[0]
+        with open(corrupted, 'r+b') as f:
+            f.seek(-10, os.SEEK_END)
+            f.write(bytes(10))
+        try:
+            SecureFileDecryptor().decrypt_folder(folder, password, 4)
+            print("❌ ТЕСТ ПРОВАЛЕН: Поврежденный файл не обнаружен")
+            return False
+        except folder_engine.FolderProcessingError as e:
+            if [result.path for result in e.failed] != [corrupted]:
+                print(f"❌ ТЕСТ ПРОВАЛЕН: Неверный список ошибок: {e.failed}")
+                return False
+        for file_path in contents:
+            if file_path + '.encrypted' != corrupted and not os.path.exists(file_path + '.decrypted'):
+                print(f"❌ ТЕСТ ПРОВАЛЕН: Файл не дешифрован из-за ошибки другого: {file_path}")
+                return False
+        
+        print(f"✅ ТЕСТ ПРОЙДЕН: Папка из {len(encrypted_files)} файлов зашифрована и дешифрована")
+        return True
+        
+    except Exception as e:
+        print(f"❌ ОШИБКА ТЕСТА: {e}")
+        return False
+    
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+def test_segmented_format():
+    """Тест сегментированного формата и обнаружения обрезки файла"""
+    print("\n🔍 Тестирование сегментированного формата...")
+    
+    fd, original_file = tempfile.mkstemp(suffix='.bin')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(os.urandom(5 * 4096 + 123))
+    original_hash = get_file_hash(original_file)
+    
+    try:
+        encryptor = SecureFileEncryptor(format_version=3, segment_size=4096)
+        decryptor = SecureFileDecryptor()
+        password = "SegmentPassword123!"
+        
+        encrypted_file = encryptor.encrypt_file(original_file, password)
+        decrypted_file = decryptor.decrypt_file(encrypted_file, password)
+        if get_file_hash(decrypted_file) != original_hash:
+            print("❌ ТЕСТ ПРОВАЛЕН: Хеши не совпадают!")
+            return False
+        os.remove(decrypted_file)
+        
+        # Отрезаем последний сегмент целиком - должно обнаружиться
+        with open(encrypted_file, 'rb') as f:
+            data = f.read()
+        with open(encrypted_file, 'wb') as f:
+            f.write(data[:-(123 + 16)])
+        try:
+            decryptor.decrypt_file(encrypted_file, password)
+            print("❌ ТЕСТ ПРОВАЛЕН: Обрезанный файл дешифровался!")
+            return False
+        except ValueError:
+            pass
+        
+        if os.path.exists(decrypted_file):
+            print("❌ ТЕСТ ПРОВАЛЕН: Остался частично дешифрованный файл")
+            return False
+        
+        print("✅ ТЕСТ ПРОЙДЕН: Сегменты проверяются, обрезка обнаружена")
+        return True
+        
+    except Exception as e:
+        print(f"❌ ОШИБКА ТЕСТА: {e}")
+        return False
+    
+    finally:
+        for path in (original_file, locals().get('encrypted_file'), locals().get('decrypted_file')):
+            if path and os.path.exists(path):
+                os.remove(path)
+
+def test_random_access():
+    """Тест чтения произвольного участка без дешифрования всего файла"""
+    print("\n🔍 Тестирование произвольного доступа...")
+    
+    data = os.urandom(10 * 4096 + 500)
+    fd, original_file = tempfile.mkstemp(suffix='.bin')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    
+    try:
+        password = "RandomAccess123!"
+        encrypted_file = SecureFileEncryptor(format_version=3, segment_size=4096).encrypt_file(original_file, password)
+        
+        with SecureFileDecryptor().open_encrypted(encrypted_file, password, cache_size=2 * 4096) as reader:
+            checks = [(0, 10), (4090, 20), (7 * 4096 + 1, 5000), (len(data) - 100, 1000)]
+            for offset, size in checks:
+                reader.seek(offset)
+                if reader.read(size) != data[offset:offset + size]:
+                    print(f"❌ ТЕСТ ПРОВАЛЕН: Неверные данные по смещению {offset}")
+                    return False
+            reader.seek(-50, os.SEEK_END)
+            if reader.read() != data[-50:]:
+                print("❌ ТЕСТ ПРОВАЛЕН: Неверный хвост файла")
+                return False
+        
+        print("✅ ТЕСТ ПРОЙДЕН: Участки файла читаются с произвольного смещения")
+        return True
+        
+    except Exception as e:
+        print(f"❌ ОШИБКА ТЕСТА: {e}")
+        return False
+    
+    finally:
+        for path in (original_file, locals().get('encrypted_file')):
+            if path and os.path.exists(path):
+                os.remove(path)
+
+def test_crypto_backends():
+    """Тест совместимости криптографических бэкендов между собой"""
+    print("\n🔍 Тестирование криптографических бэкендов...")
+    
+    import crypto_backends
+    backends = crypto_backends.available_backends()
+    data = os.urandom(3 * 4096 + 77)
+    fd, original_file = tempfile.mkstemp(suffix='.bin')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    
+    try:
+        password = "BackendPassword123!"
+        for format_version in (2, 3):
+            for encrypt_backend in backends:
+                encryptor = SecureFileEncryptor(format_version=format_version, segment_size=4096,
+                                                backend=encrypt_backend)
+                encrypted_file = encryptor.encrypt_file(original_file, password)
+                for decrypt_backend in backends:
+                    decrypted_file = SecureFileDecryptor(backend=decrypt_backend).decrypt_file(encrypted_file, password)
+                    with open(decrypted_file, 'rb') as f:
+                        if f.read() != data:
+                            print(f"❌ ТЕСТ ПРОВАЛЕН: v{format_version} {encrypt_backend} -> {decrypt_backend}")
+                            return False
+                    os.remove(decrypted_file)
+                os.remove(encrypted_file)
+        
+        print(f"✅ ТЕСТ ПРОЙДЕН: Бэкенды совместимы ({', '.join(backends)})")
+        return True
+        
+    except Exception as e:
+        print(f"❌ ОШИБКА ТЕСТА: {e}")
+        return False
+    
+    finally:
+        for path in (original_file, locals().get('encrypted_file'), locals().get('decrypted_file')):
+            if path and os.path.exists(path):
+                os.remove(path)
+
+def test_archive():
+    """Тест архива папки: список, извлечение одного элемента и всей папки"""
+    print("\n🔍 Тестирование архива папки...")
+    
+    import shutil
+    work_dir = tempfile.mkdtemp()
+    folder = os.path.join(work_dir, 'source')
+    files = {
+        'a.txt': 'Первый файл'.encode('utf-8'),
+        'sub/b.bin': os.urandom(70000),
+        'sub/deep/c.txt': b'',
+    }
+    for name, data in files.items():
+        path = os.path.join(folder, *name.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+    os.makedirs(os.path.join(folder, 'empty'))
+    if os.name != 'nt':
+        # Бит setgid не должен восстанавливаться при извлечении
+        os.chmod(os.path.join(folder, 'a.txt'), 0o2750)
+    
+    try:
+        password = "ArchivePassword123!"
+        encryptor = SecureFileEncryptor(segment_size=4096)
+        decryptor = SecureFileDecryptor()
+        archive_path = encryptor.encrypt_folder_to_archive(folder, password)
+        
+        with decryptor.open_archive(archive_path, password) as reader:
+            if sorted(name for name in reader.names() if not reader.getmember(name).is_dir()) != sorted(files):
+                print("❌ ТЕСТ ПРОВАЛЕН: Неверный список элементов")
+                return False
+            if reader.read('sub/b.bin') != files['sub/b.bin']:
+                print("❌ ТЕСТ ПРОВАЛЕН: Неверные данные элемента")
+                return False
+        
+        destination = os.path.join(work_dir, 'restored')
+        decryptor.extract_archive(archive_path, password, destination)
+        for name, data in files.items():
+            with open(os.path.join(destination, *name.split('/')), 'rb') as f:
+                if f.read() != data:
+                    print(f"❌ ТЕСТ ПРОВАЛЕН: Неверное содержимое {name}")
+                    return False
+        if not os.path.isdir(os.path.join(destination, 'empty')):
+            print("❌ ТЕСТ ПРОВАЛЕН: Не восстановлена пустая папка")
+            return False
+        if os.name != 'nt' and os.stat(os.path.join(destination, 'a.txt')).st_mode & 0o7777 != 0o750:
+            print("❌ ТЕСТ ПРОВАЛЕН: Права элемента восстановлены с setuid/setgid или неверно")
+            return False
+        if any(name.endswith('.sfptmp') for _, _, names in os.walk(destination) for name in names):
+            print("❌ ТЕСТ ПРОВАЛЕН: После извлечения остались временные файлы")
+            return False
+        
+        try:
+            decryptor.open_archive(archive_path, "WrongPassword")
+            print("❌ ТЕСТ ПРОВАЛЕН: Архив открылся с неверным паролем")
+            return False
+        except ValueError:
+            pass
+        
+        print("✅ ТЕСТ ПРОЙДЕН: Архив создается, элементы читаются по отдельности")
+        return True
+        
+    except Exception as e:
+        print(f"❌ ОШИБКА ТЕСТА: {e}")
+        return False
+    
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def test_incremental_folder():
+    """Тест инкрементального шифрования папки по манифесту"""
+    print("\n🔍 Тестирование инкрементального шифрования папки...")
+    
+    import shutil
+    folder = tempfile.mkdtemp()
+    
+    def write(name, data):
+        with open(os.path.join(folder, name), 'wb') as f:
+            f.write(data)
+    
+    try:
+        password = "IncrementalPassword123!"
+        encryptor = SecureFileEncryptor()
+        for name in ('keep.txt', 'change.txt', 'delete.txt'):
+            write(name, name.encode('utf-8'))
+        if len(encryptor.encrypt_folder(folder, password, incremental_mode=True)) != 3:
+            print("❌ ТЕСТ ПРОВАЛЕН: Первый запуск должен зашифровать все файлы")
+            return False
+        
+        write('change.txt', b'changed content')
+        write('new.txt', b'new file')
+        os.remove(os.path.join(folder, 'delete.txt'))
+        outputs = encryptor.encrypt_folder(folder, password, incremental_mode=True)
+        if sorted(os.path.basename(path) for path in outputs) != ['change.txt.encrypted', 'new.txt.encrypted']:
+            print(f"❌ ТЕСТ ПРОВАЛЕН: Зашифрованы не те файлы: {outputs}")
+            return False
+        if os.path.exists(os.path.join(folder, 'delete.txt.encrypted')):
+            print("❌ ТЕСТ ПРОВАЛЕН: Не удален результат удаленного файла")
+            return False
+        if encryptor.encrypt_folder(folder, password, incremental_mode=True):
+            print("❌ ТЕСТ ПРОВАЛЕН: Без изменений ничего не должно шифроваться")
+            return False
+        
+        decrypted_file = SecureFileDecryptor().decrypt_file(os.path.join(folder, 'change.txt.encrypted'), password)
+        with open(decrypted_file, 'rb') as f:
+            if f.read() != b'changed content':
+                print("❌ ТЕСТ ПРОВАЛЕН: Измененный файл зашифрован неверно")
+                return False
+        
+        # С use_hash touch без изменения содержимого не шифрует файл заново,
+        # а манифест не раскрывает SHA-256 открытого текста
+        import incremental
+        import json
+        write('keep.txt', b'keep.txt')
+        encryptor.encrypt_folder(folder, password, incremental_mode=True, use_hash=True)
+        stat = os.stat(os.path.join(folder, 'keep.txt'))
+        os.utime(os.path.join(folder, 'keep.txt'), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        if encryptor.encrypt_folder(folder, password, incremental_mode=True, use_hash=True):
+            print("❌ ТЕСТ ПРОВАЛЕН: Файл с прежним содержимым зашифрован заново")
+            return False
+        with open(os.path.join(folder, incremental.MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            manifest_text = f.read()
+        entry = json.loads(manifest_text)['files']['keep.txt']
+        if not entry['digest'] or hashlib.sha256(b'keep.txt').hexdigest() in manifest_text:
+            print("❌ ТЕСТ ПРОВАЛЕН: В манифесте открытый SHA-256 содержимого")
+            return False
+        
+        # Подмененный манифест: по записям удаленных файлов не удаляются файлы
+        # вне папки и файлы без расширения .encrypted
+        fd, victim = tempfile.mkstemp(suffix='.encrypted')
+        os.close(fd)
+        manifest_path = os.path.join(folder, incremental.MANIFEST_NAME)
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest_data = json.load(f)
+        for name, output in (('gone1.txt', os.path.relpath(victim, folder)), ('gone2.txt', 'keep.txt')):
+            manifest_data['files'][name] = dict(entry, output=output)
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest_data, f)
+        try:
+            encryptor.encrypt_folder(folder, password, incremental_mode=True)
+            if not os.path.exists(victim) or not os.path.exists(os.path.join(folder, 'keep.txt')):
+                print("❌ ТЕСТ ПРОВАЛЕН: По подмененному манифесту удален чужой файл")
+                return False
+        finally:
+            if os.path.exists(victim):
+                os.remove(victim)
+        
+        print("✅ ТЕСТ ПРОЙДЕН: Шифруются только новые и измененные файлы")
+        return True
+        
+    except Exception as e:
+        print(f"❌ ОШИБКА ТЕСТА: {e}")
+        return False
+    
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+def test_chunk_store():
+    """Тест хранилища чанков: дедупликация похожих файлов и восстановление"""
+    print("\n🔍 Тестирование хранилища чанков...")
+    
+    import shutil
+    work_dir = tempfile.mkdtemp()
+    store_dir = os.path.join(work_dir, 'store')
+    
+    def count_chunks():
+        return sum(len(files) for _, _, files in os.walk(os.path.join(store_dir, 'chunks')))
+    
+    try:
+        password = "StorePassword123!"
+        encryptor = SecureFileEncryptor()
+        decryptor = SecureFileDecryptor()
+        data = os.urandom(2 * 1024 * 1024)
+        versions = [data, data[:1000000] + b'inserted bytes' + data[1000000:]]
+        recipes = []
+        for index, content in enumerate(versions):
+            path = os.path.join(work_dir, f'v{index}.bin')
+            with open(path, 'wb') as f:
+                f.write(content)
+            recipes.append(encryptor.store_file(path, password, store_dir))
+            if index == 0:
+                first_count = count_chunks()
+        
+        # Вставка в середину меняет лишь несколько чанков
+        if count_chunks() - first_count > 3:
+            print(f"❌ ТЕСТ ПРОВАЛЕН: Добавлено чанков: {count_chunks() - first_count} из {first_count}")
+            return False
+        
+        for recipe, content in zip(recipes, versions):
+            restored = decryptor.restore_file(recipe, password, store_dir)
+            with open(restored, 'rb') as f:
+                if f.read() != content:
+                    print("❌ ТЕСТ ПРОВАЛЕН: Восстановленный файл не совпадает")
+                    return False
+        
+        try:
+            decryptor.restore_file(recipes[0], "WrongPassword", store_dir)
+            print("❌ ТЕСТ ПРОВАЛЕН: Рецепт прочитан с неверным паролем")
+            return False
+        except ValueError:
+            pass
+        
+        # Прерванная перезапись рецепта не портит прежний рецепт
+        class FailingAead:
+            def encrypt(self, nonce, data, associated_data):
+                raise OSError("Сбой записи")
+        store = encryptor.get_store(store_dir, password)
+        store.recipe_aead = FailingAead()
+        try:
+            store.write_recipe(store.put_file(os.path.join(work_dir, 'v1.bin')), recipes[0])
+            print("❌ ТЕСТ ПРОВАЛЕН: Сбой записи рецепта не обнаружен")
+            return False
+        except OSError:
+            pass
+        with open(decryptor.restore_file(recipes[0], password, store_dir), 'rb') as f:
+            if f.read() != versions[0] or any(name.endswith('.sfptmp') for name in os.listdir(work_dir)):
+                print("❌ ТЕСТ ПРОВАЛЕН: Прерванная запись испортила рецепт")
+                return False
+        
+        print(f"✅ ТЕСТ ПРОЙДЕН: Похожие файлы хранятся без дублирования ({count_chunks()} чанков)")
+        return True
+        
+    except Exception as e:
+        print(f"❌ ОШИБКА ТЕСТА: {e}")
+        return False
+    
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def test_compression():
+    """Тест сжатия: текст сжимается и восстанавливается, случайные данные не сжимаются"""
+    print("\n🔍 Тестирование сжатия перед шифрованием...")
+    
+    import file_format
+    password = "CompressPassword123!"
+    text = "".join(f"Строка журнала {i}: состояние в норме\n" for i in range(50000)).encode('utf-8')
+    paths = []
+    try:
+        for format_version in (file_format.FORMAT_V2, file_format.FORMAT_SEGMENTED):
+            for algorithm in ('zlib', 'lzma'):
+                encryptor = SecureFileEncryptor(format_version=format_version, compress=algorithm)
+                for content, compressible in ((text, True), (os.urandom(300000), False)):
+                    fd, path = tempfile.mkstemp(suffix='.bin')
+                    with os.fdopen(fd, 'wb') as f:
+                        f.write(content)
+                    paths.append(path)
+                    encrypted = encryptor.encrypt_file(path, password)
+                    paths.append(encrypted)
+                    with open(encrypted, 'rb') as f:
+                        header = file_format.read_header(f)
+                    if bool(header.compression) != compressible:
+                        print(f"❌ ТЕСТ ПРОВАЛЕН: Неверный выбор сжатия ({algorithm}, v{format_version})")
+                        return False
+                    if compressible and os.path.getsize(encrypted) > len(content) // 5:
+                        print(f"❌ ТЕСТ ПРОВАЛЕН: Текст не сжат ({algorithm}, v{format_version})")
+                        return False
+                    decrypted = SecureFileDecryptor().decrypt_file(encrypted, password)
+                    paths.append(decrypted)
+                    with open(decrypted, 'rb') as f:
+                        if f.read() != content:
+                            print(f"❌ ТЕСТ ПРОВАЛЕН: Данные не совпадают ({algorithm}, v{format_version})")
+                            return False
+        
+        print("✅ ТЕСТ ПРОЙДЕН: Сжатые файлы восстанавливаются, несжимаемые пишутся как есть")
+        return True
+        
+    except Exception as e:
+        print(f"❌ ОШИБКА ТЕСТА: {e}")
+        return False
+    
+    finally:
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+def test_progress():
+    """Тест отчета о ходе обработки: байты, файлы, итоговое событие"""
+    print("\n🔍 Тестирование отчета о ходе обработки...")
+    
+    import shutil
+    import progress
+    work_dir = tempfile.mkdtemp()
+    try:
+        password = "ProgressPassword123!"
+        sizes = [3 * 1024 * 1024, 1000, 0]
+        for index, size in enumerate(sizes):
+            with open(os.path.join(work_dir, f'file{index}.bin'), 'wb') as f:
+                f.write(os.urandom(size))
+        
+        events = []
+        encrypted = SecureFileEncryptor().encrypt_file(
+            os.path.join(work_dir, 'file0.bin'), password, on_progress=events.append
+        )
+        os.remove(encrypted)
+        last = events[-1]
+        if not last.finished or last.bytes_done != sizes[0] or last.fraction != 1.0 or last.files_done != 1:
+            print(f"❌ ТЕСТ ПРОВАЛЕН: Неверное итоговое событие файла: {progress.format_event(last)}")
+            return False
+        
+        events = []
+        SecureFileEncryptor().encrypt_folder(work_dir, password, workers=2, on_progress=events.append)
+        done = [event.files_done for event in events]
+        if done != sorted(done) or events[-1].files_done != len(sizes) or events[-1].bytes_done != sum(sizes):
+            print(f"❌ ТЕСТ ПРОВАЛЕН: Неверные события папки: {done}")
+            return False
+        
+        events = []
+        SecureFileDecryptor().decrypt_folder(work_dir, password, workers=1, on_progress=events.append)
+        if not events[-1].finished or events[-1].files_done != len(sizes):
+            print("❌ ТЕСТ ПРОВАЛЕН: Неверные события дешифрования папки")
+            return False
+        
+        # Недоступный файл (битая ссылка) не прерывает папку до запуска пула:
+        # его ошибка попадает в FolderProcessingError, остальные файлы готовы
+        import folder_engine
+        broken_dir = os.path.join(work_dir, 'broken')
+        os.makedirs(broken_dir)
+        with open(os.path.join(broken_dir, 'ok.bin'), 'wb') as f:
+            f.write(os.urandom(1000))
+        os.symlink(os.path.join(work_dir, 'missing'), os.path.join(broken_dir, 'link.bin'))
+        events = []
+        try:
+            SecureFileEncryptor().encrypt_folder(broken_dir, password, workers=2, on_progress=events.append)
+            print("❌ ТЕСТ ПРОВАЛЕН: Ошибка битой ссылки не передана")
+            return False
+        except folder_engine.FolderProcessingError as e:
+            if [os.path.basename(result.path) for result in e.failed] != ['link.bin'] or \
+                    not os.path.exists(os.path.join(broken_dir, 'ok.bin.encrypted')) or not events[-1].finished:
+                print(f"❌ ТЕСТ ПРОВАЛЕН: Неверный результат папки с битой ссылкой: {e}")
+                return False
+        os.symlink(os.path.join(work_dir, 'missing'), os.path.join(broken_dir, 'gone.bin.encrypted'))
+        try:
+            SecureFileDecryptor().decrypt_folder(broken_dir, password, workers=2)
+            print("❌ ТЕСТ ПРОВАЛЕН: Ошибка битой ссылки при дешифровании не передана")
+            return False
+        except folder_engine.FolderProcessingError as e:
+            if [os.path.basename(result.path) for result in e.failed] != ['gone.bin.encrypted']:
+                print(f"❌ ТЕСТ ПРОВАЛЕН: Неверный результат дешифрования с битой ссылкой: {e}")
+                return False
+        shutil.rmtree(broken_dir)
+        
+        # Без прореживания события идут на каждый кусок, ETA оценивается
+        events = []
+        reporter = progress.ProgressReporter(events.append, total_bytes=4096, interval=0)
+        for _ in range(4):
+            reporter.add_bytes(1024)
+        if len(events) != 4 or events[1].eta is None or events[-1].fraction != 1.0:
+            print("❌ ТЕСТ ПРОВАЛЕН: Неверный расчет прогресса")
+            return False
+        
+        print(f"✅ ТЕСТ ПРОЙДЕН: Прогресс передается ({progress.format_event(events[-1])})")
+        return True
+        
+    except Exception as e:
+        print(f"❌ ОШИБКА ТЕСТА: {e}")
+        return False
+    
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def test_resumable_folder():
+    """Тест журнала задания: отмена, недописанные результаты и продолжение"""
+    print("\n🔍 Тестирование продолжения прерванного шифрования папки...")
+    
+    import shutil
+    import job_journal
+    
+    class CancelAfter(job_journal.CancelToken):
+        """Отмена после заданного числа готовых файлов"""
+        def __init__(self, files):
+            super().__init__()
+            self.files = files
+        def raise_if_cancelled(self):
+            self.files -= 1
+            if self.files <= 0:
+                self.cancel()
+            super().raise_if_cancelled()
+    
+    work_dir = tempfile.mkdtemp()
+    try:
+        password = "ResumePassword123!"
+        contents = {f'file{i}.txt': os.urandom(1000 + i) for i in range(6)}
+        for name, content in contents.items():
+            with open(os.path.join(work_dir, name), 'wb') as f:
+                f.write(content)
+        encryptor = SecureFileEncryptor()
+        
+        try:
+            encryptor.encrypt_folder(work_dir, password, workers=1, cancel_token=CancelAfter(3))
+            print("❌ ТЕСТ ПРОВАЛЕН: Отмена не сработала")
+            return False
+        except job_journal.JobCancelled:
+            pass
+        journal_path = os.path.join(work_dir, job_journal.JOURNAL_NAME)
+        done = sorted(name for name in contents if os.path.exists(os.path.join(work_dir, name + '.encrypted')))
+        if not os.path.exists(journal_path) or len(done) != 3:
+            print(f"❌ ТЕСТ ПРОВАЛЕН: После отмены готово {done}")
+            return False
+        
+        # Обрезанный результат готового файла и недописанный результат следующего
+        truncated = os.path.join(work_dir, done[0] + '.encrypted')
+        with open(truncated, 'r+b') as f:
+            f.truncate(100)
+        with open(os.path.join(work_dir, 'file5.txt.encrypted'), 'wb') as f:
+            f.write(b'partial')
+        kept = os.path.join(work_dir, done[1] + '.encrypted')
+        kept_stat = os.stat(kept)
+        
+        outputs = encryptor.encrypt_folder(work_dir, password, workers=1)
+        if len(outputs) != len(contents) or os.path.exists(journal_path):
+            print("❌ ТЕСТ ПРОВАЛЕН: Продолжение обработало не все файлы")
+            return False
+        if os.stat(kept).st_mtime_ns != kept_stat.st_mtime_ns:
+            print("❌ ТЕСТ ПРОВАЛЕН: Готовый файл зашифрован повторно")
+            return False
+        
+        for name in contents:
+            os.remove(os.path.join(work_dir, name))
+        SecureFileDecryptor().decrypt_folder(work_dir, password, workers=1)
+        for name, content in contents.items():
+            with open(os.path.join(work_dir, name + '.decrypted'), 'rb') as f:
+                if f.read() != content:
+                    print(f"❌ ТЕСТ ПРОВАЛЕН: Файл {name} не совпадает после продолжения")
+                    return False
+        
+        print("✅ ТЕСТ ПРОЙДЕН: Отмененное задание продолжено, недописанные результаты пересозданы")
+        return True
+        
+    except Exception as e:
+        print(f"❌ ОШИБКА ТЕСТА: {e}")
+        return False
+    
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def test_async_api():
+    """Тест асинхронного API: файлы параллельно, потоки байтов, отмена"""
+    print("\n🔍 Тестирование асинхронного API...")
+    
+    import asyncio
+    import shutil
+    from async_api import AsyncFileCrypto
+    
+    work_dir = tempfile.mkdtemp()
+    password = "AsyncPassword123!"
+    
+    async def scenario():
+        async with AsyncFileCrypto(max_workers=2, max_jobs=3) as api:
+            contents = [os.urandom(100000 + i) for i in range(5)]
+            paths = []
+            for index, content in enumerate(contents):
+                paths.append(os.path.join(work_dir, f'file{index}.bin'))
+                with open(paths[-1], 'wb') as f:
+                    f.write(content)
+            encrypted = await asyncio.gather(*(api.encrypt_file(path, password) for path in paths))
+            decrypted = await asyncio.gather(*(api.decrypt_file(path, password) for path in encrypted))
+            for path, content in zip(decrypted, contents):
+                with open(path, 'rb') as f:
+                    if f.read() != content:
+                        return "Файл не совпадает после асинхронной обработки"
+            
+            # Поток режется на куски, не совпадающие с сегментами
+            data = os.urandom(300000)
+            stream = b''.join([chunk async for chunk in api.encrypt_stream(
+                (data[i:i + 7000] for i in range(0, len(data), 7000)), password
+            )])
+            pieces = (stream[i:i + 1000] for i in range(0, len(stream), 1000))
+            if b''.join([chunk async for chunk in api.decrypt_stream(pieces, password)]) != data:
+                return "Поток не совпадает после дешифрования"
+            
+            # Поток совместим с файловым форматом v3
+            stream_path = os.path.join(work_dir, 'stream.encrypted')
+            with open(stream_path, 'wb') as f:
+                f.write(stream)
+            with open(SecureFileDecryptor().decrypt_file(stream_path, password), 'rb') as f:
+                if f.read() != data:
+                    return "Поток не дешифруется как файл"
+            
+            try:
+                async for _ in api.decrypt_stream([stream[:-1]], password):
+                    pass
+                return "Обрезанный поток не обнаружен"
+            except ValueError:
+                pass
+            
+            # Отмена потока между сегментами
+            async def slow_source():
+                while True:
+                    await asyncio.sleep(0.01)
+                    yield os.urandom(65536)
+            async def consume():
+                async for _ in api.encrypt_stream(slow_source(), password):
+                    pass
+            task = asyncio.create_task(consume())
+            await asyncio.sleep(0.2)
+            task.cancel()
+            try:
+                await task
+                return "Отмена не сработала"
+            except asyncio.CancelledError:
+                pass
+        
+        # Потребитель прервал итерацию: брошенные генераторы не держат место
+        # в max_jobs, и следующие операции не ждут вечно
+        async with AsyncFileCrypto(max_workers=1, max_jobs=1) as api:
+            streams = [api.encrypt_stream([os.urandom(200000)], password, segment_size=65536),
+                       api.decrypt_stream([stream], password)]
+            async def abandon_streams():
+                for generator in streams:
+                    async for _ in generator:
+                        break
+                await api.encrypt_file(paths[0], password)
+            try:
+                await asyncio.wait_for(abandon_streams(), 60)
+            except asyncio.TimeoutError:
+                return "Прерванный генератор потока занял место в max_jobs"
+            finally:
+                for generator in streams:
+                    await generator.aclose()
+        return None
+    
+    try:
+        error = asyncio.run(scenario())
+        if error:
+            print(f"❌ ТЕСТ ПРОВАЛЕН: {error}")
+            return False
+        print("✅ ТЕСТ ПРОЙДЕН: Асинхронные файлы и потоки обрабатываются, отмена работает")
+        return True
+        
+    except Exception as e:
+        print(f"❌ ОШИБКА ТЕСТА: {e}")
+        return False
+    
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def test_pipe_mode():
+    """Тест режима конвейера терминальных скриптов (stdin -> stdout)"""
+    print("\n🔍 Тестирование режима конвейера...")
+    
+    import shutil
+    import subprocess
+    import sys
+    
+    work_dir = tempfile.mkdtemp()
+    scripts_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'terminal_version')
+    password = "PipePassword123!"
+    
+    def run(script, data, *args):
+        return subprocess.run(
+            [sys.executable, os.path.join(scripts_dir, script), '-', password, *args],
+            input=data, capture_output=True, cwd=work_dir
+        )
+    
+    try:
+        # Размер не кратен сегменту; сжимаемые данные сжимаются и в конвейере
+        data = b"pipe mode line\n" * 20000 + os.urandom(70000)
+        encrypted = run('encrypt_file.py', data, '--compress', 'zlib')
+        if encrypted.returncode != 0 or not encrypted.stdout.startswith(b'SFPFILE'):
+            print(f"❌ ТЕСТ ПРОВАЛЕН: Шифрование в конвейере: {encrypted.stderr.decode(errors='replace')}")
+            return False
+        
+        decrypted = run('decrypt_file.py', encrypted.stdout)
+        if decrypted.returncode != 0 or decrypted.stdout != data:
+            print("❌ ТЕСТ ПРОВАЛЕН: Данные не совпадают после конвейера")
+            return False
+        
+        # Поток совместим с файловым форматом v3 основного дешифровальщика
+        stream_path = os.path.join(work_dir, 'stream.encrypted')
+        with open(stream_path, 'wb') as f:
+            f.write(encrypted.stdout)
+        with open(SecureFileDecryptor().decrypt_file(stream_path, password), 'rb') as f:
+            if f.read() != data:
+                print("❌ ТЕСТ ПРОВАЛЕН: Поток не дешифруется как файл")
+                return False
+        
+        for broken in (encrypted.stdout[:-1], encrypted.stdout[:len(encrypted.stdout) // 2], b'not encrypted'):
+            if run('decrypt_file.py', broken).returncode == 0:
+                print("❌ ТЕСТ ПРОВАЛЕН: Поврежденный поток не обнаружен")
+                return False
+        
+        if run('decrypt_file.py', encrypted.stdout[:0]).returncode == 0:
+            print("❌ ТЕСТ ПРОВАЛЕН: Пустой поток принят")
+            return False
+        
+        print("✅ ТЕСТ ПРОЙДЕН: Конвейер шифрует и дешифрует потоково, повреждения обнаруживаются")
+        return True
+        
+    except Exception as e:
+        print(f"❌ ОШИБКА ТЕСТА: {e}")
+        return False
+    
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def test_key_check():
+    """Тест быстрого отказа при неверном пароле по проверочному значению ключа"""
+    print("\n🔍 Тестирование проверочного значения ключа...")
+    
+    import shutil
+    import subprocess
+    import sys
+    import file_format
+    
+    work_dir = tempfile.mkdtemp()
+    password = "KeyCheckPassword123!"
+    wrong_password = "WrongPassword456!"
+    
+    def corrupt_tail(path):
+        # Шифртекст поврежден: отказ по паролю должен случиться раньше, чем его проверка
+        with open(path, 'r+b') as f:
+            f.seek(-100, os.SEEK_END)
+            f.write(bytes(100))
+    
+    try:
+        for format_version in (file_format.FORMAT_V2, file_format.FORMAT_SEGMENTED):
+            path = os.path.join(work_dir, f'file{format_version}.bin')
+            with open(path, 'wb') as f:
+                f.write(os.urandom(1024 * 1024))
+            encrypted = SecureFileEncryptor(format_version=format_version).encrypt_file(path, password)
+            with open(encrypted, 'rb') as f:
+                header = file_format.read_header(f)
+            if not header.flags & file_format.FLAG_KEY_CHECK:
+                print("❌ ТЕСТ ПРОВАЛЕН: В заголовке нет проверочного значения")
+                return False
+            SecureFileDecryptor().decrypt_file(encrypted, password)
+            corrupt_tail(encrypted)
+            try:
+                SecureFileDecryptor().decrypt_file(encrypted, wrong_password)
+                print("❌ ТЕСТ ПРОВАЛЕН: Неверный пароль принят")
+                return False
+            except file_format.WrongPasswordError:
+                pass
+        
+        # Папка: неверный пароль отвергается до запуска пула, а в папку
+        # с другим паролем новые файлы не шифруются
+        folder = os.path.join(work_dir, 'folder')
+        os.makedirs(folder)
+        for index in range(4):
+            with open(os.path.join(folder, f'file{index}.txt'), 'w', encoding='utf-8') as f:
+                f.write(f"Файл {index}\n" * 100)
+        SecureFileEncryptor().encrypt_folder(folder, password)
+        _, folder_key_check = file_format.read_folder_header(os.path.join(folder, file_format.FOLDER_HEADER_NAME))
+        if folder_key_check is None:
+            print("❌ ТЕСТ ПРОВАЛЕН: В заголовке папки нет проверочного значения")
+            return False
+        for action in (lambda: SecureFileDecryptor().decrypt_folder(folder, wrong_password),
+                       lambda: SecureFileEncryptor().encrypt_folder(folder, wrong_password)):
+            try:
+                action()
+                print("❌ ТЕСТ ПРОВАЛЕН: Неверный пароль папки принят")
+                return False
+            except file_format.WrongPasswordError:
+                pass
+        if any(name.endswith('.decrypted') for name in os.listdir(folder)):
+            print("❌ ТЕСТ ПРОВАЛЕН: Файлы дешифровались с неверным паролем")
+            return False
+        
+        # Хранилище чанков
+        store_dir = os.path.join(work_dir, 'store')
+        SecureFileEncryptor().get_store_key(store_dir, password)
+        try:
+            SecureFileEncryptor().get_store_key(store_dir, wrong_password)
+            print("❌ ТЕСТ ПРОВАЛЕН: Неверный пароль хранилища принят")
+            return False
+        except file_format.WrongPasswordError:
+            pass
+        
+        # Терминальные скрипты: файл v3 и формат v1, который они пишут по умолчанию
+        scripts_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'terminal_version')
+        v1_path = os.path.join(work_dir, 'terminal.bin')
+        with open(v1_path, 'wb') as f:
+            f.write(os.urandom(1024 * 1024))
+        subprocess.run([sys.executable, os.path.join(scripts_dir, 'encrypt_file.py'), v1_path, password],
+                       capture_output=True, cwd=work_dir, check=True)
+        v1_encrypted = v1_path + '.encrypted'
+        with open(v1_encrypted, 'rb') as f:
+            if not f.read().startswith(b'SFA_ENCRYPTED_FILE_V1K\n'):
+                print("❌ ТЕСТ ПРОВАЛЕН: В заголовке v1 нет проверочного значения")
+                return False
+        os.remove(v1_path)
+        subprocess.run([sys.executable, os.path.join(scripts_dir, 'decrypt_file.py'), v1_encrypted, password],
+                       capture_output=True, cwd=work_dir, check=True)
+        corrupt_tail(v1_encrypted)
+        for path in (encrypted, v1_encrypted):
+            result = subprocess.run([sys.executable, os.path.join(scripts_dir, 'decrypt_file.py'), path, wrong_password],
+                                    capture_output=True, cwd=work_dir, text=True)
+            if result.returncode == 0 or "Неверный пароль" not in result.stdout:
+                print("❌ ТЕСТ ПРОВАЛЕН: Терминальный скрипт не отверг неверный пароль по заголовку")
+                return False
+        
+        print("✅ ТЕСТ ПРОЙДЕН: Неверный пароль отвергается по заголовку до чтения данных")
+        return True
+        
+    except Exception as e:
+        print(f"❌ ОШИБКА ТЕСТА: {e}")
+        return False
+    
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def test_verify():
+    """Тест проверки подлинности файлов и папок без записи открытого текста"""
+    print("\n🔍 Тестирование проверки без дешифрования...")
+    
+    import json
+    import shutil
+    import subprocess
+    import sys
+    import file_format
+    
+    work_dir = tempfile.mkdtemp()
+    scripts_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'terminal_version')
+    password = "VerifyPassword123!"
+    
+    def corrupt(path):
+        with open(path, 'r+b') as f:
+            f.seek(-40, os.SEEK_END)
+            byte = f.read(1)
+            f.seek(-40, os.SEEK_END)
+            f.write(bytes([byte[0] ^ 1]))
+    
+    try:
+        folder = os.path.join(work_dir, 'backup')
+        os.makedirs(os.path.join(folder, 'sub'))
+        for index in range(6):
+            with open(os.path.join(folder, 'sub' if index % 2 else '', f'file{index}.bin'), 'wb') as f:
+                f.write(os.urandom(50000 + index))
+        encrypted = SecureFileEncryptor().encrypt_folder(folder, password)
+        segmented_path = os.path.join(work_dir, 'single.bin')
+        with open(segmented_path, 'wb') as f:
+            f.write(os.urandom(300000))
+        segmented = SecureFileEncryptor(format_version=file_format.FORMAT_SEGMENTED).encrypt_file(
+            segmented_path, password
+        )
+        
+        decryptor = SecureFileDecryptor()
+        if not all(decryptor.verify_file(path, password) for path in encrypted + [segmented]):
+            return False
+        
+        corrupt(encrypted[2])
+        corrupt(segmented)
+        for path in (encrypted[2], segmented):
+            try:
+                decryptor.verify_file(path, password)
+                print("❌ ТЕСТ ПРОВАЛЕН: Поврежденный файл прошел проверку")
+                return False
+            except ValueError:
+                pass
+        
+        results = decryptor.verify_folder(folder, password, workers=2)
+        failed = [result.path for result in results if not result.ok]
+        if len(results) != 6 or failed != [encrypted[2]]:
+            print(f"❌ ТЕСТ ПРОВАЛЕН: Неверный отчет о папке: {failed}")
+            return False
+        
+        # Терминальные скрипты: отчет JSON и код возврата
+        terminal_folder = os.path.join(work_dir, 'terminal')
+        os.makedirs(terminal_folder)
+        for index in range(3):
+            with open(os.path.join(terminal_folder, f'file{index}.txt'), 'wb') as f:
+                f.write(os.urandom(20000))
+        subprocess.run([sys.executable, os.path.join(scripts_dir, 'encrypt_folder.py'), terminal_folder, password,
+                        '--segmented'], capture_output=True, cwd=work_dir, check=True)
+        report_path = os.path.join(work_dir, 'report.json')
+        verify = [sys.executable, os.path.join(scripts_dir, 'verify_folder.py'), terminal_folder, password,
+                  '--report', report_path]
+        if subprocess.run(verify, capture_output=True, cwd=work_dir).returncode != 0:
+            print("❌ ТЕСТ ПРОВАЛЕН: Целая папка не прошла проверку скриптом")
+            return False
+        broken = os.path.join(terminal_folder, 'file1.txt.encrypted')
+        corrupt(broken)
+        if subprocess.run(verify, capture_output=True, cwd=work_dir).returncode == 0:
+            print("❌ ТЕСТ ПРОВАЛЕН: Скрипт не обнаружил поврежденный файл")
+            return False
+        with open(report_path, 'r', encoding='utf-8') as f:
+            report = json.load(f)
+        if report['passed'] != 2 or [item['path'] for item in report['files'] if not item['ok']] != [broken]:
+            print("❌ ТЕСТ ПРОВАЛЕН: Неверный отчет скрипта")
+            return False
+        
+        if any(name.endswith('.decrypted') for _, _, names in os.walk(work_dir) for name in names):
+            print("❌ ТЕСТ ПРОВАЛЕН: Проверка записала открытый текст")
+            return False
+        
+        print("✅ ТЕСТ ПРОЙДЕН: Файлы и папки проверяются без записи открытого текста")
+        return True
+        
+    except Exception as e:
+        print(f"❌ ОШИБКА ТЕСТА: {e}")
+        return False
+    
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def test_atomic_output():
+    """Тест атомарной записи результатов и уровней надежности"""
+    print("\n🔍 Тестирование атомарной записи...")
+    
+    import shutil
+    import subprocess
+    import sys
+    import atomic_io
+    
+    work_dir = tempfile.mkdtemp()
+    password = "AtomicPassword123!"
+    
+    def temp_files(folder):
+        return [name for _, _, names in os.walk(folder) for name in names if atomic_io.is_temp(name)]
+    
+    try:
+        # Ошибка при записи: прежний результат не тронут, временного файла нет
+        target = os.path.join(work_dir, 'result.bin')
+        with open(target, 'wb') as f:
+            f.write(b'old')
+        try:
+            with atomic_io.AtomicOutput(target, atomic_io.DURABILITY_FILE) as f:
+                f.write(b'partial')
+                raise RuntimeError("сбой")
+        except RuntimeError:
+            pass
+        with open(target, 'rb') as f:
+            if f.read() != b'old' or temp_files(work_dir):
+                print("❌ ТЕСТ ПРОВАЛЕН: Недописанный результат заменил прежний")
+                return False
+        
+        # Пакетная фиксация: файлы появляются под итоговыми именами только после commit
+        committed = []
+        with atomic_io.GroupCommit(committed.append, files=2) as group:
+            for index in range(3):
+                path = os.path.join(work_dir, f'group{index}.bin')
+                with atomic_io.AtomicOutput(path, atomic_io.DURABILITY_GROUP, defer=True) as f:
+                    f.write(b'data')
+                group.add(path, index)
+            if committed != [0, 1] or os.path.exists(os.path.join(work_dir, 'group2.bin')):
+                print("❌ ТЕСТ ПРОВАЛЕН: Пакет зафиксирован не вовремя")
+                return False
+        if committed != [0, 1, 2] or temp_files(work_dir):
+            print("❌ ТЕСТ ПРОВАЛЕН: Последний пакет не зафиксирован")
+            return False
+        
+        for durability in atomic_io.DURABILITY_LEVELS:
+            folder = os.path.join(work_dir, durability)
+            os.makedirs(os.path.join(folder, 'sub'))
+            contents = {}
+            for index in range(8):
+                path = os.path.join(folder, 'sub' if index % 2 else '', f'file{index}.txt')
+                contents[path] = os.urandom(1000 + index)
+                with open(path, 'wb') as f:
+                    f.write(contents[path])
+            # Незавершенный результат прошлого сбоя не шифруется как обычный файл
+            with open(os.path.join(folder, 'stale.txt.encrypted' + atomic_io.TEMP_SUFFIX), 'wb') as f:
+                f.write(b'garbage')
+            encrypted = SecureFileEncryptor(durability=durability).encrypt_folder(folder, password, workers=2)
+            if len(encrypted) != 8 or not all(os.path.exists(path) for path in encrypted):
+                print(f"❌ ТЕСТ ПРОВАЛЕН: Не все результаты зафиксированы ({durability})")
+                return False
+            os.remove(os.path.join(folder, 'stale.txt.encrypted' + atomic_io.TEMP_SUFFIX))
+            for path in contents:
+                os.remove(path)
+            SecureFileDecryptor(durability=durability).decrypt_folder(folder, password, workers=2)
+            for path, content in contents.items():
+                with open(path + '.decrypted', 'rb') as f:
+                    if f.read() != content:
+                        print(f"❌ ТЕСТ ПРОВАЛЕН: Данные не совпадают ({durability})")
+                        return False
+            if temp_files(folder):
+                print(f"❌ ТЕСТ ПРОВАЛЕН: Остались временные файлы ({durability})")
+                return False
+        
+        # Терминальный скрипт с пакетной фиксацией
+        folder = os.path.join(work_dir, 'terminal')
+        os.makedirs(folder)
+        for index in range(5):
+            with open(os.path.join(folder, f'file{index}.txt'), 'wb') as f:
+                f.write(os.urandom(500))
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'terminal_version', 'encrypt_folder.py')
+        subprocess.run([sys.executable, script, folder, password, '--segmented', '--durability', 'group'],
+                       capture_output=True, cwd=work_dir, check=True)
+        if len([name for name in os.listdir(folder) if name.endswith('.encrypted')]) != 5 or temp_files(folder):
+            print("❌ ТЕСТ ПРОВАЛЕН: Скрипт не зафиксировал результаты")
+            return False
+        
+        print("✅ ТЕСТ ПРОЙДЕН: Результаты пишутся атомарно, пакетная фиксация работает")
+        return True
+        
+    except Exception as e:
+        print(f"❌ ОШИБКА ТЕСТА: {e}")
+        return False
+    
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def test_job_metrics():
+    """Тест метрик задания: фазы, JSON и формат Prometheus"""
+    print("\n🔍 Тестирование метрик задания...")
+    
+    import json
+    import shutil
+    import subprocess
+    import sys
+    import job_metrics
+    
+    work_dir = tempfile.mkdtemp()
+    password = "MetricsPassword123!"
+    
+    try:
+        folder = os.path.join(work_dir, 'data')
+        os.makedirs(os.path.join(folder, 'sub'))
+        total = 0
+        for index in range(6):
+            data = os.urandom(50000) if index % 2 else b'compressible ' * 5000
+            total += len(data)
+            with open(os.path.join(folder, 'sub' if index % 3 else '', f'file{index}.txt'), 'wb') as f:
+                f.write(data)
+        
+        # Без metrics учет выключен и объекты не оборачиваются
+        marker = object()
+        if job_metrics.DISABLED.wrap(job_metrics.PHASE_READ, marker) is not marker:
+            print("❌ ТЕСТ ПРОВАЛЕН: Выключенные метрики оборачивают объекты")
+            return False
+        
+        for format_version, auth_phase in ((2, job_metrics.PHASE_HMAC), (3, job_metrics.PHASE_CIPHER)):
+            metrics = job_metrics.JobMetrics('encrypt_folder')
+            encryptor = SecureFileEncryptor(format_version=format_version, compress='zlib')
+            encrypted = encryptor.encrypt_folder(folder, password, workers=2, metrics=metrics)
+            metrics.finish()
+            report = metrics.report()
+            expected = {job_metrics.PHASE_KDF, job_metrics.PHASE_COMPRESS, job_metrics.PHASE_CIPHER,
+                        auth_phase, job_metrics.PHASE_WRITE}
+            if report['files'] != 6 or report['bytes_in'] != total or not expected <= set(report['phases']):
+                print(f"❌ ТЕСТ ПРОВАЛЕН: Неполные метрики шифрования (v{format_version}): {report}")
+                return False
+            if report['phases'][job_metrics.PHASE_CIPHER]['bytes'] == 0 or report['peak_memory_bytes'] < 0:
+                print(f"❌ ТЕСТ ПРОВАЛЕН: Нет объема данных фазы шифра (v{format_version})")
+                return False
+            
+            metrics = job_metrics.JobMetrics('decrypt_folder')
+            SecureFileDecryptor(use_mmap=False).decrypt_folder(folder, password, workers=1, metrics=metrics)
+            metrics.finish()
+            report = metrics.report()
+            if report['files'] != 6 or report['bytes_out'] != total or \
+                    job_metrics.PHASE_READ not in report['phases']:
+                print(f"❌ ТЕСТ ПРОВАЛЕН: Неполные метрики дешифрования (v{format_version}): {report}")
+                return False
+            for path in encrypted:
+                os.remove(path)
+                os.remove(path.replace('.encrypted', '.decrypted'))
+            os.remove(os.path.join(folder, '.sfp_folder'))
+        
+        # Отчет Prometheus: у каждой метрики HELP и TYPE, метки экранированы
+        prom_path = os.path.join(work_dir, 'sfp.prom')
+        metrics.write_prometheus(prom_path, {'job': 'night"ly'})
+        with open(prom_path, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        samples = [line for line in lines if not line.startswith('#')]
+        if not any(line.startswith('sfp_job_phase_seconds{') and 'phase="kdf"' in line for line in samples) or \
+                not all('job="night\\"ly"' in line for line in samples) or \
+                sum(line.startswith('# TYPE') for line in lines) != sum(line.startswith('# HELP') for line in lines):
+            print("❌ ТЕСТ ПРОВАЛЕН: Неверный формат Prometheus")
+            return False
+        
+        # Терминальные скрипты сохраняют JSON по --metrics-json
+        scripts = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'terminal_version')
+        json_path = os.path.join(work_dir, 'metrics.json')
+        subprocess.run([sys.executable, os.path.join(scripts, 'encrypt_folder.py'), folder, password,
+                        '--segmented', '--metrics-json', json_path, '--metrics-prom', prom_path],
+                       capture_output=True, cwd=work_dir, check=True)
+        with open(json_path, 'r', encoding='utf-8') as f:
+            report = json.load(f)
+        if report['operation'] != 'encrypt_folder' or report['files'] != 6 or \
+                job_metrics.PHASE_KDF not in report['phases'] or report['files_per_second'] <= 0:
+            print(f"❌ ТЕСТ ПРОВАЛЕН: Неверный отчет скрипта: {report}")
+            return False
+        
+        print("✅ ТЕСТ ПРОЙДЕН: Метрики по фазам собираются и сохраняются")
+        return True
+        
+    except Exception as e:
+        print(f"❌ ОШИБКА ТЕСТА: {e}")
+        return False
+    
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def test_queued_logging():
+    """Тест логирования через очередь, прореживания и каталога логов"""
+    print("\n🔍 Тестирование логирования...")
+    
+    import logging
+    import shutil
+    import subprocess
+    import sys
+    import log_setup
+    
+    work_dir = tempfile.mkdtemp()
+    password = "LoggingPassword123!"
+    
+    try:
+        # Фильтр: каждое N-е информационное сообщение о файле, ошибки всегда
+        log_filter = log_setup.FileEventFilter(log_setup.parse_file_events('3'))
+        records = [logging.LogRecord(log_setup.FILE_EVENTS, level, '', 0, 'msg', None, None)
+                   for level in [logging.INFO] * 7 + [logging.ERROR]]
+        passed = [log_filter.filter(record) for record in records]
+        if passed != [True, False, False, True, False, False, True, True] or log_filter.suppressed != 4:
+            print("❌ ТЕСТ ПРОВАЛЕН: Неверное прореживание сообщений о файлах")
+            return False
+        other = logging.LogRecord('encryptor', logging.INFO, '', 0, 'msg', None, None)
+        if not log_setup.FileEventFilter(log_setup.parse_file_events('summary')).filter(other):
+            print("❌ ТЕСТ ПРОВАЛЕН: Отфильтровано сообщение не о файле")
+            return False
+        try:
+            log_setup.check_file_events('sometimes')
+            print("❌ ТЕСТ ПРОВАЛЕН: Принят неизвестный режим")
+            return False
+        except ValueError:
+            pass
+        
+        folder = os.path.join(work_dir, 'data')
+        os.makedirs(folder)
+        for index in range(6):
+            with open(os.path.join(folder, f'file{index}.txt'), 'wb') as f:
+                f.write(os.urandom(1000))
+        scripts = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'terminal_version')
+        log_dir = os.path.join(work_dir, 'logs')
+        env = {key: value for key, value in os.environ.items()
+               if key not in (log_setup.LOG_DIR_ENV, log_setup.FILE_EVENTS_ENV)}
+        
+        def run(mode: str) -> str:
+            shutil.rmtree(log_dir, ignore_errors=True)
+            for name in os.listdir(folder):
+                if name.endswith('.encrypted') or name == '.sfp_folder':
+                    os.remove(os.path.join(folder, name))
+            result = subprocess.run([sys.executable, os.path.join(scripts, 'encrypt_folder.py'), folder, password,
+                                     '--segmented', '--log-dir', log_dir, '--log-files', mode],
+                                    capture_output=True, cwd=work_dir, env=env, text=True, check=True)
+            if os.path.exists(os.path.join(work_dir, 'folder_encryption.log')):
+                raise AssertionError("лог записан в текущий каталог вместо --log-dir")
+            with open(os.path.join(log_dir, 'folder_encryption.log'), 'r', encoding='utf-8') as f:
+                log_text = f.read()
+            if log_text.count('\n') != result.stdout.count(' - INFO - ') + result.stdout.count(' - ERROR - '):
+                raise AssertionError("файл лога и консоль расходятся")
+            return log_text
+        
+        full = run('all')
+        summary = run('summary')
+        if full.count('Файл успешно зашифрован') != 6 or 'Файл успешно зашифрован' in summary or \
+                'Успешно зашифровано 6 из 6 файлов' not in summary:
+            print("❌ ТЕСТ ПРОВАЛЕН: Режим сообщений о файлах не применился в рабочих процессах")
+            return False
+        
+        print("✅ ТЕСТ ПРОЙДЕН: Лог пишется через очередь в выбранный каталог, сообщения о файлах прореживаются")
+        return True
+        
+    except Exception as e:
+        print(f"❌ ОШИБКА ТЕСТА: {e}")
+        return False
+    
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def test_headless_cli():
+    """Тест единой командной строки: файлы и папки, без tkinter"""
+    print("\n🔍 Тестирование командной строки...")
+    
+    import shutil
+    import subprocess
+    import sys
+    import crypto_backends
+    
+    work_dir = tempfile.mkdtemp()
+    password = "CliPassword123!"
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    
+    try:
+        # Импорты headless-режима: без tkinter и без второй библиотеки шифрования
+        code = ("import sys, cli, encryptor, decryptor, crypto_backends\n"
+                "crypto_backends.get_backend()\n"
+                "print(sorted(name for name in ('tkinter', 'Crypto.Cipher', 'cryptography.hazmat') "
+                "if name in sys.modules))")
+        env = dict(os.environ, **{crypto_backends.BACKEND_ENV: 'pycryptodome'})
+        loaded = subprocess.run([sys.executable, '-c', code], capture_output=True, cwd=repo_dir, env=env,
+                                text=True, check=True).stdout.strip()
+        if loaded != "['Crypto.Cipher']":
+            print(f"❌ ТЕСТ ПРОВАЛЕН: Лишние модули при запуске без GUI: {loaded}")
+            return False
+        
+        def sfp(*args) -> int:
+            return subprocess.run([sys.executable, repo_dir, *args, '-p', password], capture_output=True,
+                                  cwd=work_dir).returncode
+        
+        test_file = os.path.join(work_dir, 'data.bin')
+        test_data = os.urandom(200000)
+        with open(test_file, 'wb') as f:
+            f.write(test_data)
+        folder = os.path.join(work_dir, 'folder')
+        os.makedirs(os.path.join(folder, 'sub'))
+        for name in ('a.txt', os.path.join('sub', 'b.txt')):
+            with open(os.path.join(folder, name), 'wb') as f:
+                f.write(os.path.basename(name).encode() * 100)
+        
+        codes = [
+            sfp('encrypt', test_file, '--segmented', '--compress', 'zlib'),
+            sfp('verify', test_file + '.encrypted'),
+            sfp('decrypt', test_file + '.encrypted'),
+            sfp('encrypt', folder, '-w', '2'),
+            sfp('verify', folder),
+            sfp('decrypt', folder),
+        ]
+        if codes != [0] * 6:
+            print(f"❌ ТЕСТ ПРОВАЛЕН: Коды возврата команд: {codes}")
+            return False
+        with open(test_file + '.decrypted', 'rb') as f:
+            if f.read() != test_data:
+                print("❌ ТЕСТ ПРОВАЛЕН: Данные файла не совпадают")
+                return False
+        with open(os.path.join(folder, 'sub', 'b.txt.decrypted'), 'rb') as f:
+            if f.read() != b'b.txt' * 100:
+                print("❌ ТЕСТ ПРОВАЛЕН: Данные папки не совпадают")
+                return False
+        
+        wrong = subprocess.run([sys.executable, repo_dir, 'verify', folder, '-p', 'WrongPassword'],
+                               capture_output=True, cwd=work_dir).returncode
+        usage = [subprocess.run([sys.executable, repo_dir, *args], capture_output=True, cwd=work_dir).returncode
+                 for args in (['unknown'], ['encrypt', os.path.join(work_dir, 'missing'), '-p', password],
+                              ['encrypt', test_file, '--compress', 'zlib', '-p', password])]
+        if wrong != 1 or usage != [2, 2, 2]:
+            print(f"❌ ТЕСТ ПРОВАЛЕН: Коды возврата ошибок: {wrong}, {usage}")
+            return False
+        
+        print("✅ ТЕСТ ПРОЙДЕН: Командная строка шифрует, проверяет и дешифрует файлы и папки без tkinter")
+        return True
+        
+    except Exception as e:
+        print(f"❌ ОШИБКА ТЕСТА: {e}")
+        return False
+    
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
 def main():
     """Главная функция тестирования"""
     print("🚀 Запуск тестов совместимости SFA Secure File Program v3.0")
     print("=" * 60)
     
-    # Тест 1: Правильное шифрование и дешифрование
-    test1_passed = test_encryption_decryption()
-    
-    # Тест 2: Неправильный пароль
-    test2_passed = test_wrong_password()
+    tests = [
+        ("Тест шифрования/дешифрования", test_encryption_decryption),
+        ("Тест неправильного пароля", test_wrong_password),
+        ("Тест потокового шифрования", test_streaming_large_file),
+        ("Тест старого формата", test_legacy_format),
+        ("Тест шифрования папки", test_folder_encryption),
+        ("Тест сегментированного формата", test_segmented_format),
+        ("Тест произвольного доступа", test_random_access),
+        ("Тест криптографических бэкендов", test_crypto_backends),
+        ("Тест архива папки", test_archive),
+        ("Тест инкрементального шифрования", test_incremental_folder),
+        ("Тест хранилища чанков", test_chunk_store),
+        ("Тест сжатия", test_compression),
+        ("Тест отчета о прогрессе", test_progress),
+        ("Тест продолжения задания", test_resumable_folder),
+        ("Тест асинхронного API", test_async_api),
+        ("Тест режима конвейера", test_pipe_mode),
+        ("Тест проверочного значения ключа", test_key_check),
+        ("Тест проверки без дешифрования", test_verify),
+        ("Тест атомарной записи", test_atomic_output),
+        ("Тест метрик задания", test_job_metrics),
+        ("Тест логирования", test_queued_logging),
+        ("Тест командной строки", test_headless_cli),
+    ]
+    results = [(name, test()) for name, test in tests]
     
     print("\n" + "=" * 60)
     print("📊 РЕЗУЛЬТАТЫ ТЕСТИРОВАНИЯ:")
-    print(f"✅ Тест шифрования/дешифрования: {'ПРОЙДЕН' if test1_passed else 'ПРОВАЛЕН'}")
-    print(f"✅ Тест неправильного пароля: {'ПРОЙДЕН' if test2_passed else 'ПРОВАЛЕН'}")
+    for name, passed in results:
+        print(f"✅ {name}: {'ПРОЙДЕН' if passed else 'ПРОВАЛЕН'}")
     
-    if test1_passed and test2_passed:
+    if all(passed for name, passed in results):
         print("\n🎉 ВСЕ ТЕСТЫ ПРОЙДЕНЫ! Программа работает корректно.")
         return True
     else:
@@ -173,4 +1623,4 @@ def main():
 
 if __name__ == '__main__':
     success = main()
-    exit(0 if success else 1) 
\ No newline at end of file
+    exit(0 if success else 1)